@@ -0,0 +1,73 @@
+from cache import TTLCache
+from models import db, User
+from pagination import encode_cursor, decode_cursor, cursor_int, clamp_per_page
+from search import prefix_range
+
+# --------------------------------------------------
+# PANEL DE ADMINISTRACIÓN
+# --------------------------------------------------
+USERS_PER_PAGE = 50
+USERS_MAX_PER_PAGE = 200
+ROLES = ("jugador", "ojeador", "admin")
+
+_stats_cache = TTLCache(maxsize=1)
+
+
+def user_stats(ttl=30):
+    """Totales del panel con un único GROUP BY role, is_active, cacheados `ttl` segundos."""
+    return _stats_cache.get_or_set("user_stats", _compute_user_stats, ttl=ttl)
+
+
+def _compute_user_stats():
+    stats = {"total": 0, "activos": 0}
+    stats.update({role: 0 for role in ROLES})
+
+    rows = (
+        db.session.query(User.role, User.is_active, db.func.count(User.id))
+        .group_by(User.role, User.is_active)
+        .all()
+    )
+    for role, is_active, count in rows:
+        stats["total"] += count
+        stats[role] = stats.get(role, 0) + count
+        if is_active:
+            stats["activos"] += count
+    return stats
+
+
+def parse_user_filters(args):
+    filters = {}
+    if args.get("rol") in ROLES:
+        filters["rol"] = args["rol"]
+    if args.get("estado") in ("activo", "inactivo"):
+        filters["estado"] = args["estado"]
+    email = (args.get("email") or "").strip().lower()
+    if email:
+        filters["email"] = email
+    return filters
+
+
+def user_page(filters, cursor=None, per_page=USERS_PER_PAGE):
+    """Usuarios filtrados, más recientes primero. Devuelve (usuarios, siguiente_cursor)."""
+    per_page = clamp_per_page(per_page, USERS_PER_PAGE, USERS_MAX_PER_PAGE)
+    query = User.query
+
+    if filters.get("rol"):
+        query = query.filter(User.role == filters["rol"])
+    if filters.get("estado"):
+        query = query.filter(User.is_active == (filters["estado"] == "activo"))
+    if filters.get("email"):
+        query = query.filter(prefix_range(db.func.lower(User.email), filters["email"]))
+
+    after = decode_cursor(cursor)
+    if after and len(after) == 1 and cursor_int(after[0]) is not None:
+        query = query.filter(User.id < after[0])
+
+    rows = query.order_by(User.id.desc()).limit(per_page + 1).all()
+
+    next_cursor = None
+    if len(rows) > per_page:
+        rows = rows[:per_page]
+        next_cursor = encode_cursor([rows[-1].id])
+
+    return rows, next_cursor
@@ -1,21 +1,64 @@
 from flask import (
     Flask, render_template, redirect, url_for, flash,
-    request, jsonify, send_from_directory, abort
+    request, jsonify, abort, Response, stream_with_context
 )
 from flask_login import (
     LoginManager, login_user, login_required,
     logout_user, current_user
 )
+from werkzeug.security import safe_join
 from werkzeug.utils import secure_filename
+from concurrent.futures import ProcessPoolExecutor
+import click
+import json
 import os
 from datetime import datetime
 
 from config import Config
-from models import db, User, Player, Scout, Video, Event, Message
+from models import (
+    db, bcrypt, User, Player, Scout, Video, Event,
+    Conversation, ConversationParticipant, Upload, RosterImport, calculate_age
+)
 from forms import (
-    LoginForm, RegisterPlayerForm, RegisterScoutForm,
+    COUNTRIES, LoginForm, RegisterPlayerForm, RegisterScoutForm,
     PlayerProfileForm, ScoutProfileForm, VideoForm,
-    EventForm, MessageForm, ReplyForm, SearchForm
+    EventForm, EventRegistrationForm, MessageForm, ReplyForm, SearchForm, RosterImportForm
+)
+from storage import (
+    get_storage, store_stream, blob_filename, blob_key, parse_blob_filename,
+    collect_garbage
+)
+from uploads import (
+    SHA256_RE, UploadError, create_upload, start_direct_upload, presign_chunk, write_chunk,
+    sync_direct_offset, finalize_upload, parse_chunk_checksum, upload_status,
+    expire_stale_uploads
+)
+from delivery import serve_file, serve_bytes
+from hls import hls_key, valid_hls_name
+from jobs import init_jobs, run_workers
+from notifications import notify_new_message, notify_new_event, notify_waitlist_promotion
+from processing import schedule_processing
+from identity import init_identity_cache, load_session_user
+from admin_panel import parse_user_filters, user_page, user_stats
+from roster import roster_format, import_roster, start_import, import_status
+from export import EXPORT_FORMATS, export_players
+from events import (
+    SPORTS, FEED_ALL, CONFIRMED, RegistrationError, parse_event_filters, event_page,
+    get_event, feed_token, feed_user_id, event_feed, invalidate_feeds, register_player,
+    cancel_registration, active_registration, waitlist_position, event_registrations
+)
+from messaging import (
+    inbox_page, thread_page, send_message, mark_conversation_read, unread_total,
+    rebuild_conversations, recipient_suggestions
+)
+from realtime import (
+    get_broker, user_channel, message_event, unread_event, event_stream
+)
+from schema import upgrade_database
+from search import (
+    parse_filters, parse_per_page, cached_search, cached_facets, video_counts, init_search_cache,
+    invalidate_search_cache, search_cache_stats, rebuild_fulltext_index, refresh_ages,
+    schedule_age_refresh
 )
 
 # --------------------------------------------------
@@ -25,18 +68,35 @@ app = Flask(__name__)
 app.config.from_object(Config)
 
 db.init_app(app)
+bcrypt.init_app(app)
 
 login_manager = LoginManager()
 login_manager.init_app(app)
 login_manager.login_view = "login"
 
+# Aviso inmediato a los trabajadores en segundo plano (opcional, ver jobs.py)
+init_jobs(app)
+
+# Caché de resultados del buscador (ver search.py)
+init_search_cache(app)
+
 
 # --------------------------------------------------
 # LOGIN MANAGER
 # --------------------------------------------------
+init_identity_cache(app)
+
+
 @login_manager.user_loader
 def load_user(user_id):
-    return User.query.get(int(user_id))
+    return load_session_user(int(user_id))
+
+
+@app.context_processor
+def inject_unread_messages():
+    if current_user.is_authenticated:
+        return {"unread_messages": unread_total(current_user.id)}
+    return {"unread_messages": 0}
 
 
 # --------------------------------------------------
@@ -50,14 +110,20 @@ def allowed_file(filename):
     )
 
 
-def calculate_age(birth_date):
-    if birth_date:
-        today = datetime.today()
-        return today.year - birth_date.year - (
-            (today.month, today.day) <
-            (birth_date.month, birth_date.day)
-        )
-    return None
+def upload_folder():
+    # Rutas relativas respecto a la aplicación, igual que send_from_directory
+    return os.path.join(app.root_path, app.config["UPLOAD_FOLDER"])
+
+
+def publish_message(msg):
+    """Avisa a ambos participantes del nuevo mensaje y al receptor de su contador."""
+    broker = get_broker(app)
+    event = message_event(msg)
+    broker.publish(user_channel(msg.sender_id), event)
+    broker.publish(user_channel(msg.receiver_id), event)
+    broker.publish(
+        user_channel(msg.receiver_id), unread_event(unread_total(msg.receiver_id))
+    )
 
 
 # --------------------------------------------------
@@ -89,6 +155,10 @@ def login():
         user = User.query.filter_by(email=form.email.data).first()
 
         if user and user.check_password(form.password.data):
+            if user.password_needs_rehash():
+                # Cambió BCRYPT_LOG_ROUNDS: se aprovecha que tenemos la contraseña en claro
+                user.set_password(form.password.data)
+                db.session.commit()
             login_user(user)
             next_page = request.args.get("next")
             return redirect(next_page or url_for("home"))
@@ -124,7 +194,8 @@ def register_jugador():
             user = User(email=form.email.data, role="jugador")
             user.set_password(form.password.data)
             db.session.add(user)
-            db.session.commit()
+            # flush() asigna user.id sin confirmar: usuario y perfil van en un solo commit
+            db.session.flush()
 
             # Crear perfil de jugador
             player = Player(
@@ -177,7 +248,7 @@ def register_ojeador():
             user = User(email=form.email.data, role="ojeador")
             user.set_password(form.password.data)
             db.session.add(user)
-            db.session.commit()
+            db.session.flush()
 
             scout = Scout(
                 user_id=user.id,
@@ -261,9 +332,11 @@ def perfil_ojeador():
 @login_required
 def buscar():
     form = SearchForm()
+    args = request.args if request.method == "GET" else request.form
 
     # Populate form with request args for GET requests
     if request.method == 'GET' and request.args:
+        form.q.data = request.args.get('q', '')
         form.deporte.data = request.args.get('deporte', '')
         form.posicion.data = request.args.get('posicion', '')
         form.edad_min.data = request.args.get('edad_min', '')
@@ -271,40 +344,50 @@ def buscar():
         form.pais.data = request.args.get('pais', '')
         form.ciudad.data = request.args.get('ciudad', '')
         form.nivel.data = request.args.get('nivel', '')
-    players = Player.query
-
-    # Apply filters
-    if form.deporte.data and form.deporte.data != '':
-        players = players.filter_by(deporte=form.deporte.data)
-
-    if form.posicion.data and form.posicion.data != '':
-        players = players.filter(Player.posicion.contains(form.posicion.data))
-
-    if form.edad_min.data and form.edad_min.data != '':
-        try:
-            edad_min = int(form.edad_min.data)
-            players = players.filter(Player.edad >= edad_min)
-        except ValueError:
-            pass
 
-    if form.edad_max.data and form.edad_max.data != '':
-        try:
-            edad_max = int(form.edad_max.data)
-            players = players.filter(Player.edad <= edad_max)
-        except ValueError:
-            pass
+    filters = parse_filters(args)
+    per_page = parse_per_page(args.get("por_pagina"))
+    players, next_cursor = cached_search(
+        filters, cursor=args.get("cursor"), per_page=per_page
+    )
 
-    if form.pais.data and form.pais.data != '':
-        players = players.filter(Player.pais.contains(form.pais.data))
+    page_args = dict(filters)
+    if args.get("por_pagina"):
+        page_args["por_pagina"] = per_page
+
+    next_url = first_url = None
+    if next_cursor:
+        next_url = url_for("buscar", cursor=next_cursor, **page_args)
+    if args.get("cursor"):
+        first_url = url_for("buscar", **page_args)
+
+    return render_template(
+        "buscar.html", form=form, players=players,
+        video_counts=video_counts(players),
+        next_url=next_url, first_url=first_url, filters=filters,
+        facets=cached_facets(filters), country_names=dict(COUNTRIES),
+    )
 
-    if form.ciudad.data and form.ciudad.data != '':
-        players = players.filter(Player.ciudad.contains(form.ciudad.data))
 
-    if form.nivel.data and form.nivel.data != '':
-        players = players.filter_by(nivel=form.nivel.data)
+@app.route("/buscar/exportar.<formato>")
+@login_required
+def exportar_busqueda(formato):
+    if current_user.role not in ("ojeador", "admin"):
+        abort(403)
+    if formato not in EXPORT_FORMATS:
+        abort(404)
 
-    players = players.all()
-    return render_template("buscar.html", form=form, players=players)
+    filters = parse_filters(request.args)
+    filename = f"jugadores-{datetime.utcnow():%Y%m%d}.{formato}"
+    return Response(
+        stream_with_context(export_players(filters, formato)),
+        mimetype=EXPORT_FORMATS[formato],
+        headers={
+            "Content-Disposition": f"attachment; filename={filename}",
+            # Que el proxy no acumule la respuesta entera antes de enviarla
+            "X-Accel-Buffering": "no",
+        },
+    )
 
 
 # --------------------------------------------------
@@ -313,15 +396,125 @@ def buscar():
 @app.route("/eventos")
 @login_required
 def eventos():
-    events = Event.query.order_by(Event.fecha.desc()).all()
-    return render_template("eventos.html", events=events)
+    filters = parse_event_filters(request.args)
+    events, next_cursor = event_page(
+        filters,
+        cursor=request.args.get("cursor"),
+        per_page=request.args.get("por_pagina"),
+    )
+
+    page_args = dict(filters)
+    if request.args.get("por_pagina"):
+        page_args["por_pagina"] = request.args["por_pagina"]
+
+    next_url = first_url = None
+    if next_cursor:
+        next_url = url_for("eventos", cursor=next_cursor, **page_args)
+    if request.args.get("cursor"):
+        first_url = url_for("eventos", **page_args)
+
+    feed_url = url_for(
+        "eventos_calendario",
+        token=feed_token(app.config["SECRET_KEY"], current_user.id),
+        deporte=filters.get("deporte", FEED_ALL),
+        _external=True,
+    )
+
+    return render_template(
+        "eventos.html", events=events, filters=filters, sports=SPORTS,
+        next_url=next_url, first_url=first_url, feed_url=feed_url,
+    )
+
+
+@app.route("/eventos/calendario/<token>/<deporte>.ics")
+def eventos_calendario(token, deporte):
+    # Sin login_required: los clientes de calendario se identifican con la URL firmada
+    user_id = feed_user_id(app.config["SECRET_KEY"], token)
+    user = load_session_user(user_id) if isinstance(user_id, int) else None
+    if user is None or not user.is_active:
+        abort(404)
+    if deporte != FEED_ALL and deporte not in SPORTS:
+        abort(404)
+
+    body, etag = event_feed(
+        None if deporte == FEED_ALL else deporte,
+        lambda event_id: url_for("evento_detalle", event_id=event_id, _external=True),
+        ttl=app.config["EVENTS_FEED_TTL"],
+    )
+    response = Response(body, mimetype="text/calendar")
+    response.set_etag(etag)
+    response.cache_control.private = True
+    response.cache_control.max_age = app.config["EVENTS_FEED_TTL"]
+    return response.make_conditional(request)
 
 
 @app.route("/evento/<int:event_id>")
 @login_required
 def evento_detalle(event_id):
-    event = Event.query.get_or_404(event_id)
-    return render_template("evento_detalle.html", event=event)
+    event = get_event(event_id)
+    if event is None:
+        abort(404)
+
+    registration = position = registrations = None
+    if current_user.role == "jugador" and current_user.player_profile_id:
+        registration = active_registration(event.id, current_user.player_profile_id)
+        if registration:
+            position = waitlist_position(registration)
+    elif current_user.role == "ojeador" and current_user.scout_profile_id == event.scout_id:
+        registrations = event_registrations(event.id)
+
+    return render_template(
+        "evento_detalle.html", event=event, form=EventRegistrationForm(),
+        registration=registration, position=position, registrations=registrations,
+        upcoming=event.fecha >= datetime.now(),
+    )
+
+
+@app.route("/evento/<int:event_id>/inscripcion", methods=["POST"])
+@login_required
+def inscribirse_evento(event_id):
+    if current_user.role != "jugador" or not current_user.player_profile_id:
+        abort(403)
+    form = EventRegistrationForm()
+    if not form.validate_on_submit():
+        abort(400)
+    event = db.session.get(Event, event_id)
+    if event is None:
+        abort(404)
+
+    try:
+        confirmed = register_player(event, current_user.player_profile_id).status == CONFIRMED
+        db.session.commit()
+    except RegistrationError as e:
+        flash(str(e), "danger")
+        return redirect(url_for("evento_detalle", event_id=event_id))
+
+    if confirmed:
+        flash("Inscripción confirmada.", "success")
+    else:
+        flash("El evento está completo: estás en la lista de espera.", "info")
+    return redirect(url_for("evento_detalle", event_id=event_id))
+
+
+@app.route("/evento/<int:event_id>/cancelar", methods=["POST"])
+@login_required
+def cancelar_inscripcion(event_id):
+    if current_user.role != "jugador" or not current_user.player_profile_id:
+        abort(403)
+    form = EventRegistrationForm()
+    if not form.validate_on_submit():
+        abort(400)
+
+    registration = active_registration(event_id, current_user.player_profile_id)
+    if registration is None:
+        abort(404)
+    promoted = cancel_registration(registration)
+    if promoted:
+        notify_waitlist_promotion.delay(registration_id=promoted.id)
+    db.session.commit()
+
+    flash("Inscripción cancelada.", "success")
+    return redirect(url_for("evento_detalle", event_id=event_id))
 
 
 @app.route("/evento/crear", methods=["GET", "POST"])
@@ -343,7 +536,10 @@ def crear_evento():
             capacidad_maxima=form.capacidad_maxima.data,
         )
         db.session.add(event)
+        db.session.flush()
+        notify_new_event.delay(event_id=event.id)
         db.session.commit()
+        invalidate_feeds(event.deporte)
 
         flash("Evento creado exitosamente.", "success")
         return redirect(url_for("eventos"))
@@ -357,41 +553,33 @@ def crear_evento():
 @app.route("/mensajes")
 @login_required
 def mensajes():
-    # Get all conversation IDs where current user is involved
-    sent_conversations = db.session.query(Message.conversation_id).filter_by(sender_id=current_user.id).distinct()
-    received_conversations = db.session.query(Message.conversation_id).filter_by(receiver_id=current_user.id).distinct()
-
-    # Combine and get unique conversation IDs
-    all_conversation_ids = set()
-    for conv in sent_conversations:
-        all_conversation_ids.add(conv[0])
-    for conv in received_conversations:
-        all_conversation_ids.add(conv[0])
-
-    # Get the latest message from each conversation
-    conversations = []
-    for conv_id in all_conversation_ids:
-        latest_message = Message.query.filter_by(conversation_id=conv_id).order_by(Message.sent_at.desc()).first()
-        if latest_message:
-            # Get the other participant
-            other_user_id = latest_message.sender_id if latest_message.receiver_id == current_user.id else latest_message.receiver_id
-            other_user = User.query.get(other_user_id)
-
-            conversations.append({
-                'conversation_id': conv_id,
-                'latest_message': latest_message,
-                'other_user': other_user,
-                'unread_count': Message.query.filter_by(
-                    conversation_id=conv_id,
-                    receiver_id=current_user.id,
-                    is_read=False
-                ).count()
-            })
-
-    # Sort conversations by latest message date
-    conversations.sort(key=lambda x: x['latest_message'].sent_at, reverse=True)
-
-    return render_template("mensajes.html", conversations=conversations)
+    conversations, next_cursor = inbox_page(
+        current_user.id,
+        cursor=request.args.get("cursor"),
+        per_page=request.args.get("por_pagina"),
+    )
+
+    next_url = None
+    if next_cursor:
+        next_url = url_for(
+            "mensajes", cursor=next_cursor,
+            por_pagina=request.args.get("por_pagina"),
+        )
+
+    return render_template(
+        "mensajes.html", conversations=conversations, next_url=next_url
+    )
+
+
+@app.route("/mensajes/stream")
+@login_required
+def mensajes_stream():
+    subscription = get_broker(app).subscribe(user_channel(current_user.id))
+    return Response(
+        event_stream(subscription, app.config["SSE_HEARTBEAT_SECONDS"]),
+        mimetype="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
 
 
 @app.route("/mensaje/enviar", methods=["GET", "POST"])
@@ -399,73 +587,93 @@ def mensajes():
 def enviar_mensaje():
     form = MessageForm()
 
-    # Choices dinámicos
-    users = User.query.filter(User.id != current_user.id).all()
-    form.receiver_id.choices = [
-        (u.id, f"{u.email} ({u.role})") for u in users
-    ]
-
     # Pre-select receiver if provided in query parameter
+    receiver = None
     receiver_id = request.args.get('receiver')
-    if receiver_id and receiver_id.isdigit():
-        form.receiver_id.data = int(receiver_id)
+    if request.method == "GET" and receiver_id and receiver_id.isdigit():
+        receiver = db.session.get(User, int(receiver_id))
+        if receiver:
+            form.receiver_id.data = receiver.id
+    elif form.receiver_id.data:
+        receiver = db.session.get(User, form.receiver_id.data)
 
     if form.validate_on_submit():
-        # Generate conversation ID based on sender and receiver
-        conversation_id = f"{min(current_user.id, form.receiver_id.data)}_{max(current_user.id, form.receiver_id.data)}_{form.subject.data.replace(' ', '_')}"
-
-        msg = Message(
-            sender_id=current_user.id,
-            receiver_id=form.receiver_id.data,
-            subject=form.subject.data,
-            content=form.content.data,
-            conversation_id=conversation_id
+        msg = send_message(
+            current_user.id,
+            form.receiver_id.data,
+            form.subject.data,
+            form.content.data,
         )
-        db.session.add(msg)
+        notify_new_message.delay(message_id=msg.id)
         db.session.commit()
+        publish_message(msg)
 
         return redirect(url_for("mensajes"))
 
-    return render_template("enviar_mensaje.html", form=form)
+    return render_template("enviar_mensaje.html", form=form, receiver=receiver)
+
+
+@app.route("/api/destinatarios")
+@login_required
+def api_destinatarios():
+    return jsonify({
+        "usuarios": recipient_suggestions(request.args.get("q"), current_user.id)
+    })
 
 @app.route('/conversacion/<conversation_id>', methods=['GET', 'POST'])
 @login_required
 def conversacion(conversation_id):
-    # Get all messages in this conversation
-    messages = Message.query.filter_by(conversation_id=conversation_id).order_by(Message.sent_at).all()
+    conversation = Conversation.query.filter_by(key=conversation_id).first_or_404()
 
     # Check if user is part of this conversation
-    if not messages:
-        abort(404)
-
-    message = messages[0]  # Get the first message to check participants
-    if current_user.id not in [message.sender_id, message.receiver_id]:
+    participant = db.session.get(
+        ConversationParticipant, (conversation.id, current_user.id)
+    )
+    if participant is None:
         abort(403)
 
-    # Mark messages as read if current user is the receiver
-    for msg in messages:
-        if msg.receiver_id == current_user.id and not msg.is_read:
-            msg.is_read = True
-    db.session.commit()
+    # Mark messages as read if current user has unread ones
+    if participant.unread_count:
+        mark_conversation_read(conversation, current_user.id)
+        db.session.commit()
+        get_broker(app).publish(
+            user_channel(current_user.id), unread_event(unread_total(current_user.id))
+        )
+
+    # Only the most recent page; older messages are loaded by cursor
+    messages, older_cursor = thread_page(
+        conversation.key, cursor=request.args.get("cursor")
+    )
 
     # Get the other participant
-    other_user_id = message.sender_id if message.receiver_id == current_user.id else message.receiver_id
-    other_user = User.query.get(other_user_id)
+    other_user = (
+        User.query.join(ConversationParticipant)
+        .filter(
+            ConversationParticipant.conversation_id == conversation.id,
+            User.id != current_user.id,
+        )
+        .first()
+    )
 
     form = ReplyForm()
     if form.validate_on_submit():
-        reply = Message(
-            sender_id=current_user.id,
-            receiver_id=other_user_id,
-            subject=message.subject,  # Keep the same subject
-            content=form.content.data,
-            conversation_id=conversation_id
+        reply = send_message(
+            current_user.id,
+            other_user.id,
+            conversation.subject,  # Keep the same subject
+            form.content.data,
+            key=conversation.key,
         )
-        db.session.add(reply)
+        notify_new_message.delay(message_id=reply.id)
         db.session.commit()
+        publish_message(reply)
         return redirect(url_for('conversacion', conversation_id=conversation_id))
 
-    return render_template('conversacion.html', messages=messages, other_user=other_user, form=form, conversation_id=conversation_id)
+    older_url = None
+    if older_cursor:
+        older_url = url_for('conversacion', conversation_id=conversation_id, cursor=older_cursor)
+
+    return render_template('conversacion.html', messages=messages, other_user=other_user, form=form, conversation_id=conversation_id, older_url=older_url)
 
 
 # --------------------------------------------------
@@ -477,8 +685,72 @@ def admin():
     if current_user.role != "admin":
         abort(403)
 
-    users = User.query.all()
-    return render_template("admin.html", users=users)
+    filters = parse_user_filters(request.args)
+    users, next_cursor = user_page(
+        filters,
+        cursor=request.args.get("cursor"),
+        per_page=request.args.get("por_pagina"),
+    )
+
+    page_args = dict(filters)
+    if request.args.get("por_pagina"):
+        page_args["por_pagina"] = request.args["por_pagina"]
+
+    next_url = first_url = None
+    if next_cursor:
+        next_url = url_for("admin", cursor=next_cursor, **page_args)
+    if request.args.get("cursor"):
+        first_url = url_for("admin", **page_args)
+
+    imports = RosterImport.query.order_by(RosterImport.id.desc()).limit(5).all()
+
+    return render_template(
+        "admin.html", users=users, filters=filters,
+        stats=user_stats(ttl=app.config["ADMIN_STATS_TTL"]),
+        next_url=next_url, first_url=first_url,
+        import_form=RosterImportForm(), imports=imports,
+    )
+
+
+@app.route("/admin/importar", methods=["POST"])
+@login_required
+def admin_importar():
+    if current_user.role != "admin":
+        abort(403)
+
+    form = RosterImportForm()
+    if not form.validate_on_submit():
+        for errors in form.errors.values():
+            flash(errors[0], "danger")
+        return redirect(url_for("admin"))
+
+    file = form.archivo.data
+    filename = secure_filename(file.filename)
+    roster_import = start_import(
+        file.stream, filename, roster_format(filename), current_user.id,
+        get_storage(app), upload_folder(),
+    )
+    db.session.commit()
+
+    flash(f"Importación #{roster_import.id} en cola. Se procesará en segundo plano.", "info")
+    return redirect(url_for("admin"))
+
+
+@app.route("/admin/importaciones/<int:import_id>")
+@login_required
+def admin_importacion(import_id):
+    if current_user.role != "admin":
+        abort(403)
+    return jsonify(import_status(RosterImport.query.get_or_404(import_id)))
+
+
+@app.route("/admin/metricas/busqueda")
+@login_required
+def admin_metricas_busqueda():
+    # Contadores de este proceso desde que arrancó
+    if current_user.role != "admin":
+        abort(403)
+    return jsonify(search_cache_stats() or {"activa": False})
 
 
 # --------------------------------------------------
@@ -486,18 +758,14 @@ def admin():
 # --------------------------------------------------
 @app.route("/api/buscar")
 def api_buscar():
-    deporte = request.args.get("deporte")
-    ciudad = request.args.get("ciudad")
-
-    players = Player.query
-
-    if deporte:
-        players = players.filter_by(deporte=deporte)
-
-    if ciudad:
-        players = players.filter(Player.ciudad.contains(ciudad))
-
-    players = players.all()
+    filters = parse_filters(request.args)
+    per_page = parse_per_page(request.args.get("por_pagina"))
+    players, next_cursor = cached_search(
+        filters,
+        cursor=request.args.get("cursor"),
+        per_page=per_page,
+    )
+    facets = cached_facets(filters)
 
     return jsonify({
         "jugadores": [{
@@ -511,9 +779,11 @@ def api_buscar():
             "nivel": p.nivel,
             "descripcion": p.descripcion,
         } for p in players],
-        "total": len(players),
-        "pagina": 1,
-        "por_pagina": 20,
+        # Todos los resultados de la búsqueda, no solo los de esta página
+        "total": facets["total"],
+        "por_pagina": per_page,
+        "siguiente_cursor": next_cursor,
+        "facetas": facets,
     })
 
 
@@ -552,24 +822,27 @@ def subir_video():
                 flash("No se seleccionó archivo", "danger")
                 return redirect(request.url)
 
-            if allowed_file(file.filename):
-                filename = secure_filename(file.filename)
-
-                upload_folder = app.config["UPLOAD_FOLDER"]
-                os.makedirs(upload_folder, exist_ok=True)
+            if not allowed_file(file.filename):
+                flash("Formato de video no permitido", "danger")
+                return redirect(request.url)
 
-                file_path = os.path.join(upload_folder, filename)
-                file.save(file_path)
+            extension = secure_filename(file.filename).rsplit(".", 1)[1]
+            blob = store_stream(file.stream, get_storage(app), upload_folder())
 
-                video = Video(
-                    player_id=current_user.player_profile.id,
-                    titulo=form.titulo.data,
-                    descripcion=form.descripcion.data,
-                    tipo="local",
-                    filename=filename,
-                )
+            video = Video(
+                player_id=current_user.player_profile.id,
+                titulo=form.titulo.data,
+                descripcion=form.descripcion.data,
+                tipo="local",
+                filename=blob_filename(blob.sha256, extension),
+                blob_id=blob.id,
+            )
 
         db.session.add(video)
+        if video.tipo == "local":
+            # El procesado (faststart, miniatura, baja calidad) va en segundo plano
+            db.session.flush()
+            schedule_processing(video)
         db.session.commit()
 
         flash("Video subido exitosamente.", "success")
@@ -578,12 +851,312 @@ def subir_video():
     return render_template("subir_video.html", form=form)
 
 
+# --------------------------------------------------
+# SUBIDA DE VIDEO POR PARTES
+# --------------------------------------------------
+def upload_error_response(error):
+    return jsonify(dict(error.extra, error=error.message)), error.status
+
+
+def get_own_upload(upload_id):
+    if current_user.role != "jugador":
+        abort(403)
+    upload = db.session.get(Upload, upload_id)
+    if upload is None:
+        abort(404)
+    if upload.player_id != current_user.player_profile_id:
+        abort(403)
+    return upload
+
+
+@app.route("/api/videos/subidas", methods=["POST"])
+@login_required
+def api_subida_crear():
+    if current_user.role != "jugador":
+        abort(403)
+
+    data = request.get_json(silent=True) or {}
+    if not allowed_file(data.get("filename") or ""):
+        return jsonify({"error": "Formato de video no permitido"}), 400
+
+    try:
+        upload = create_upload(
+            current_user.player_profile_id,
+            data.get("filename"),
+            data.get("size"),
+            data.get("titulo"),
+            descripcion=data.get("descripcion"),
+            sha256=data.get("sha256"),
+            max_size=app.config["MAX_VIDEO_SIZE"],
+        )
+    except UploadError as e:
+        return upload_error_response(e)
+
+    storage = get_storage(app)
+    chunk_size = app.config["UPLOAD_CHUNK_SIZE"]
+    if storage.direct_upload:
+        start_direct_upload(upload, storage, chunk_size)
+        chunk_size = upload.chunk_size
+    db.session.commit()
+
+    location = url_for("api_subida", upload_id=upload.id)
+    body = dict(upload_status(upload), chunk_size=chunk_size)
+    return jsonify(body), 201, {"Location": location}
+
+
+@app.route("/api/videos/subidas/<upload_id>", methods=["GET", "PUT"])
+@login_required
+def api_subida(upload_id):
+    upload = get_own_upload(upload_id)
+
+    if request.method == "GET":
+        sync_direct_offset(upload, get_storage(app))
+        db.session.commit()
+        return jsonify(dict(upload_status(upload), chunk_size=upload.chunk_size))
+
+    offset = request.headers.get("Upload-Offset", type=int)
+    if offset is None:
+        return jsonify({"error": "Falta la cabecera Upload-Offset"}), 400
+    if (request.content_length or 0) > app.config["UPLOAD_CHUNK_SIZE"]:
+        return jsonify({"error": "Trozo demasiado grande"}), 413
+
+    try:
+        checksum = parse_chunk_checksum(request.headers.get("Upload-Checksum"))
+        new_offset = write_chunk(
+            upload, offset, request.stream, request.content_length,
+            get_storage(app), checksum=checksum,
+        )
+    except UploadError as e:
+        return upload_error_response(e)
+
+    return jsonify({"id": upload_id, "offset": new_offset, "size": upload.size})
+
+
+@app.route("/api/videos/subidas/<upload_id>/partes", methods=["POST"])
+@login_required
+def api_subida_parte(upload_id):
+    """URL prefirmada para enviar un trozo directamente al almacenamiento."""
+    upload = get_own_upload(upload_id)
+    data = request.get_json(silent=True) or {}
+
+    try:
+        offset = int(data.get("offset"))
+    except (TypeError, ValueError):
+        return jsonify({"error": "Falta el offset"}), 400
+
+    try:
+        part = presign_chunk(upload, get_storage(app), offset)
+    except UploadError as e:
+        return upload_error_response(e)
+    db.session.commit()
+
+    return jsonify(part)
+
+
+@app.route("/api/videos/subidas/<upload_id>/finalizar", methods=["POST"])
+@login_required
+def api_subida_finalizar(upload_id):
+    upload = get_own_upload(upload_id)
+
+    try:
+        video = finalize_upload(upload, get_storage(app))
+    except UploadError as e:
+        return upload_error_response(e)
+    db.session.commit()
+
+    return jsonify(dict(upload_status(upload), video_id=video.id))
+
+
 # --------------------------------------------------
 # ARCHIVOS SUBIDOS
 # --------------------------------------------------
 @app.route("/uploads/<filename>")
+@login_required
 def uploaded_file(filename):
-    return send_from_directory(app.config["UPLOAD_FOLDER"], filename)
+    storage = get_storage(app)
+    sha256 = parse_blob_filename(filename)
+
+    if sha256 is None:
+        # Archivos anteriores al almacenamiento por contenido
+        key = filename
+        path = safe_join(upload_folder(), filename)
+    else:
+        key = blob_key(sha256)
+        url = storage.url(key, filename)
+        if url:
+            # Backend externo: el navegador descarga el video directamente de allí
+            return redirect(url)
+        path = storage.path(key)
+
+    if path is None or not os.path.isfile(path):
+        abort(404)
+
+    return serve_file(
+        path, key, filename,
+        etag=sha256,
+        mode=app.config["SENDFILE_MODE"],
+        internal_prefix=app.config["SENDFILE_INTERNAL_PREFIX"],
+    )
+
+
+@app.route("/hls/<sha256>/<path:name>")
+@login_required
+def hls_file(sha256, name):
+    if not SHA256_RE.match(sha256) or not valid_hls_name(name):
+        abort(404)
+
+    storage = get_storage(app)
+    key = hls_key(sha256, name)
+    # Paquete inmutable: el ETag puede derivarse de la ruta
+    etag = f"{sha256}-{name.replace('/', '-')}"
+
+    url = storage.url(key, name)
+    if url:
+        if name.endswith(".ts"):
+            return redirect(url)
+        # Las listas se sirven desde aquí para que sus rutas relativas
+        # (y con ellas los segmentos) sigan pasando por esta vista
+        if not storage.exists(key):
+            abort(404)
+        body = storage.open(key)
+        try:
+            return serve_bytes(body.read(), name, etag)
+        finally:
+            body.close()
+
+    path = storage.path(key)
+    if not os.path.isfile(path):
+        abort(404)
+
+    return serve_file(
+        path, key, name,
+        etag=etag,
+        mode=app.config["SENDFILE_MODE"],
+        internal_prefix=app.config["SENDFILE_INTERNAL_PREFIX"],
+    )
+
+
+# --------------------------------------------------
+# COMANDOS CLI
+# --------------------------------------------------
+@app.cli.command("actualizar-bd")
+def actualizar_bd():
+    """Añade a una base de datos existente las tablas, columnas e índices nuevos."""
+    changes = upgrade_database()
+    invalidate_search_cache()
+    for change in changes:
+        print(f"- {change}")
+    print(f"{len(changes)} cambios" if changes else "La base de datos ya está al día")
+
+
+@app.cli.command("reindexar-busqueda")
+def reindexar_busqueda():
+    """Reconstruye el índice de texto completo de jugadores."""
+    db.create_all()
+    total = rebuild_fulltext_index()
+    invalidate_search_cache()
+    print(f"{total} jugadores indexados")
+
+
+@app.cli.command("actualizar-edades")
+def actualizar_edades():
+    """Recalcula la edad mostrada de los jugadores (la búsqueda usa la fecha de nacimiento)."""
+    total = refresh_ages()
+    print(f"{total} jugadores actualizados")
+
+
+@app.cli.command("limpiar-subidas")
+@click.option("--horas", default=24, help="Antigüedad mínima de las subidas pendientes.")
+def limpiar_subidas(horas):
+    """Borra subidas por partes abandonadas y sus archivos parciales."""
+    total = expire_stale_uploads(get_storage(app), max_age_hours=horas)
+    print(f"{total} subidas pendientes eliminadas")
+
+
+@app.cli.command("limpiar-blobs")
+def limpiar_blobs():
+    """Borra los blobs de video que ya no usa ningún video."""
+    total = collect_garbage(get_storage(app))
+    print(f"{total} blobs eliminados")
+
+
+@app.cli.command("trabajos")
+@click.option("--procesos", default=None, type=int, help="Número de procesos trabajadores.")
+def trabajos(procesos):
+    """Ejecuta los trabajos en segundo plano (procesado de videos...)."""
+    # Los handlers renuevan el bloqueo entre pasos, pero un paso de ffmpeg puede
+    # durar PROCESSING_TIMEOUT: con un bloqueo más corto otro proceso lo repetiría
+    if app.config["JOB_LOCK_TIMEOUT"] <= app.config["PROCESSING_TIMEOUT"]:
+        raise click.ClickException(
+            "JOB_LOCK_TIMEOUT debe ser mayor que PROCESSING_TIMEOUT "
+            f"({app.config['JOB_LOCK_TIMEOUT']} <= {app.config['PROCESSING_TIMEOUT']})"
+        )
+    db.create_all()
+    # Tareas periódicas: se reprograman solas tras cada ejecución
+    schedule_age_refresh()
+    db.session.commit()
+    run_workers(
+        app,
+        processes=procesos or app.config["JOB_WORKERS"],
+        poll_interval=app.config["JOB_POLL_SECONDS"],
+        lock_timeout=app.config["JOB_LOCK_TIMEOUT"],
+    )
+
+
+@app.cli.command("procesar-videos")
+@click.option("--todos", is_flag=True, help="Reprocesar también los ya procesados.")
+def procesar_videos(todos):
+    """Encola el procesado de los videos locales que no lo tienen."""
+    query = Video.query.filter(Video.tipo == "local", Video.blob_id.isnot(None))
+    if not todos:
+        query = query.filter(db.or_(Video.status.is_(None), Video.status == "error"))
+    total = 0
+    for video in query:
+        schedule_processing(video)
+        total += 1
+    db.session.commit()
+    print(f"{total} videos encolados")
+
+
+@app.cli.command("importar-jugadores")
+@click.argument("archivo", type=click.Path(exists=True, dir_okay=False))
+@click.option("--formato", type=click.Choice(["csv", "jsonl"]), help="Por defecto, según la extensión.")
+@click.option("--lote", default=1000, help="Filas por transacción.")
+@click.option("--procesos", default=None, type=int, help="Procesos para calcular los hashes.")
+@click.option("--errores", type=click.Path(dir_okay=False), help="Guardar los errores en un JSONL.")
+def importar_jugadores(archivo, formato, lote, procesos, errores):
+    """Importa jugadores desde un CSV (con cabecera) o un JSONL."""
+    fmt = formato or roster_format(archivo)
+    if fmt is None:
+        raise click.UsageError("Formato desconocido: usa --formato csv o --formato jsonl")
+    db.create_all()
+
+    def progress(report):
+        print(f"{report['total']} filas leídas, {report['imported']} importadas, "
+              f"{len(report['errors'])} con errores", end="\r", flush=True)
+
+    with ProcessPoolExecutor(procesos) as executor, open(archivo, "rb") as f:
+        report = import_roster(f, fmt, executor, batch_size=lote, progress=progress)
+    print()
+
+    if errores:
+        with open(errores, "w", encoding="utf-8") as f:
+            for error in report["errors"]:
+                f.write(json.dumps(error, ensure_ascii=False) + "\n")
+    else:
+        for error in report["errors"][:20]:
+            print(f"Línea {error['linea']} ({error['email']}): {error['errores']}")
+        if len(report["errors"]) > 20:
+            print(f"... y {len(report['errors']) - 20} más (usa --errores para guardarlos)")
+    print(f"{report['imported']} de {report['total']} jugadores importados")
+
+
+@app.cli.command("reconstruir-conversaciones")
+def reconstruir_conversaciones():
+    """Recalcula hilos y contadores de no leídos a partir de los mensajes."""
+    db.create_all()
+    total = rebuild_conversations()
+    print(f"{total} conversaciones reconstruidas")
 
 
 # --------------------------------------------------
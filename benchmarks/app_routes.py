@@ -0,0 +1,191 @@
+"""Latencia y número de consultas SQL de las páginas principales.
+
+Recorre /buscar, /api/buscar, /mensajes, /conversacion/<id>, /eventos y
+/admin con el cliente de pruebas de Flask (sin servidor ni red, así solo se
+mide la aplicación y la base de datos) y muestra percentiles de latencia y
+consultas por petición. Las búsquedas se miden dos veces: "(frío)" invalida
+la caché de búsquedas antes de cada petición y la otra la reutiliza, como una
+búsqueda repetida. Pensado para una base generada con datos sintéticos:
+
+    DATABASE_URI=sqlite:////tmp/bench.db python seed.py --sintetico --jugadores 50000
+    DATABASE_URI=sqlite:////tmp/bench.db python benchmarks/app_routes.py --guardar base.json
+
+Tras un cambio, --comparar base.json marca los escenarios que empeoran más
+de --tolerancia (latencia p50) o que hacen más consultas que antes.
+"""
+import argparse
+import json
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from sqlalchemy import event  # noqa: E402
+
+import search  # noqa: E402
+from app import app  # noqa: E402
+from models import db, ConversationParticipant, Conversation, User  # noqa: E402
+from seed import SYNTHETIC_PASSWORD  # noqa: E402
+
+# Solo los usuarios de seed.py --sintetico usan SYNTHETIC_PASSWORD
+SYNTHETIC_EMAILS = "%@sintetico.scoutme.com"
+
+ACCOUNTS = {
+    "admin": ("admin@scoutme.com", "admin123"),
+    "ojeador": ("ojeador1@scoutme.com", "ojeador123"),
+    "jugador": ("jugador1@scoutme.com", "jugador123"),
+}
+
+
+def login(role):
+    client = app.test_client()
+    email, password = ACCOUNTS[role]
+    response = client.post("/login", data={"email": email, "password": password})
+    if response.status_code != 302:
+        raise SystemExit(f"No se pudo iniciar sesión como {email}: ¿se ejecutó seed.py?")
+    return client
+
+
+def busiest_conversation():
+    """Conversación más reciente de un ojeador sintético activo y su email."""
+    with app.app_context():
+        row = (
+            db.session.query(Conversation.key, ConversationParticipant.user_id)
+            .join(ConversationParticipant, ConversationParticipant.conversation_id == Conversation.id)
+            .join(User, User.id == ConversationParticipant.user_id)
+            .filter(
+                User.role == "ojeador",
+                User.is_active == db.true(),
+                User.email.like(SYNTHETIC_EMAILS),
+            )
+            .order_by(Conversation.last_activity_at.desc())
+            .first()
+        )
+        if row is None:
+            return None, None
+        user = db.session.get(User, row.user_id)
+        return row.key, user.email
+
+
+def searches():
+    """Escenarios que pasan por la caché de búsquedas."""
+    return [
+        ("buscar deporte", "ojeador", "/buscar?deporte=fútbol"),
+        ("buscar combinada", "ojeador", "/buscar?deporte=fútbol&nivel=profesional&edad_min=18&edad_max=23&pais=ar"),
+        ("buscar texto", "ojeador", "/buscar?q=delantero rapido"),
+        ("api buscar", "jugador", "/api/buscar?deporte=baloncesto&por_pagina=100"),
+        ("api buscar texto", "jugador", "/api/buscar?q=garcia&por_pagina=100"),
+    ]
+
+
+def scenarios(conversation_key):
+    """(nombre, rol, url, en frío): las búsquedas se miden con la caché vacía y llena."""
+    items = [(f"{name} (frío)", role, url, True) for name, role, url in searches()]
+    items += [(name, role, url, False) for name, role, url in searches()]
+    return items + [(name, role, url, False) for name, role, url in [
+        ("mensajes", "conversacion", "/mensajes"),
+        ("eventos", "ojeador", "/eventos"),
+        ("admin", "admin", "/admin"),
+        ("admin filtrado", "admin", "/admin?rol=jugador&estado=activo"),
+        ("conversacion", "conversacion", f"/conversacion/{conversation_key}"),
+    ]]
+
+
+class QueryCounter:
+    def __init__(self, engine):
+        self.count = 0
+        event.listen(engine, "before_cursor_execute", self.on_execute)
+
+    def on_execute(self, *args):
+        self.count += 1
+
+
+def percentile(values, fraction):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * fraction))]
+
+
+def run(repetitions, warmup):
+    app.config["WTF_CSRF_ENABLED"] = False
+    conversation_key, conversation_email = busiest_conversation()
+    if conversation_key is None:
+        raise SystemExit("No hay conversaciones de ojeadores sintéticos: ¿se ejecutó seed.py --sintetico?")
+    ACCOUNTS["conversacion"] = (conversation_email, SYNTHETIC_PASSWORD)
+    clients = {role: login(role) for role in ACCOUNTS}
+
+    with app.app_context():
+        counter = QueryCounter(db.engine)
+
+    results = {}
+    for name, role, url, cold in scenarios(conversation_key):
+        client = clients[role]
+        for _ in range(warmup):
+            client.get(url)
+        latencies, queries = [], []
+        for _ in range(repetitions):
+            if cold:
+                # Nueva generación: la petición no encuentra nada en la caché
+                search.invalidate_search_cache()
+            before = counter.count
+            began = time.perf_counter()
+            response = client.get(url)
+            latencies.append(time.perf_counter() - began)
+            queries.append(counter.count - before)
+            if response.status_code != 200:
+                raise SystemExit(f"{name}: {url} respondió {response.status_code}")
+        results[name] = {
+            "url": url,
+            "p50_ms": percentile(latencies, 0.5) * 1000,
+            "p95_ms": percentile(latencies, 0.95) * 1000,
+            "p99_ms": percentile(latencies, 0.99) * 1000,
+            "consultas": statistics.median(queries),
+        }
+    return results
+
+
+def report(results, baseline=None, tolerance=0.2):
+    print(f"{'escenario':<26} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'consultas':>10}")
+    regressions = []
+    for name, r in results.items():
+        line = f"{name:<26} {r['p50_ms']:8.1f} {r['p95_ms']:8.1f} {r['p99_ms']:8.1f} {r['consultas']:10g}"
+        before = (baseline or {}).get(name)
+        if before:
+            notes = []
+            if r["p50_ms"] > before["p50_ms"] * (1 + tolerance):
+                notes.append(f"p50 {before['p50_ms']:.1f} -> {r['p50_ms']:.1f} ms")
+            if r["consultas"] > before["consultas"]:
+                notes.append(f"consultas {before['consultas']:g} -> {r['consultas']:g}")
+            if notes:
+                regressions.append(name)
+                line += "  EMPEORA: " + ", ".join(notes)
+        print(line)
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--repeticiones", type=int, default=30, help="Peticiones medidas por escenario")
+    parser.add_argument("--calentamiento", type=int, default=3, help="Peticiones previas sin medir")
+    parser.add_argument("--guardar", help="Guardar los resultados en este JSON")
+    parser.add_argument("--comparar", help="JSON de una ejecución anterior")
+    parser.add_argument("--tolerancia", type=float, default=0.2, help="Empeoramiento de p50 admitido (0.2 = 20 %%)")
+    args = parser.parse_args()
+
+    results = run(args.repeticiones, args.calentamiento)
+    baseline = None
+    if args.comparar:
+        with open(args.comparar) as f:
+            baseline = json.load(f)
+    regressions = report(results, baseline, args.tolerancia)
+
+    if args.guardar:
+        with open(args.guardar, "w") as f:
+            json.dump(results, f, indent=2, ensure_ascii=False)
+    if regressions:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
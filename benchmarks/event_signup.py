@@ -0,0 +1,209 @@
+"""Inscripciones simultáneas a un evento con plazas limitadas.
+
+Simula la apertura de unas pruebas: crea un evento con --capacidad plazas y
+lanza a la vez --jugadores hilos que envían POST /evento/<id>/inscripcion con
+el cliente de pruebas de Flask (la contención es la de la base de datos, no
+la de la red). Con --cancelaciones, una segunda oleada cancela esa cantidad
+de plazas confirmadas mientras otros tantos jugadores nuevos se inscriben.
+
+Al terminar comprueba que no hay overbooking: confirmadas <= capacidad, los
+contadores del evento cuadran con las inscripciones y nadie espera habiendo
+plazas libres. Sale con código 1 si algo no cuadra. Necesita una base con
+muchos jugadores, p. ej. la de `seed.py --sintetico`:
+
+    DATABASE_URI=sqlite:////tmp/bench.db python benchmarks/event_signup.py \\
+        --jugadores 300 --capacidad 50 --cancelaciones 40
+"""
+import argparse
+import os
+import sys
+import threading
+import time
+from collections import Counter
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from app import app  # noqa: E402
+from events import CONFIRMED, WAITLISTED  # noqa: E402
+from models import db, Event, EventRegistration, Player, Scout, User  # noqa: E402
+
+
+def percentile(values, fraction):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * fraction))]
+
+
+def create_event(capacity):
+    with app.app_context():
+        scout = Scout.query.order_by(Scout.id).first()
+        if scout is None:
+            raise SystemExit("No hay ojeadores: ¿se ejecutó seed.py?")
+        event = Event(
+            scout_id=scout.id,
+            titulo="Prueba de carga de inscripciones",
+            fecha=datetime.now() + timedelta(days=7),
+            deporte="fútbol",
+            capacidad_maxima=capacity,
+        )
+        db.session.add(event)
+        db.session.commit()
+        return event.id
+
+
+def player_users(count):
+    """(user_id, player_id) de `count` jugadores activos."""
+    with app.app_context():
+        rows = (
+            db.session.query(User.id, Player.id)
+            .join(Player, Player.user_id == User.id)
+            .filter(User.is_active == db.true())
+            .order_by(User.id)
+            .limit(count)
+            .all()
+        )
+    if len(rows) < count:
+        raise SystemExit(f"Solo hay {len(rows)} jugadores activos; genera más con seed.py --sintetico")
+    return rows
+
+
+def session_client(user_id):
+    # Sesión abierta directamente: cientos de logins medirían bcrypt, no las inscripciones
+    client = app.test_client()
+    with client.session_transaction() as session:
+        session["_user_id"] = str(user_id)
+        session["_fresh"] = True
+    return client
+
+
+def storm(requests):
+    """Lanza a la vez las peticiones [(cliente, url)] y devuelve (latencias, códigos)."""
+    latencies = [None] * len(requests)
+    codes = [None] * len(requests)
+    barrier = threading.Barrier(len(requests))
+
+    def worker(i, client, url):
+        barrier.wait()
+        began = time.perf_counter()
+        try:
+            codes[i] = client.post(url).status_code
+        except Exception as e:
+            codes[i] = type(e).__name__
+        latencies[i] = time.perf_counter() - began
+
+    threads = [
+        threading.Thread(target=worker, args=(i, client, url))
+        for i, (client, url) in enumerate(requests)
+    ]
+    began = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return latencies, codes, time.perf_counter() - began
+
+
+def report(name, latencies, codes, elapsed):
+    outcomes = ", ".join(f"{code}: {n}" for code, n in sorted(Counter(map(str, codes)).items()))
+    print(
+        f"{name}: {len(codes)} peticiones en {elapsed:.2f} s | "
+        f"p50 {percentile(latencies, 0.5) * 1000:.0f} ms, "
+        f"p95 {percentile(latencies, 0.95) * 1000:.0f} ms, "
+        f"p99 {percentile(latencies, 0.99) * 1000:.0f} ms, "
+        f"máx {max(latencies) * 1000:.0f} ms | {outcomes}"
+    )
+
+
+def check_invariants(event_id, capacity):
+    """Lista de problemas encontrados (vacía si todo cuadra)."""
+    with app.app_context():
+        event = db.session.get(Event, event_id)
+        counts = dict(
+            db.session.query(EventRegistration.status, db.func.count(EventRegistration.id))
+            .filter(EventRegistration.event_id == event_id)
+            .group_by(EventRegistration.status)
+        )
+        duplicated = (
+            db.session.query(EventRegistration.player_id)
+            .filter(
+                EventRegistration.event_id == event_id,
+                EventRegistration.status.in_((CONFIRMED, WAITLISTED)),
+            )
+            .group_by(EventRegistration.player_id)
+            .having(db.func.count() > 1)
+            .count()
+        )
+
+    confirmed, waitlisted = counts.get(CONFIRMED, 0), counts.get(WAITLISTED, 0)
+    print(
+        f"confirmadas {confirmed}/{capacity}, en espera {waitlisted}, "
+        f"canceladas {counts.get('cancelada', 0)} | contadores del evento: "
+        f"plazas_ocupadas {event.plazas_ocupadas}, en_espera {event.en_espera}"
+    )
+    problems = []
+    if confirmed > capacity:
+        problems.append(f"overbooking: {confirmed} confirmadas para {capacity} plazas")
+    if confirmed != event.plazas_ocupadas:
+        problems.append("plazas_ocupadas no coincide con las inscripciones confirmadas")
+    if waitlisted != event.en_espera:
+        problems.append("en_espera no coincide con la lista de espera")
+    if waitlisted and confirmed < capacity:
+        problems.append("hay jugadores en espera con plazas libres")
+    if duplicated:
+        problems.append(f"{duplicated} jugadores con más de una inscripción activa")
+    return problems
+
+
+def delete_event(event_id):
+    with app.app_context():
+        EventRegistration.query.filter_by(event_id=event_id).delete()
+        Event.query.filter_by(id=event_id).delete()
+        db.session.commit()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--jugadores", type=int, default=300, help="Inscripciones simultáneas")
+    parser.add_argument("--capacidad", type=int, default=50, help="Plazas del evento")
+    parser.add_argument("--cancelaciones", type=int, default=0,
+                        help="Cancelaciones (y nuevas inscripciones) en la segunda oleada")
+    parser.add_argument("--conservar", action="store_true", help="No borrar el evento de prueba al terminar")
+    args = parser.parse_args()
+
+    app.config["WTF_CSRF_ENABLED"] = False
+    event_id = create_event(args.capacidad)
+    players = player_users(args.jugadores + args.cancelaciones)
+    signup_url = f"/evento/{event_id}/inscripcion"
+    cancel_url = f"/evento/{event_id}/cancelar"
+
+    try:
+        first, late = players[:args.jugadores], players[args.jugadores:]
+        clients = {user_id: session_client(user_id) for user_id, _ in players}
+        report("inscripciones", *storm([(clients[user_id], signup_url) for user_id, _ in first]))
+
+        if args.cancelaciones:
+            with app.app_context():
+                leaving = [
+                    user_id for (user_id,) in
+                    db.session.query(Player.user_id)
+                    .join(EventRegistration, EventRegistration.player_id == Player.id)
+                    .filter(EventRegistration.event_id == event_id, EventRegistration.status == CONFIRMED)
+                    .order_by(db.func.random())
+                    .limit(args.cancelaciones)
+                ]
+            wave = [(clients[user_id], cancel_url) for user_id in leaving]
+            wave += [(clients[user_id], signup_url) for user_id, _ in late]
+            report("cancelaciones + inscripciones", *storm(wave))
+
+        problems = check_invariants(event_id, args.capacidad)
+    finally:
+        if not args.conservar:
+            delete_event(event_id)
+
+    for problem in problems:
+        print("ERROR:", problem)
+    sys.exit(1 if problems else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,148 @@
+"""Rendimiento de /login con muchos inicios de sesión simultáneos.
+
+Simula la avalancha de accesos tras anunciar un evento: N hilos repiten
+GET /login (token CSRF) + POST /login durante un tiempo fijo y se informa
+de logins por segundo y percentiles de latencia. El coste lo marca bcrypt,
+así que conviene repetirlo con distintos BCRYPT_LOG_ROUNDS en el servidor.
+
+    python benchmarks/login_storm.py http://localhost:8000 \\
+        --email jugador1@scoutme.com --password jugador123 --concurrencia 16
+
+Con --costes no hace falta servidor: mide cuánto tarda un hash con cada
+coste en esta máquina, para elegir BCRYPT_LOG_ROUNDS (unos 250 ms por hash
+es un punto de partida razonable).
+
+    python benchmarks/login_storm.py --costes 10,11,12,13
+"""
+import argparse
+import http.client
+import re
+import threading
+import time
+import urllib.parse
+from collections import Counter
+
+CSRF_RE = re.compile(r'name="csrf_token"[^>]*value="([^"]+)"')
+
+
+def connect(url):
+    cls = http.client.HTTPSConnection if url.scheme == "https" else http.client.HTTPConnection
+    return cls(url.hostname, url.port, timeout=60)
+
+
+def cookie_header(response):
+    cookies = [
+        value.split(";", 1)[0]
+        for name, value in response.getheaders()
+        if name.lower() == "set-cookie"
+    ]
+    return "; ".join(cookies)
+
+
+def login_once(conn, url, email, password):
+    """Un login completo; devuelve True si el servidor abrió la sesión."""
+    conn.request("GET", "/login")
+    page = conn.getresponse()
+    body = page.read().decode("utf-8")
+    cookie = cookie_header(page)
+
+    form = {"email": email, "password": password}
+    match = CSRF_RE.search(body)
+    if match:
+        form["csrf_token"] = match.group(1)
+    conn.request("POST", "/login", body=urllib.parse.urlencode(form), headers={
+        "Content-Type": "application/x-www-form-urlencoded",
+        "Cookie": cookie,
+    })
+    response = conn.getresponse()
+    response.read()
+    # Un login correcto redirige; uno fallido vuelve a pintar el formulario
+    return response.status == 302
+
+
+def worker(url, email, password, deadline, results, lock):
+    conn = connect(url)
+    latencies = []
+    statuses = Counter()
+    while time.perf_counter() < deadline:
+        began = time.perf_counter()
+        try:
+            ok = login_once(conn, url, email, password)
+        except (OSError, http.client.HTTPException):
+            statuses["error"] += 1
+            conn.close()
+            conn = connect(url)
+            continue
+        latencies.append(time.perf_counter() - began)
+        statuses["ok" if ok else "rechazado"] += 1
+    conn.close()
+    with lock:
+        results["latencies"].extend(latencies)
+        results["statuses"].update(statuses)
+
+
+def percentile(values, fraction):
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * fraction))]
+
+
+def measure_costs(costs, samples=5):
+    import bcrypt
+
+    for rounds in costs:
+        salt = bcrypt.gensalt(rounds=rounds)
+        began = time.perf_counter()
+        for _ in range(samples):
+            bcrypt.hashpw(b"contrasena-de-prueba", salt)
+        elapsed = (time.perf_counter() - began) / samples
+        print(f"Coste {rounds:2d}: {elapsed * 1000:7.1f} ms por hash "
+              f"(~{1 / elapsed:.1f} logins/s por núcleo)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("url", nargs="?", help="URL base, p. ej. http://localhost:8000")
+    parser.add_argument("--email")
+    parser.add_argument("--password")
+    parser.add_argument("--concurrencia", type=int, default=16, help="Clientes simultáneos")
+    parser.add_argument("--duracion", type=float, default=10.0, help="Segundos de prueba")
+    parser.add_argument("--costes", help="Solo medir bcrypt con estos costes, p. ej. 10,11,12")
+    args = parser.parse_args()
+
+    if args.costes:
+        measure_costs([int(cost) for cost in args.costes.split(",")])
+        return
+    if not (args.url and args.email and args.password):
+        parser.error("indica la URL, --email y --password (o usa --costes)")
+
+    url = urllib.parse.urlsplit(args.url)
+    results = {"latencies": [], "statuses": Counter()}
+    lock = threading.Lock()
+    deadline = time.perf_counter() + args.duracion
+    threads = [
+        threading.Thread(
+            target=worker,
+            args=(url, args.email, args.password, deadline, results, lock),
+        )
+        for _ in range(args.concurrencia)
+    ]
+    began = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - began
+
+    latencies = results["latencies"]
+    print(f"{args.concurrencia} clientes durante {elapsed:.1f} s")
+    print(f"Logins: {len(latencies)} ({len(latencies) / elapsed:.1f} logins/s)")
+    print("Latencia: p50 {:.1f} ms, p95 {:.1f} ms, p99 {:.1f} ms".format(
+        *(percentile(latencies, f) * 1000 for f in (0.5, 0.95, 0.99))
+    ))
+    print("Respuestas:", dict(results["statuses"]))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,141 @@
+"""Rendimiento de /uploads/<archivo> con peticiones Range concurrentes.
+
+Inicia sesión, averigua el tamaño del video y lanza N hilos que piden rangos
+aleatorios (como un reproductor al avanzar y retroceder) durante un tiempo
+fijo. Informa de peticiones por segundo, MB/s y percentiles de latencia.
+
+    python benchmarks/video_ranges.py http://localhost:8000/uploads/<archivo> \\
+        --email ojeador1@scoutme.com --password ojeador123 --concurrencia 32
+
+Solo usa la biblioteca estándar; sirve igual contra `flask run`, Gunicorn o
+nginx con SENDFILE_MODE para comparar las distintas formas de entrega.
+"""
+import argparse
+import http.client
+import http.cookiejar
+import random
+import re
+import threading
+import time
+import urllib.parse
+import urllib.request
+from collections import Counter
+
+CSRF_RE = re.compile(r'name="csrf_token"[^>]*value="([^"]+)"')
+
+
+def login(base_url, email, password):
+    """Devuelve la cabecera Cookie de una sesión iniciada."""
+    jar = http.cookiejar.CookieJar()
+    opener = urllib.request.build_opener(urllib.request.HTTPCookieProcessor(jar))
+    login_url = urllib.parse.urljoin(base_url, "/login")
+
+    page = opener.open(login_url).read().decode("utf-8")
+    match = CSRF_RE.search(page)
+    form = {"email": email, "password": password}
+    if match:
+        form["csrf_token"] = match.group(1)
+    opener.open(login_url, urllib.parse.urlencode(form).encode())
+
+    if not any(cookie.name == "session" for cookie in jar):
+        raise SystemExit("No se pudo iniciar sesión")
+    return "; ".join(f"{cookie.name}={cookie.value}" for cookie in jar)
+
+
+def connect(url):
+    cls = http.client.HTTPSConnection if url.scheme == "https" else http.client.HTTPConnection
+    return cls(url.hostname, url.port, timeout=30)
+
+
+def total_size(url, cookie):
+    conn = connect(url)
+    conn.request("GET", url.path, headers={"Cookie": cookie, "Range": "bytes=0-0"})
+    response = conn.getresponse()
+    response.read()
+    conn.close()
+    content_range = response.getheader("Content-Range")
+    if response.status != 206 or not content_range:
+        raise SystemExit(f"El servidor no respondió con 206 a un Range (HTTP {response.status})")
+    return int(content_range.rsplit("/", 1)[1])
+
+
+def worker(url, cookie, size, range_size, deadline, results, lock):
+    conn = connect(url)
+    latencies = []
+    statuses = Counter()
+    received = 0
+    while time.perf_counter() < deadline:
+        start = random.randrange(0, max(1, size - range_size))
+        end = min(size, start + range_size) - 1
+        began = time.perf_counter()
+        try:
+            conn.request("GET", url.path, headers={
+                "Cookie": cookie, "Range": f"bytes={start}-{end}",
+            })
+            response = conn.getresponse()
+            body = response.read()
+        except (OSError, http.client.HTTPException):
+            statuses["error"] += 1
+            conn.close()
+            conn = connect(url)
+            continue
+        latencies.append(time.perf_counter() - began)
+        statuses[response.status] += 1
+        received += len(body)
+    conn.close()
+    with lock:
+        results["latencies"].extend(latencies)
+        results["statuses"].update(statuses)
+        results["bytes"] += received
+
+
+def percentile(values, fraction):
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * fraction))]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("url", help="URL completa del video, p. ej. http://localhost:8000/uploads/<archivo>")
+    parser.add_argument("--email", required=True)
+    parser.add_argument("--password", required=True)
+    parser.add_argument("--concurrencia", type=int, default=16, help="Clientes simultáneos")
+    parser.add_argument("--duracion", type=float, default=10.0, help="Segundos de prueba")
+    parser.add_argument("--rango", type=int, default=1024 * 1024, help="Bytes por petición")
+    args = parser.parse_args()
+
+    url = urllib.parse.urlsplit(args.url)
+    cookie = login(args.url, args.email, args.password)
+    size = total_size(url, cookie)
+
+    results = {"latencies": [], "statuses": Counter(), "bytes": 0}
+    lock = threading.Lock()
+    deadline = time.perf_counter() + args.duracion
+    threads = [
+        threading.Thread(
+            target=worker,
+            args=(url, cookie, size, args.rango, deadline, results, lock),
+        )
+        for _ in range(args.concurrencia)
+    ]
+    began = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - began
+
+    latencies = results["latencies"]
+    print(f"Video: {size} bytes, rangos de {args.rango} bytes, {args.concurrencia} clientes")
+    print(f"Peticiones: {len(latencies)} en {elapsed:.1f} s ({len(latencies) / elapsed:.1f} req/s)")
+    print(f"Transferido: {results['bytes'] / elapsed / 1048576:.1f} MB/s")
+    print("Latencia: p50 {:.1f} ms, p95 {:.1f} ms, p99 {:.1f} ms".format(
+        *(percentile(latencies, f) * 1000 for f in (0.5, 0.95, 0.99))
+    ))
+    print("Respuestas:", dict(results["statuses"]))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,90 @@
+import json
+import threading
+import time
+from collections import OrderedDict
+
+# --------------------------------------------------
+# CACHÉ EN MEMORIA
+# --------------------------------------------------
+_MISSING = object()
+
+
+class TTLCache:
+    """Caché LRU con caducidad por entrada, segura entre hilos.
+
+    Es local al proceso: cada worker tiene la suya, así que solo se usa para
+    datos que toleran unos segundos de retraso o que se invalidan
+    explícitamente.
+    """
+
+    def __init__(self, maxsize=1024, ttl=60, clock=time.monotonic):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.clock = clock
+        self.lock = threading.Lock()
+        self.data = OrderedDict()
+
+    def get(self, key, default=None):
+        with self.lock:
+            entry = self.data.get(key, _MISSING)
+            if entry is _MISSING:
+                return default
+            expires_at, value = entry
+            if expires_at <= self.clock():
+                del self.data[key]
+                return default
+            self.data.move_to_end(key)
+            return value
+
+    def set(self, key, value, ttl=None):
+        expires_at = self.clock() + (self.ttl if ttl is None else ttl)
+        with self.lock:
+            self.data[key] = (expires_at, value)
+            self.data.move_to_end(key)
+            while len(self.data) > self.maxsize:
+                self.data.popitem(last=False)
+
+    def delete(self, key):
+        with self.lock:
+            self.data.pop(key, None)
+
+    def clear(self):
+        with self.lock:
+            self.data.clear()
+
+    def get_or_set(self, key, factory, ttl=None):
+        value = self.get(key, _MISSING)
+        if value is _MISSING:
+            value = factory()
+            self.set(key, value, ttl)
+        return value
+
+
+class RedisCache:
+    """Nivel compartido entre procesos sobre Redis; los valores se guardan en JSON."""
+
+    def __init__(self, url, prefix="scoutme:", ttl=60):
+        try:
+            import redis
+        except ImportError:
+            raise RuntimeError(
+                "Se configuró una caché Redis pero el paquete 'redis' "
+                "no está instalado (pip install redis)"
+            )
+        self.client = redis.Redis.from_url(url)
+        self.prefix = prefix
+        self.ttl = ttl
+
+    def get(self, key, default=None):
+        raw = self.client.get(self.prefix + key)
+        return default if raw is None else json.loads(raw)
+
+    def set(self, key, value, ttl=None):
+        self.client.set(self.prefix + key, json.dumps(value), ex=ttl or self.ttl)
+
+    def delete(self, key):
+        self.client.delete(self.prefix + key)
+
+    def incr(self, key):
+        # Contador atómico entre procesos; se lee con get() como un entero
+        return self.client.incr(self.prefix + key)
@@ -10,10 +10,59 @@ class Config:
     FLASK_ENV = os.environ.get('FLASK_ENV') or 'development'
     MAX_CONTENT_LENGTH = int(os.environ.get('MAX_CONTENT_LENGTH', 104857600))  # 100MB
     UPLOAD_FOLDER = os.environ.get('UPLOAD_FOLDER', 'uploads')
+    # Coste de bcrypt (2^n iteraciones): cada +1 duplica el tiempo de registro y login.
+    # Al cambiarlo, los hashes existentes se regeneran en el siguiente login correcto
+    BCRYPT_LOG_ROUNDS = int(os.environ.get('BCRYPT_LOG_ROUNDS', 12))
+    # Subidas por partes: tamaño máximo del video completo y de cada trozo
+    MAX_VIDEO_SIZE = int(os.environ.get('MAX_VIDEO_SIZE', MAX_CONTENT_LENGTH))
+    UPLOAD_CHUNK_SIZE = int(os.environ.get('UPLOAD_CHUNK_SIZE', 5242880))  # 5MB
+
+    # Almacenamiento de videos: 'local' (UPLOAD_FOLDER) o 's3' (AWS, MinIO...)
+    STORAGE_BACKEND = os.environ.get('STORAGE_BACKEND', 'local')
+    S3_BUCKET = os.environ.get('S3_BUCKET')
+    S3_ENDPOINT_URL = os.environ.get('S3_ENDPOINT_URL')  # p. ej. http://localhost:9000 para MinIO
+    S3_REGION = os.environ.get('S3_REGION')
+    S3_ACCESS_KEY_ID = os.environ.get('S3_ACCESS_KEY_ID')
+    S3_SECRET_ACCESS_KEY = os.environ.get('S3_SECRET_ACCESS_KEY')
+    S3_PREFIX = os.environ.get('S3_PREFIX', '')
+    S3_URL_EXPIRES = int(os.environ.get('S3_URL_EXPIRES', 3600))  # validez de las URLs prefirmadas
+
+    # Entrega de videos locales: sin valor los sirve Flask; 'x-accel' (nginx) o
+    # 'x-sendfile' (Apache/lighttpd) se los cede al servidor web tras comprobar la sesión
+    SENDFILE_MODE = os.environ.get('SENDFILE_MODE') or None
+    SENDFILE_INTERNAL_PREFIX = os.environ.get('SENDFILE_INTERNAL_PREFIX', '/_protected/')
+
+    # Trabajos en segundo plano (`flask trabajos`) y procesado de videos con ffmpeg
+    JOB_WORKERS = int(os.environ.get('JOB_WORKERS', 2))
+    JOB_POLL_SECONDS = float(os.environ.get('JOB_POLL_SECONDS', 2))
+    JOB_LOCK_TIMEOUT = int(os.environ.get('JOB_LOCK_TIMEOUT', 3600))  # después se reintenta
+    JOB_WAKEUP_URL = os.environ.get('JOB_WAKEUP_URL')  # redis://... para no esperar al sondeo
+    FFMPEG_BIN = os.environ.get('FFMPEG_BIN', 'ffmpeg')
+    FFPROBE_BIN = os.environ.get('FFPROBE_BIN', 'ffprobe')
+    PROCESSING_TIMEOUT = int(os.environ.get('PROCESSING_TIMEOUT', 1800))
+
+    # Tiempo real (SSE): memory:// para un solo proceso, redis://... para varios workers
+    REALTIME_BROKER_URL = os.environ.get('REALTIME_BROKER_URL', 'memory://')
+    SSE_HEARTBEAT_SECONDS = int(os.environ.get('SSE_HEARTBEAT_SECONDS', 15))
+
+    # Segundos que se cachean los totales del panel de administración
+    ADMIN_STATS_TTL = int(os.environ.get('ADMIN_STATS_TTL', 30))
+
+    # Segundos que cada proceso reutiliza un calendario de eventos (.ics) generado
+    EVENTS_FEED_TTL = int(os.environ.get('EVENTS_FEED_TTL', 300))
+
+    # Caché del usuario de sesión (por proceso; opcionalmente compartida en Redis)
+    IDENTITY_CACHE_TTL = int(os.environ.get('IDENTITY_CACHE_TTL', 300))
+    IDENTITY_CACHE_URL = os.environ.get('IDENTITY_CACHE_URL')
+
+    # Caché de resultados del buscador (0 la desactiva; opcionalmente compartida en Redis)
+    SEARCH_CACHE_TTL = int(os.environ.get('SEARCH_CACHE_TTL', 60))
+    SEARCH_CACHE_URL = os.environ.get('SEARCH_CACHE_URL')
 
     # Email config (optional)
     MAIL_SERVER = os.environ.get('MAIL_SERVER')
     MAIL_PORT = int(os.environ.get('MAIL_PORT', 587))
     MAIL_USE_TLS = os.environ.get('MAIL_USE_TLS', 'True').lower() == 'true'
     MAIL_USERNAME = os.environ.get('MAIL_USERNAME')
-    MAIL_PASSWORD = os.environ.get('MAIL_PASSWORD')
\ No newline at end of file
+    MAIL_PASSWORD = os.environ.get('MAIL_PASSWORD')
+    MAIL_DEFAULT_SENDER = os.environ.get('MAIL_DEFAULT_SENDER', 'ScoutMe <no-reply@scoutme.com>')
\ No newline at end of file
@@ -0,0 +1,74 @@
+import mimetypes
+import os
+
+from flask import Response, request, send_file
+
+# --------------------------------------------------
+# ENTREGA DE VIDEOS
+# --------------------------------------------------
+# Flask solo comprueba la sesión y las cabeceras condicionales. Si hay un
+# servidor web delante (SENDFILE_MODE), le cede el archivo con
+# X-Accel-Redirect (nginx) o X-Sendfile (Apache, lighttpd): el worker queda
+# libre al instante y el servidor atiende los rangos con sendfile(2). Sin
+# servidor delante, send_file() responde a las peticiones Range desde Python
+# y, con la petición completa, el servidor WSGI puede usar su file_wrapper.
+SENDFILE_MODES = ("x-accel", "x-sendfile")
+IMMUTABLE_MAX_AGE = 31536000  # un año
+
+
+def content_type(filename):
+    return mimetypes.guess_type(filename)[0] or "application/octet-stream"
+
+
+def immutable_cache(response, etag, max_age):
+    # ETag fuerte (el sha256) y caché privada: los videos exigen sesión
+    response.set_etag(etag)
+    response.cache_control.no_cache = None
+    response.cache_control.public = False
+    response.cache_control.private = True
+    response.cache_control.max_age = max_age
+    response.cache_control.immutable = True
+    return response
+
+
+def handoff_response(path, key, filename, mode, internal_prefix):
+    """Respuesta vacía que pide al servidor web enviar el archivo."""
+    response = Response(mimetype=content_type(filename))
+    response.headers["Accept-Ranges"] = "bytes"
+    if mode == "x-accel":
+        # La location interna de nginx apunta a la raíz del almacenamiento local
+        response.headers["X-Accel-Redirect"] = internal_prefix + key
+    else:
+        response.headers["X-Sendfile"] = os.path.abspath(path)
+    return response
+
+
+def serve_file(path, key, filename, etag=None, mode=None,
+               internal_prefix="/_protected/", max_age=IMMUTABLE_MAX_AGE):
+    """Sirve un archivo local del almacenamiento.
+
+    `etag` es el sha256 de los blobs (contenido inmutable); None para los
+    archivos antiguos, que se sirven sin caché de larga duración.
+    """
+    if mode not in SENDFILE_MODES:
+        response = send_file(
+            path,
+            mimetype=content_type(filename),
+            etag=etag or True,
+            conditional=True,
+            max_age=max_age if etag else None,
+        )
+        return immutable_cache(response, etag, max_age) if etag else response
+
+    if etag and request.if_none_match.contains(etag):
+        response = Response(status=304)
+    else:
+        response = handoff_response(path, key, filename, mode, internal_prefix)
+    return immutable_cache(response, etag, max_age) if etag else response
+
+
+def serve_bytes(data, filename, etag, max_age=IMMUTABLE_MAX_AGE):
+    """Respuesta inmutable para contenido pequeño leído del almacenamiento (listas HLS)."""
+    response = Response(data, mimetype=content_type(filename))
+    immutable_cache(response, etag, max_age)
+    return response.make_conditional(request)
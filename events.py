@@ -0,0 +1,360 @@
+import hashlib
+from datetime import datetime, timedelta
+
+from itsdangerous import BadSignature, URLSafeSerializer
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import joinedload
+
+from cache import TTLCache
+from forms import EVENT_SPORTS
+from models import db, Event, EventRegistration
+from pagination import encode_cursor, decode_cursor, cursor_datetime, cursor_int, clamp_per_page
+
+# --------------------------------------------------
+# LISTADO DE EVENTOS
+# --------------------------------------------------
+# Próximos en orden ascendente desde ahora y pasados en orden descendente,
+# paginados por cursor sobre (fecha, id). El índice (fecha, deporte) sirve el
+# rango de fechas y el filtro por deporte sin ordenar la tabla entera.
+EVENTS_PER_PAGE = 24
+EVENTS_MAX_PER_PAGE = 100
+VIEWS = ("proximos", "pasados")
+SPORTS = tuple(value for value, _ in EVENT_SPORTS)
+
+
+def parse_date(value):
+    try:
+        return datetime.strptime((value or "").strip(), "%Y-%m-%d")
+    except ValueError:
+        return None
+
+
+def parse_event_filters(args):
+    filters = {"vista": args.get("vista") if args.get("vista") in VIEWS else "proximos"}
+    if args.get("deporte") in SPORTS:
+        filters["deporte"] = args["deporte"]
+    for field in ("desde", "hasta"):
+        if parse_date(args.get(field)):
+            filters[field] = args[field].strip()
+    return filters
+
+
+def filtered_events(filters, now=None):
+    now = now or datetime.now()
+    query = Event.query.options(joinedload(Event.scout))
+
+    if filters.get("vista") == "pasados":
+        query = query.filter(Event.fecha < now)
+    else:
+        query = query.filter(Event.fecha >= now)
+    if filters.get("desde"):
+        query = query.filter(Event.fecha >= parse_date(filters["desde"]))
+    if filters.get("hasta"):
+        # "hasta" incluye el día entero
+        query = query.filter(Event.fecha < parse_date(filters["hasta"]) + timedelta(days=1))
+    if filters.get("deporte"):
+        query = query.filter(Event.deporte == filters["deporte"])
+    return query
+
+
+def event_page(filters, cursor=None, per_page=EVENTS_PER_PAGE, now=None):
+    """Eventos de la vista pedida. Devuelve (eventos, siguiente_cursor)."""
+    per_page = clamp_per_page(per_page, EVENTS_PER_PAGE, EVENTS_MAX_PER_PAGE)
+    query = filtered_events(filters, now)
+    past = filters.get("vista") == "pasados"
+
+    after = decode_cursor(cursor)
+    if after and len(after) == 2 and cursor_datetime(after[0]) and cursor_int(after[1]) is not None:
+        fecha, event_id = cursor_datetime(after[0]), after[1]
+        if past:
+            query = query.filter(db.or_(
+                Event.fecha < fecha, db.and_(Event.fecha == fecha, Event.id < event_id)
+            ))
+        else:
+            query = query.filter(db.or_(
+                Event.fecha > fecha, db.and_(Event.fecha == fecha, Event.id > event_id)
+            ))
+
+    if past:
+        query = query.order_by(Event.fecha.desc(), Event.id.desc())
+    else:
+        query = query.order_by(Event.fecha.asc(), Event.id.asc())
+    rows = query.limit(per_page + 1).all()
+
+    next_cursor = None
+    if len(rows) > per_page:
+        rows = rows[:per_page]
+        next_cursor = encode_cursor([rows[-1].fecha, rows[-1].id])
+    return rows, next_cursor
+
+
+def get_event(event_id):
+    return Event.query.options(joinedload(Event.scout)).filter_by(id=event_id).first()
+
+
+# --------------------------------------------------
+# INSCRIPCIONES
+# --------------------------------------------------
+# Al abrir unas pruebas cientos de jugadores se inscriben a la vez, así que
+# las plazas no se cuentan antes de insertar: se reservan con un UPDATE
+# condicional sobre Event.plazas_ocupadas, que la base de datos aplica de uno
+# en uno por evento. Toda operación escribe primero en la fila del evento
+# (bloqueo de fila en PostgreSQL, transacción de escritura en SQLite) y solo
+# después toca las inscripciones, así nunca se sobrepasa la capacidad, los
+# contadores cuadran y el orden de bloqueo es siempre el mismo.
+CONFIRMED = "confirmada"
+WAITLISTED = "espera"
+CANCELLED = "cancelada"
+ACTIVE_STATUSES = (CONFIRMED, WAITLISTED)
+
+
+class RegistrationError(Exception):
+    pass
+
+
+def _update_event(event_id, *conditions, **values):
+    statement = (
+        db.update(Event)
+        .where(Event.id == event_id, *conditions)
+        .values(**values)
+        .execution_options(synchronize_session=False)
+    )
+    return db.session.execute(statement).rowcount == 1
+
+
+def take_seat(event_id):
+    """Reserva una plaza si queda alguna libre. Devuelve True si la consiguió."""
+    return _update_event(
+        event_id,
+        db.or_(Event.capacidad_maxima.is_(None), Event.plazas_ocupadas < Event.capacidad_maxima),
+        plazas_ocupadas=Event.plazas_ocupadas + 1,
+    )
+
+
+def lock_event(event_id):
+    # Escritura sin cambios: solo para tomar el bloqueo del evento
+    return _update_event(event_id, plazas_ocupadas=Event.plazas_ocupadas)
+
+
+def active_registration(event_id, player_id):
+    return EventRegistration.query.filter(
+        EventRegistration.event_id == event_id,
+        EventRegistration.player_id == player_id,
+        EventRegistration.status.in_(ACTIVE_STATUSES),
+    ).first()
+
+
+def register_player(event, player_id, now=None):
+    """Inscribe al jugador con plaza o, si no quedan, en la lista de espera.
+
+    Devuelve la inscripción (la que ya tenía si estaba inscrito). El llamador
+    hace commit; si otra petición del mismo jugador gana la carrera se hace
+    rollback y se devuelve la suya.
+    """
+    if event.fecha < (now or datetime.now()):
+        raise RegistrationError("El evento ya se ha celebrado")
+    current = active_registration(event.id, player_id)
+    if current:
+        return current
+
+    if take_seat(event.id):
+        status = CONFIRMED
+    else:
+        # Sin plaza: apuntarse a la lista de espera bloquea el evento y se
+        # reintenta, por si una cancelación liberó una plaza entre medias
+        _update_event(event.id, en_espera=Event.en_espera + 1)
+        if take_seat(event.id):
+            _update_event(event.id, en_espera=Event.en_espera - 1)
+            status = CONFIRMED
+        else:
+            status = WAITLISTED
+
+    # Una inscripción cancelada se sustituye: vuelve al final de la cola
+    db.session.execute(db.delete(EventRegistration).where(
+        EventRegistration.event_id == event.id,
+        EventRegistration.player_id == player_id,
+        EventRegistration.status == CANCELLED,
+    ))
+    registration = EventRegistration(event_id=event.id, player_id=player_id, status=status)
+    db.session.add(registration)
+    try:
+        db.session.flush()
+    except IntegrityError:
+        db.session.rollback()
+        current = active_registration(event.id, player_id)
+        if current is None:
+            raise
+        return current
+    return registration
+
+
+def cancel_registration(registration):
+    """Cancela la inscripción. Si liberaba una plaza, esta pasa al primero de
+    la lista de espera, cuya inscripción se devuelve. El llamador hace commit.
+    """
+    lock_event(registration.event_id)
+    # Con el evento bloqueado el estado leído ya no puede cambiar
+    db.session.refresh(registration)
+    if registration.status not in ACTIVE_STATUSES:
+        return None
+
+    was_confirmed = registration.status == CONFIRMED
+    registration.status = CANCELLED
+    registration.updated_at = datetime.utcnow()
+    if not was_confirmed:
+        _update_event(registration.event_id, en_espera=Event.en_espera - 1)
+        db.session.flush()
+        return None
+
+    promoted = (
+        EventRegistration.query
+        .filter_by(event_id=registration.event_id, status=WAITLISTED)
+        .order_by(EventRegistration.id)
+        .first()
+    )
+    if promoted:
+        # La plaza cambia de manos: plazas_ocupadas no varía
+        promoted.status = CONFIRMED
+        promoted.updated_at = datetime.utcnow()
+        _update_event(registration.event_id, en_espera=Event.en_espera - 1)
+    else:
+        _update_event(registration.event_id, plazas_ocupadas=Event.plazas_ocupadas - 1)
+    db.session.flush()
+    return promoted
+
+
+def waitlist_position(registration):
+    if registration.status != WAITLISTED:
+        return None
+    return EventRegistration.query.filter(
+        EventRegistration.event_id == registration.event_id,
+        EventRegistration.status == WAITLISTED,
+        EventRegistration.id <= registration.id,
+    ).count()
+
+
+def event_registrations(event_id):
+    """Inscripciones activas con su jugador: confirmadas y después la cola."""
+    return (
+        EventRegistration.query
+        .options(joinedload(EventRegistration.player))
+        .filter(
+            EventRegistration.event_id == event_id,
+            EventRegistration.status.in_(ACTIVE_STATUSES),
+        )
+        .order_by(EventRegistration.status, EventRegistration.id)
+        .all()
+    )
+
+
+# --------------------------------------------------
+# CALENDARIO (iCalendar)
+# --------------------------------------------------
+# Los clientes de calendario no envían la cookie de sesión, así que cada
+# usuario suscribe una URL firmada con SECRET_KEY. El feed de cada deporte se
+# genera una vez cada EVENTS_FEED_TTL segundos por proceso (o al crear un
+# evento) y se sirve con ETag: un sondeo sin cambios responde 304 sin cuerpo.
+FEED_SALT = "calendario"
+FEED_PAST_DAYS = 30
+FEED_MAX_EVENTS = 1000
+FEED_ALL = "todos"
+
+_feed_cache = TTLCache(maxsize=len(SPORTS) + 1)
+
+
+def feed_token(secret_key, user_id):
+    return URLSafeSerializer(secret_key, salt=FEED_SALT).dumps(user_id)
+
+
+def feed_user_id(secret_key, token):
+    try:
+        return URLSafeSerializer(secret_key, salt=FEED_SALT).loads(token)
+    except BadSignature:
+        return None
+
+
+def ics_escape(value):
+    return (
+        (value or "").replace("\\", "\\\\").replace(";", "\\;")
+        .replace(",", "\\,").replace("\r\n", "\\n").replace("\n", "\\n")
+    )
+
+
+def ics_line(line):
+    """Pliega la línea a 75 octetos como pide RFC 5545."""
+    raw = line.encode("utf-8")
+    if len(raw) <= 75:
+        return line + "\r\n"
+    parts, current = [], b""
+    for char in line:
+        encoded = char.encode("utf-8")
+        if len(current) + len(encoded) > (75 if not parts else 74):
+            parts.append(current.decode("utf-8"))
+            current = b""
+        current += encoded
+    parts.append(current.decode("utf-8"))
+    return "\r\n ".join(parts) + "\r\n"
+
+
+def ics_event(event, url, stamp):
+    lines = [
+        "BEGIN:VEVENT",
+        f"UID:evento-{event.id}@scoutme",
+        f"DTSTAMP:{stamp}",
+    ]
+    # Los eventos creados desde el formulario solo tienen fecha: día completo
+    if event.fecha.time() == datetime.min.time():
+        lines.append(f"DTSTART;VALUE=DATE:{event.fecha:%Y%m%d}")
+    else:
+        lines.append(f"DTSTART:{event.fecha:%Y%m%dT%H%M%S}")
+    lines.append(f"SUMMARY:{ics_escape(event.titulo)}")
+    if event.ubicacion:
+        lines.append(f"LOCATION:{ics_escape(event.ubicacion)}")
+    description = event.descripcion or ""
+    if event.scout:
+        description = f"Organiza: {event.scout.nombre} {event.scout.apellido}\n{description}"
+    lines.append(f"DESCRIPTION:{ics_escape(description.strip())}")
+    if event.deporte:
+        lines.append(f"CATEGORIES:{ics_escape(event.deporte)}")
+    lines.extend([f"URL:{url}", "END:VEVENT"])
+    return lines
+
+
+def build_feed(deporte, event_url, now=None):
+    """(cuerpo, etag) del calendario de `deporte` (None para todos los deportes)."""
+    now = now or datetime.now()
+    query = Event.query.options(joinedload(Event.scout)).filter(
+        Event.fecha >= now - timedelta(days=FEED_PAST_DAYS)
+    )
+    if deporte:
+        query = query.filter(Event.deporte == deporte)
+    events = query.order_by(Event.fecha, Event.id).limit(FEED_MAX_EVENTS).all()
+
+    name = f"ScoutMe - {deporte}" if deporte else "ScoutMe - Eventos"
+    lines = [
+        "BEGIN:VCALENDAR",
+        "VERSION:2.0",
+        "PRODID:-//ScoutMe//Eventos//ES",
+        "CALSCALE:GREGORIAN",
+        f"X-WR-CALNAME:{ics_escape(name)}",
+    ]
+    for event in events:
+        # DTSTAMP fijo por evento para que el cuerpo (y el ETag) solo cambie con los datos
+        stamp = (event.created_at or event.fecha).strftime("%Y%m%dT%H%M%SZ")
+        lines.extend(ics_event(event, event_url(event.id), stamp))
+    lines.append("END:VCALENDAR")
+
+    body = "".join(ics_line(line) for line in lines).encode("utf-8")
+    return body, hashlib.sha256(body).hexdigest()
+
+
+def event_feed(deporte, event_url, ttl=300):
+    return _feed_cache.get_or_set(
+        deporte or FEED_ALL, lambda: build_feed(deporte, event_url), ttl=ttl
+    )
+
+
+def invalidate_feeds(deporte):
+    _feed_cache.delete(FEED_ALL)
+    if deporte:
+        _feed_cache.delete(deporte)
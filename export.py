@@ -0,0 +1,81 @@
+import csv
+import io
+import json
+
+from search import ranked_query
+
+# --------------------------------------------------
+# EXPORTACIÓN DE RESULTADOS
+# --------------------------------------------------
+# Las exportaciones recorren la búsqueda completa con yield_per (cursor del
+# lado del servidor en PostgreSQL) y se envían fila a fila como respuesta en
+# streaming: la memoria del worker no crece con el número de resultados.
+EXPORT_BATCH_SIZE = 500
+EXPORT_FORMATS = {
+    "csv": "text/csv",
+    "ndjson": "application/x-ndjson",
+    "jsonl": "application/x-ndjson",
+}
+EXPORT_FIELDS = (
+    "id", "nombre", "apellido", "deporte", "posicion", "edad", "fecha_nacimiento",
+    "pais", "ciudad", "nivel", "altura", "peso", "sitio_web", "descripcion",
+)
+# Una celda que empieza por estos caracteres es una fórmula para Excel
+FORMULA_PREFIXES = ("=", "+", "-", "@", "\t", "\r")
+
+
+def iter_players(filters, batch_size=EXPORT_BATCH_SIZE):
+    """Todos los jugadores que encuentra la búsqueda, en su orden y por lotes."""
+    query, _ = ranked_query(filters)
+    for player, _ in query.yield_per(batch_size):
+        yield player
+
+
+def player_record(player):
+    record = {field: getattr(player, field) for field in EXPORT_FIELDS}
+    if record["fecha_nacimiento"]:
+        record["fecha_nacimiento"] = record["fecha_nacimiento"].isoformat()
+    return record
+
+
+def csv_cell(value):
+    if value is None:
+        return ""
+    if isinstance(value, str) and value.startswith(FORMULA_PREFIXES):
+        return "'" + value
+    return value
+
+
+def export_csv(players, rows_per_chunk=EXPORT_BATCH_SIZE):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    # BOM para que Excel abra el UTF-8 con acentos correctamente
+    buffer.write("\ufeff")
+    writer.writerow(EXPORT_FIELDS)
+    for n, player in enumerate(players, 1):
+        record = player_record(player)
+        writer.writerow([csv_cell(record[field]) for field in EXPORT_FIELDS])
+        if n % rows_per_chunk == 0:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue()
+
+
+def export_ndjson(players, rows_per_chunk=EXPORT_BATCH_SIZE):
+    lines = []
+    for player in players:
+        lines.append(json.dumps(player_record(player), ensure_ascii=False))
+        if len(lines) == rows_per_chunk:
+            yield "\n".join(lines) + "\n"
+            lines = []
+    if lines:
+        yield "\n".join(lines) + "\n"
+
+
+def export_players(filters, fmt):
+    """Generador con el contenido de la exportación en el formato `fmt`."""
+    players = iter_players(filters)
+    if fmt == "csv":
+        return export_csv(players)
+    return export_ndjson(players)
@@ -179,9 +179,14 @@ from wtforms import (
     DateField, FloatField, IntegerField, FileField
 )
 from wtforms.validators import (
-    DataRequired, Email, Length, Optional, EqualTo, NumberRange, URL
+    DataRequired, Email, Length, Optional, EqualTo, NumberRange, URL,
+    ValidationError
 )
+from wtforms.widgets import HiddenInput
 from flask_wtf.file import FileAllowed
+from flask_login import current_user
+
+from models import db, User
 
 
 # ----------------------
@@ -374,6 +379,17 @@ class VideoForm(FlaskForm):
 # ----------------------
 # FORMULARIO EVENTOS
 # ----------------------
+EVENT_SPORTS = [
+    ('fútbol', 'Fútbol'),
+    ('baloncesto', 'Baloncesto'),
+    ('tenis', 'Tenis'),
+    ('voleibol', 'Voleibol'),
+    ('natación', 'Natación'),
+    ('atletismo', 'Atletismo'),
+    ('otro', 'Otro')
+]
+
+
 class EventForm(FlaskForm):
     titulo = StringField('Título', validators=[DataRequired(), Length(max=200)])
     descripcion = TextAreaField('Descripción', validators=[Optional()])
@@ -382,15 +398,7 @@ class EventForm(FlaskForm):
 
     deporte = SelectField(
         'Deporte',
-        choices=[
-            ('fútbol', 'Fútbol'),
-            ('baloncesto', 'Baloncesto'),
-            ('tenis', 'Tenis'),
-            ('voleibol', 'Voleibol'),
-            ('natación', 'Natación'),
-            ('atletismo', 'Atletismo'),
-            ('otro', 'Otro')
-        ],
+        choices=EVENT_SPORTS,
         validators=[Optional()],
         coerce=str
     )
@@ -399,16 +407,32 @@ class EventForm(FlaskForm):
     submit = SubmitField('Crear Evento')
 
 
+class EventRegistrationForm(FlaskForm):
+    # Solo lleva el token CSRF: sirve para inscribirse y para cancelar
+    submit = SubmitField('Inscribirme al Evento')
+
+
 # ----------------------
 # FORMULARIO MENSAJES
 # ----------------------
 class MessageForm(FlaskForm):
-    receiver_id = SelectField('Destinatario', coerce=int, validators=[DataRequired()])
+    # El destinatario se elige con el buscador de /api/destinatarios
+    receiver_id = IntegerField('Destinatario', widget=HiddenInput(), validators=[DataRequired(message='Selecciona un destinatario')])
     subject = StringField('Asunto', validators=[DataRequired(), Length(max=200)])
     content = TextAreaField('Mensaje', validators=[DataRequired()])
     conversation_id = StringField('Conversation ID')  # Hidden field for conversation threads
     submit = SubmitField('Enviar Mensaje')
 
+    def validate_receiver_id(self, field):
+        # Una sola consulta por clave primaria en lugar de cargar todas las opciones
+        exists = db.session.query(User.id).filter(
+            User.id == field.data,
+            User.id != current_user.id,
+            User.is_active == db.true(),
+        ).first()
+        if exists is None:
+            raise ValidationError('Destinatario no válido')
+
 class ReplyForm(FlaskForm):
     content = TextAreaField('Mensaje', validators=[DataRequired()])
     submit = SubmitField('Enviar Respuesta')
@@ -418,6 +442,7 @@ class ReplyForm(FlaskForm):
 # FORMULARIO BÚSQUEDA
 # ----------------------
 class SearchForm(FlaskForm):
+    q = StringField('Buscar', validators=[Optional(), Length(max=200)])
     deporte = SelectField(
         'Deporte',
         choices=[
@@ -453,3 +478,11 @@ class SearchForm(FlaskForm):
     )
 
     submit = SubmitField('Buscar')
+
+
+# ----------------------
+# FORMULARIO IMPORTACIÓN DE JUGADORES
+# ----------------------
+class RosterImportForm(FlaskForm):
+    archivo = FileField('Archivo CSV o JSONL', validators=[DataRequired(), FileAllowed(['csv', 'jsonl', 'ndjson'], 'Solo archivos CSV o JSONL')])
+    submit = SubmitField('Importar Jugadores')
@@ -0,0 +1,137 @@
+import mimetypes
+import os
+import re
+import shutil
+import tempfile
+
+from flask import current_app
+
+from jobs import enqueue, handler, heartbeat
+from models import db, Blob
+from processing import probe, run_tool
+from storage import get_storage, blob_key, hls_prefix
+
+# --------------------------------------------------
+# STREAMING ADAPTATIVO (HLS)
+# --------------------------------------------------
+# Cada video procesado se empaqueta en segmentos HLS de 4 s a varias
+# calidades; el reproductor elige la que permite la conexión y cambia sobre
+# la marcha. El paquete pertenece al blob (hls/<sha256>/...), así los videos
+# con el mismo contenido lo comparten y, como nunca cambia, listas y
+# segmentos se sirven con caché inmutable. Mientras no está listo, el
+# reproductor usa el MP4 original.
+HLS_JOB = "empaquetar_hls"
+SEGMENT_SECONDS = 4
+# (altura, bitrate de video, bitrate de audio)
+LADDER = (
+    (360, 600000, 64000),
+    (480, 1000000, 96000),
+    (720, 2500000, 128000),
+)
+VIDEO_CODEC = "avc1.4d401f"  # H.264 Main, nivel 3.1
+AUDIO_CODEC = "mp4a.40.2"  # AAC-LC
+HLS_NAME_RE = re.compile(r"^(master\.m3u8|\d{3,4}p/(index\.m3u8|segment_\d{5}\.ts))$")
+
+mimetypes.add_type("video/mp2t", ".ts")
+
+
+def hls_key(sha256, name):
+    return hls_prefix(sha256) + name
+
+
+def valid_hls_name(name):
+    return bool(HLS_NAME_RE.match(name))
+
+
+def ladder_for(height):
+    """Calidades que no superan la resolución original (al menos la más baja)."""
+    rungs = [rung for rung in LADDER if not height or rung[0] <= height]
+    return rungs or [LADDER[0]]
+
+
+def schedule_packaging(blob):
+    if not blob.hls:
+        enqueue(HLS_JOB, {"blob_id": blob.id})
+
+
+def package_command(ffmpeg, source, folder, rungs, has_audio):
+    split = "".join(f"[v{n}]" for n in range(len(rungs)))
+    filters = [f"[0:v]split={len(rungs)}{split}"] + [
+        f"[v{n}]scale=-2:{height}[o{n}]" for n, (height, _, _) in enumerate(rungs)
+    ]
+    command = [ffmpeg, "-y", "-v", "error", "-i", source, "-filter_complex", ";".join(filters)]
+
+    for n, (height, video_rate, audio_rate) in enumerate(rungs):
+        output = os.path.join(folder, f"{height}p")
+        os.makedirs(output)
+        command += ["-map", f"[o{n}]"]
+        if has_audio:
+            command += ["-map", "0:a:0", "-c:a", "aac", "-b:a", str(audio_rate), "-ac", "2"]
+        command += [
+            "-c:v", "libx264", "-preset", "veryfast", "-profile:v", "main", "-level", "3.1",
+            "-pix_fmt", "yuv420p",
+            "-b:v", str(video_rate), "-maxrate", str(video_rate * 107 // 100),
+            "-bufsize", str(video_rate * 2),
+            # Fotogramas clave alineados en todas las calidades para poder cambiar entre ellas
+            "-force_key_frames", f"expr:gte(t,n_forced*{SEGMENT_SECONDS})", "-sc_threshold", "0",
+            "-f", "hls", "-hls_time", str(SEGMENT_SECONDS), "-hls_playlist_type", "vod",
+            "-hls_flags", "independent_segments",
+            "-hls_segment_filename", os.path.join(output, "segment_%05d.ts"),
+            os.path.join(output, "index.m3u8"),
+        ]
+    return command
+
+
+def master_playlist(rungs, width, height, has_audio):
+    codecs = f"{VIDEO_CODEC},{AUDIO_CODEC}" if has_audio else VIDEO_CODEC
+    lines = ["#EXTM3U", "#EXT-X-VERSION:3", "#EXT-X-INDEPENDENT-SEGMENTS"]
+    for rung_height, video_rate, audio_rate in rungs:
+        # Pico declarado: maxrate + audio + ~10 % de cabeceras del contenedor
+        bandwidth = (video_rate * 107 // 100 + (audio_rate if has_audio else 0)) * 11 // 10
+        info = f"BANDWIDTH={bandwidth},CODECS=\"{codecs}\""
+        if width and height:
+            info += f",RESOLUTION={round(width * rung_height / height / 2) * 2}x{rung_height}"
+        lines += [f"#EXT-X-STREAM-INF:{info}", f"{rung_height}p/index.m3u8"]
+    return "\n".join(lines) + "\n"
+
+
+@handler(HLS_JOB)
+def package_hls(blob_id):
+    blob = db.session.get(Blob, blob_id)
+    if blob is None or blob.hls:
+        return
+
+    config = current_app.config
+    storage = get_storage(current_app)
+    scratch = os.path.join(current_app.root_path, config["UPLOAD_FOLDER"])
+    os.makedirs(os.path.join(scratch, "tmp"), exist_ok=True)
+    folder = tempfile.mkdtemp(dir=os.path.join(scratch, "tmp"))
+
+    try:
+        with storage.local_file(blob_key(blob.sha256), scratch) as source:
+            info = probe(source, config["FFPROBE_BIN"], config["PROCESSING_TIMEOUT"])
+            heartbeat()
+            rungs = ladder_for(info["height"])
+            has_audio = info["audio_codec"] is not None
+            run_tool(
+                package_command(config["FFMPEG_BIN"], source, folder, rungs, has_audio),
+                config["PROCESSING_TIMEOUT"],
+            )
+        heartbeat()
+
+        for root, _, files in os.walk(folder):
+            for name in files:
+                path = os.path.join(root, name)
+                relative = os.path.relpath(path, folder).replace(os.sep, "/")
+                storage.save_file(path, hls_key(blob.sha256, relative))
+
+        # La lista maestra va la última: si existe, el paquete está completo
+        master = os.path.join(folder, "master.m3u8")
+        with open(master, "w") as f:
+            f.write(master_playlist(rungs, info["width"], info["height"], has_audio))
+        storage.save_file(master, hls_key(blob.sha256, "master.m3u8"))
+    finally:
+        shutil.rmtree(folder, ignore_errors=True)
+
+    blob.hls = True
+    db.session.commit()
@@ -0,0 +1,169 @@
+from flask_login import UserMixin
+from sqlalchemy import event
+from sqlalchemy.orm import Session, object_session
+
+from cache import TTLCache, RedisCache
+from models import db, User, Player, Scout
+
+# --------------------------------------------------
+# USUARIO DE SESIÓN CACHEADO
+# --------------------------------------------------
+# load_user() se ejecuta en cada petición autenticada. En lugar de cargar
+# User (y después sus perfiles) se guarda una instantánea con los datos que
+# usan las vistas y plantillas: id, email, rol, estado e ids de perfil. La
+# instantánea vive en una caché LRU+TTL por proceso y, opcionalmente, en una
+# caché compartida (IDENTITY_CACHE_URL). Cualquier cambio confirmado sobre el
+# usuario o sus perfiles la invalida.
+
+
+class SessionUser(UserMixin):
+    """Sustituto ligero de User para current_user; los perfiles se cargan bajo demanda."""
+
+    def __init__(self, data):
+        self.id = data["id"]
+        self.email = data["email"]
+        self.role = data["role"]
+        self.active = data["is_active"]
+        self.player_profile_id = data["player_profile_id"]
+        self.scout_profile_id = data["scout_profile_id"]
+
+    @property
+    def is_active(self):
+        return self.active
+
+    @property
+    def player_profile(self):
+        if self.player_profile_id is None:
+            return None
+        return db.session.get(Player, self.player_profile_id)
+
+    @property
+    def scout_profile(self):
+        if self.scout_profile_id is None:
+            return None
+        return db.session.get(Scout, self.scout_profile_id)
+
+
+class IdentityCache:
+    def __init__(self, maxsize=10000, ttl=300, shared=None):
+        self.local = TTLCache(maxsize=maxsize, ttl=ttl)
+        self.shared = shared
+
+    @staticmethod
+    def key(user_id):
+        return f"identity:{user_id}"
+
+    def get(self, user_id):
+        key = self.key(user_id)
+        data = self.local.get(key)
+        if data is None and self.shared is not None:
+            data = self.shared.get(key)
+            if data is not None:
+                self.local.set(key, data)
+        return data
+
+    def set(self, user_id, data):
+        key = self.key(user_id)
+        self.local.set(key, data)
+        if self.shared is not None:
+            self.shared.set(key, data)
+
+    def invalidate(self, user_id):
+        key = self.key(user_id)
+        self.local.delete(key)
+        if self.shared is not None:
+            self.shared.delete(key)
+
+
+_identity_cache = None
+
+
+def init_identity_cache(app):
+    global _identity_cache
+    shared = None
+    if app.config.get("IDENTITY_CACHE_URL"):
+        shared = RedisCache(
+            app.config["IDENTITY_CACHE_URL"],
+            ttl=app.config["IDENTITY_CACHE_TTL"],
+        )
+    # El nivel local caduca antes para acotar lo que tarda en verse una
+    # invalidación hecha desde otro proceso
+    local_ttl = app.config["IDENTITY_CACHE_TTL"] if shared is None else 30
+    _identity_cache = IdentityCache(ttl=local_ttl, shared=shared)
+    return _identity_cache
+
+
+def snapshot_user(user_id):
+    """Una sola consulta: el usuario con los ids de sus perfiles."""
+    row = (
+        db.session.query(User, Player.id, Scout.id)
+        .outerjoin(Player, Player.user_id == User.id)
+        .outerjoin(Scout, Scout.user_id == User.id)
+        .filter(User.id == user_id)
+        .first()
+    )
+    if row is None:
+        return None
+    user, player_id, scout_id = row
+    return {
+        "id": user.id,
+        "email": user.email,
+        "role": user.role,
+        "is_active": bool(user.is_active),
+        "player_profile_id": player_id,
+        "scout_profile_id": scout_id,
+    }
+
+
+def load_session_user(user_id):
+    data = _identity_cache.get(user_id) if _identity_cache else None
+    if data is None:
+        data = snapshot_user(user_id)
+        if data is None:
+            return None
+        if _identity_cache:
+            _identity_cache.set(user_id, data)
+    return SessionUser(data)
+
+
+def invalidate_identity(user_id):
+    if _identity_cache:
+        _identity_cache.invalidate(user_id)
+
+
+# --------------------------------------------------
+# INVALIDACIÓN
+# --------------------------------------------------
+# Los cambios se anotan durante el flush y se aplican tras el commit, para
+# que ninguna petición vuelva a cachear datos aún no confirmados.
+def _mark_dirty(target, user_id):
+    session = object_session(target)
+    if session is not None and user_id is not None:
+        session.info.setdefault("identity_dirty", set()).add(user_id)
+
+
+@event.listens_for(User, "after_update")
+@event.listens_for(User, "after_delete")
+def _user_changed(mapper, connection, target):
+    _mark_dirty(target, target.id)
+
+
+@event.listens_for(Player, "after_insert")
+@event.listens_for(Player, "after_update")
+@event.listens_for(Player, "after_delete")
+@event.listens_for(Scout, "after_insert")
+@event.listens_for(Scout, "after_update")
+@event.listens_for(Scout, "after_delete")
+def _profile_changed(mapper, connection, target):
+    _mark_dirty(target, target.user_id)
+
+
+@event.listens_for(Session, "after_commit")
+def _invalidate_after_commit(session):
+    for user_id in session.info.pop("identity_dirty", ()):
+        invalidate_identity(user_id)
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard_after_rollback(session):
+    session.info.pop("identity_dirty", None)
@@ -0,0 +1,342 @@
+import functools
+import json
+import multiprocessing
+import os
+import random
+import signal
+import socket
+import time
+import traceback
+from datetime import datetime, timedelta
+
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+from models import db, Job
+
+# --------------------------------------------------
+# TRABAJOS EN SEGUNDO PLANO
+# --------------------------------------------------
+# La cola es la tabla Job: las rutas añaden el trabajo en la misma
+# transacción que los datos que lo originan (si el commit falla, no queda un
+# trabajo huérfano) y `flask trabajos` lanza un grupo de procesos que los
+# reclaman uno a uno. El reclamo es un UPDATE condicional sobre el estado,
+# así dos procesos nunca ejecutan el mismo trabajo; en PostgreSQL además se
+# usa SKIP LOCKED para que no compitan por la misma fila.
+#
+# Un trabajo que falla se reintenta con espera exponencial (con algo de
+# azar para que los reintentos no lleguen todos a la vez) hasta agotar sus
+# intentos. Sin más configuración los trabajadores consultan la tabla cada
+# JOB_POLL_SECONDS; con JOB_WAKEUP_URL (Redis o compatible) se les despierta
+# en cuanto se confirma un trabajo nuevo.
+HANDLERS = {}
+DEFAULT_MAX_ATTEMPTS = 1
+RETRY_BASE_SECONDS = 30
+RETRY_MAX_SECONDS = 3600
+
+
+def handler(kind):
+    """Registra la función que ejecuta los trabajos de tipo `kind`."""
+    def decorator(func):
+        HANDLERS[kind] = func
+        return func
+    return decorator
+
+
+def task(name=None, max_attempts=3):
+    """Convierte una función en tarea: `f.delay(**kwargs)` la encola en lugar de ejecutarla.
+
+    Los argumentos se guardan en JSON, así que deben ser valores simples
+    (ids, no objetos del ORM). Como enqueue(), el llamador hace commit.
+    """
+    def decorator(func):
+        kind = name or func.__name__
+        handler(kind)(func)
+
+        @functools.wraps(func)
+        def delay(**kwargs):
+            return enqueue(kind, kwargs, max_attempts=max_attempts)
+
+        func.delay = delay
+        return func
+    return decorator
+
+
+def enqueue(kind, payload=None, run_at=None, max_attempts=DEFAULT_MAX_ATTEMPTS):
+    """Añade un trabajo a la sesión; se encola de verdad con el commit del llamador."""
+    job = Job(
+        kind=kind,
+        payload=json.dumps(payload or {}),
+        run_at=run_at or datetime.utcnow(),
+        max_attempts=max_attempts,
+    )
+    db.session.add(job)
+    db.session.info["jobs_enqueued"] = True
+    return job
+
+
+def retry_delay(attempts):
+    """Segundos hasta el siguiente intento: 30 s, 1 min, 2 min... con ±20 % de azar."""
+    delay = min(RETRY_BASE_SECONDS * 2 ** (attempts - 1), RETRY_MAX_SECONDS)
+    return delay * random.uniform(0.8, 1.2)
+
+
+# --------------------------------------------------
+# AVISO A LOS TRABAJADORES
+# --------------------------------------------------
+WAKEUP_KEY = "scoutme:jobs:wakeup"
+_wakeup = None
+
+
+class RedisWakeup:
+    """Lista de Redis en la que los trabajadores esperan con BLPOP."""
+
+    def __init__(self, url):
+        try:
+            import redis
+        except ImportError:
+            raise RuntimeError(
+                "JOB_WAKEUP_URL apunta a Redis pero el paquete 'redis' "
+                "no está instalado (pip install redis)"
+            )
+        self.client = redis.Redis.from_url(url)
+
+    def notify(self):
+        pipe = self.client.pipeline()
+        pipe.lpush(WAKEUP_KEY, 1)
+        # Basta con un aviso pendiente por trabajador; no se acumulan sin límite
+        pipe.ltrim(WAKEUP_KEY, 0, 63)
+        pipe.execute()
+
+    def wait(self, timeout):
+        self.client.blpop([WAKEUP_KEY], timeout=max(1, int(timeout)))
+
+
+def init_jobs(app):
+    global _wakeup
+    url = app.config.get("JOB_WAKEUP_URL")
+    _wakeup = RedisWakeup(url) if url else None
+    return _wakeup
+
+
+def wait_for_jobs(timeout):
+    if _wakeup is not None:
+        _wakeup.wait(timeout)
+    else:
+        time.sleep(timeout)
+
+
+@event.listens_for(Session, "after_commit")
+def _notify_after_commit(session):
+    if session.info.pop("jobs_enqueued", False) and _wakeup is not None:
+        try:
+            _wakeup.notify()
+        except Exception:
+            # Sin aviso, los trabajadores lo recogerán en su siguiente consulta
+            pass
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard_after_rollback(session):
+    session.info.pop("jobs_enqueued", None)
+
+
+# --------------------------------------------------
+# EJECUCIÓN
+# --------------------------------------------------
+
+
+def claim_job(worker_id):
+    """Reclama el siguiente trabajo listo para ejecutarse, o None."""
+    now = datetime.utcnow()
+    candidate = (
+        db.session.query(Job.id)
+        .filter(Job.status == "pendiente", Job.run_at <= now)
+        .order_by(Job.run_at, Job.id)
+        .limit(1)
+        .with_for_update(skip_locked=True)
+        .scalar()
+    )
+    if candidate is None:
+        db.session.rollback()
+        return None
+
+    jobs = Job.__table__
+    result = db.session.execute(
+        jobs.update()
+        .where(jobs.c.id == candidate, jobs.c.status == "pendiente")
+        .values(
+            status="en_curso",
+            attempts=jobs.c.attempts + 1,
+            locked_at=now,
+            locked_by=worker_id,
+        )
+    )
+    db.session.commit()
+    if result.rowcount != 1:
+        # Otro proceso lo reclamó entre la consulta y el UPDATE
+        return None
+    return db.session.get(Job, candidate)
+
+
+class JobLost(Exception):
+    """El bloqueo del trabajo caducó y requeue_stale() se lo dio a otro proceso."""
+
+
+# Trabajo que ejecuta este proceso: (id, locked_by), para heartbeat()
+_current_job = None
+
+
+def owned_by(job_id, worker_id):
+    jobs = Job.__table__
+    return db.and_(jobs.c.id == job_id, jobs.c.status == "en_curso", jobs.c.locked_by == worker_id)
+
+
+def heartbeat():
+    """Renueva el bloqueo del trabajo en curso; los handlers largos la llaman entre pasos.
+
+    Confirma la sesión. Lanza JobLost si el trabajo ya no es de este proceso,
+    para no seguir haciendo lo que ya hace otro.
+    """
+    if _current_job is None:
+        return
+    jobs = Job.__table__
+    result = db.session.execute(
+        jobs.update().where(owned_by(*_current_job)).values(locked_at=datetime.utcnow())
+    )
+    db.session.commit()
+    if result.rowcount != 1:
+        raise JobLost(f"El trabajo {_current_job[0]} ya no es de este proceso")
+
+
+def finish_job(job_id, worker_id, **values):
+    """Guarda el resultado solo si el trabajo sigue siendo de este proceso."""
+    jobs = Job.__table__
+    result = db.session.execute(jobs.update().where(owned_by(job_id, worker_id)).values(**values))
+    db.session.commit()
+    return result.rowcount == 1
+
+
+def run_job(job):
+    """Ejecuta el trabajo y guarda el resultado; devuelve True si terminó bien.
+
+    Si entretanto el bloqueo caducó y el trabajo volvió a la cola, el
+    resultado de este proceso no pisa el estado que tenga ahora.
+    """
+    global _current_job
+    job_id, worker_id = job.id, job.locked_by
+    attempts, max_attempts = job.attempts, job.max_attempts
+    func = HANDLERS.get(job.kind)
+    _current_job = (job_id, worker_id)
+    try:
+        if func is None:
+            raise LookupError(f"No hay handler para los trabajos '{job.kind}'")
+        func(**json.loads(job.payload))
+    except Exception:
+        db.session.rollback()
+        values = dict(last_error=traceback.format_exc()[-4000:], locked_at=None, locked_by=None)
+        if attempts < max_attempts:
+            values.update(
+                status="pendiente",
+                run_at=datetime.utcnow() + timedelta(seconds=retry_delay(attempts)),
+            )
+        else:
+            values.update(status="error", finished_at=datetime.utcnow())
+        finish_job(job_id, worker_id, **values)
+        return False
+    finally:
+        _current_job = None
+
+    # El commit de finish_job() confirma también lo que el handler dejó pendiente
+    finish_job(job_id, worker_id, status="completado", last_error=None, finished_at=datetime.utcnow())
+    return True
+
+
+def requeue_stale(timeout_seconds):
+    """Devuelve a la cola los trabajos de procesos que murieron a medias.
+
+    Si ya agotaron sus intentos se dan por fallidos, para que un trabajo que
+    tumba al proceso no se repita indefinidamente.
+    """
+    now = datetime.utcnow()
+    jobs = Job.__table__
+    stale = db.and_(
+        jobs.c.status == "en_curso",
+        jobs.c.locked_at < now - timedelta(seconds=timeout_seconds),
+    )
+    db.session.execute(
+        jobs.update()
+        .where(stale, jobs.c.attempts >= jobs.c.max_attempts)
+        .values(status="error", last_error="El trabajador no terminó el trabajo",
+                finished_at=now)
+    )
+    result = db.session.execute(
+        jobs.update()
+        .where(stale)
+        .values(status="pendiente", locked_at=None, locked_by=None)
+    )
+    db.session.commit()
+    return result.rowcount
+
+
+def work(app, worker_id, poll_interval=2.0, lock_timeout=3600, once=False):
+    """Bucle de un proceso trabajador: reclama y ejecuta hasta que se le pide parar."""
+    stopping = []
+    signal.signal(signal.SIGTERM, lambda *args: stopping.append(True))
+
+    with app.app_context():
+        # Tras el fork, cada proceso abre sus propias conexiones
+        db.engine.dispose(close=False)
+        last_check = 0.0
+        while not stopping:
+            if time.monotonic() - last_check > lock_timeout / 10:
+                requeue_stale(lock_timeout)
+                last_check = time.monotonic()
+
+            job = claim_job(worker_id)
+            if job is not None:
+                run_job(job)
+                db.session.remove()
+                continue
+            if once:
+                break
+            wait_for_jobs(poll_interval)
+
+
+def _child(app, worker_id, poll_interval, lock_timeout):
+    # Ctrl+C lo gestiona el proceso padre, que pide parar con SIGTERM
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    work(app, worker_id, poll_interval, lock_timeout)
+
+
+def run_workers(app, processes=2, poll_interval=2.0, lock_timeout=3600):
+    """Lanza `processes` trabajadores y espera a que terminen (Ctrl+C o SIGTERM)."""
+    prefix = f"{socket.gethostname()}:{os.getpid()}"
+    if processes <= 1:
+        work(app, f"{prefix}:0", poll_interval, lock_timeout)
+        return
+
+    context = multiprocessing.get_context("fork")
+    children = [
+        context.Process(
+            target=_child,
+            args=(app, f"{prefix}:{n}", poll_interval, lock_timeout),
+            daemon=True,
+        )
+        for n in range(processes)
+    ]
+    for child in children:
+        child.start()
+
+    def stop(*args):
+        for child in children:
+            child.terminate()
+
+    signal.signal(signal.SIGTERM, stop)
+    try:
+        for child in children:
+            child.join()
+    except KeyboardInterrupt:
+        stop()
+        for child in children:
+            child.join()
@@ -0,0 +1,321 @@
+from datetime import datetime
+
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import aliased
+
+from models import (
+    db, User, Player, Scout, Message, Conversation, ConversationParticipant
+)
+from pagination import encode_cursor, decode_cursor, cursor_datetime, cursor_int, clamp_per_page
+from search import prefix_range
+
+# --------------------------------------------------
+# CONVERSACIONES
+# --------------------------------------------------
+# Cada hilo tiene una fila Conversation (último mensaje y actividad) y una
+# ConversationParticipant por usuario con su contador de no leídos. Ambas se
+# actualizan en la misma transacción que el mensaje, así la bandeja y el
+# contador de la barra de navegación se leen por índice sin agregar el
+# historial de mensajes.
+
+
+def conversation_key(user_a, user_b, subject):
+    return f"{min(user_a, user_b)}_{max(user_a, user_b)}_{subject.replace(' ', '_')}"
+
+
+def get_or_create_conversation(key, subject, user_ids):
+    conversation = Conversation.query.filter_by(key=key).first()
+    if conversation:
+        return conversation
+
+    try:
+        # Savepoint: si otra petición crea el mismo hilo a la vez, gana la suya
+        with db.session.begin_nested():
+            conversation = Conversation(key=key, subject=subject)
+            db.session.add(conversation)
+            db.session.flush()
+            for user_id in set(user_ids):
+                db.session.add(ConversationParticipant(
+                    conversation_id=conversation.id, user_id=user_id
+                ))
+    except IntegrityError:
+        conversation = Conversation.query.filter_by(key=key).one()
+
+    return conversation
+
+
+def send_message(sender_id, receiver_id, subject, content, key=None):
+    """Crea el mensaje y actualiza los contadores del hilo. El llamador hace commit."""
+    key = key or conversation_key(sender_id, receiver_id, subject)
+    conversation = get_or_create_conversation(key, subject, (sender_id, receiver_id))
+
+    msg = Message(
+        sender_id=sender_id,
+        receiver_id=receiver_id,
+        subject=subject,
+        content=content,
+        conversation_id=key,
+        sent_at=datetime.utcnow(),
+    )
+    db.session.add(msg)
+    db.session.flush()
+
+    conversation.last_message_id = msg.id
+    conversation.last_activity_at = msg.sent_at
+
+    participants = ConversationParticipant.__table__
+    in_conversation = participants.c.conversation_id == conversation.id
+    # Incremento atómico en SQL: no se pierde ninguno con envíos concurrentes
+    db.session.execute(
+        participants.update()
+        .where(in_conversation, participants.c.user_id == receiver_id)
+        .values(
+            unread_count=participants.c.unread_count + 1,
+            last_activity_at=msg.sent_at,
+        )
+    )
+    db.session.execute(
+        participants.update()
+        .where(in_conversation, participants.c.user_id == sender_id)
+        .values(last_read_message_id=msg.id, last_activity_at=msg.sent_at)
+    )
+    return msg
+
+
+def mark_conversation_read(conversation, user_id):
+    """Marca como leído el hilo para el usuario con dos UPDATE en bloque.
+
+    Pone a cero su contador, avanza su puntero de lectura y marca sus
+    mensajes recibidos sin leer, sin cargar los mensajes en memoria.
+    """
+    messages = Message.__table__
+    db.session.execute(
+        messages.update()
+        .where(
+            messages.c.conversation_id == conversation.key,
+            messages.c.receiver_id == user_id,
+            messages.c.is_read == db.false(),
+        )
+        .values(is_read=True)
+    )
+
+    participants = ConversationParticipant.__table__
+    db.session.execute(
+        participants.update()
+        .where(
+            participants.c.conversation_id == conversation.id,
+            participants.c.user_id == user_id,
+        )
+        .values(unread_count=0, last_read_message_id=conversation.last_message_id)
+    )
+
+
+def unread_total(user_id):
+    """Mensajes sin leer del usuario; solo recorre los hilos con contador > 0."""
+    return db.session.query(
+        db.func.coalesce(db.func.sum(ConversationParticipant.unread_count), 0)
+    ).filter(
+        ConversationParticipant.user_id == user_id,
+        ConversationParticipant.unread_count > 0,
+    ).scalar()
+
+
+def rebuild_conversations():
+    """Reconstruye Conversation/ConversationParticipant a partir de Message."""
+    ConversationParticipant.query.delete()
+    Conversation.query.delete()
+
+    latest = (
+        db.session.query(
+            Message.conversation_id,
+            db.func.max(Message.id).label("last_id"),
+        )
+        .group_by(Message.conversation_id)
+        .subquery()
+    )
+    rows = (
+        db.session.query(Message)
+        .join(latest, latest.c.last_id == Message.id)
+        .all()
+    )
+
+    unread = dict(
+        ((conversation_id, receiver_id), count)
+        for conversation_id, receiver_id, count in db.session.query(
+            Message.conversation_id, Message.receiver_id, db.func.count(Message.id)
+        )
+        .filter(Message.is_read == db.false())
+        .group_by(Message.conversation_id, Message.receiver_id)
+    )
+
+    for last in rows:
+        conversation = Conversation(
+            key=last.conversation_id,
+            subject=last.subject,
+            last_message_id=last.id,
+            last_activity_at=last.sent_at,
+        )
+        db.session.add(conversation)
+        db.session.flush()
+        for user_id in {last.sender_id, last.receiver_id}:
+            db.session.add(ConversationParticipant(
+                conversation_id=conversation.id,
+                user_id=user_id,
+                unread_count=unread.get((last.conversation_id, user_id), 0),
+                last_activity_at=last.sent_at,
+            ))
+
+    db.session.commit()
+    return len(rows)
+
+
+# --------------------------------------------------
+# HILO DE MENSAJES
+# --------------------------------------------------
+THREAD_PER_PAGE = 50
+
+
+def thread_page(key, cursor=None, per_page=THREAD_PER_PAGE):
+    """Última página del hilo (o la anterior al cursor), en orden cronológico.
+
+    Devuelve (mensajes, cursor_anteriores); el cursor es None en la página
+    que contiene el primer mensaje del hilo.
+    """
+    query = Message.query.filter(Message.conversation_id == key)
+
+    before = decode_cursor(cursor)
+    if before and len(before) == 2 and cursor_datetime(before[0]) and cursor_int(before[1]) is not None:
+        sent_at, first_id = cursor_datetime(before[0]), before[1]
+        query = query.filter(db.or_(
+            Message.sent_at < sent_at,
+            db.and_(Message.sent_at == sent_at, Message.id < first_id),
+        ))
+
+    rows = (
+        query.order_by(Message.sent_at.desc(), Message.id.desc())
+        .limit(per_page + 1)
+        .all()
+    )
+
+    older_cursor = None
+    if len(rows) > per_page:
+        rows = rows[:per_page]
+        older_cursor = encode_cursor([rows[-1].sent_at, rows[-1].id])
+
+    rows.reverse()
+    return rows, older_cursor
+
+
+# --------------------------------------------------
+# BANDEJA DE ENTRADA
+# --------------------------------------------------
+INBOX_PER_PAGE = 20
+INBOX_MAX_PER_PAGE = 100
+
+
+def inbox_page(user_id, cursor=None, per_page=INBOX_PER_PAGE):
+    """Conversaciones del usuario, más recientes primero.
+
+    Recorre el índice (user_id, last_activity_at) de ConversationParticipant
+    y une el último mensaje y al otro participante en la misma consulta.
+    Devuelve (conversaciones, siguiente_cursor).
+    """
+    per_page = clamp_per_page(per_page, INBOX_PER_PAGE, INBOX_MAX_PER_PAGE)
+    mine = ConversationParticipant
+    other = aliased(ConversationParticipant)
+
+    query = (
+        db.session.query(mine, Conversation, Message, User)
+        .join(Conversation, Conversation.id == mine.conversation_id)
+        .join(Message, Message.id == Conversation.last_message_id)
+        .join(other, db.and_(
+            other.conversation_id == mine.conversation_id,
+            other.user_id != mine.user_id,
+        ))
+        .join(User, User.id == other.user_id)
+        .filter(mine.user_id == user_id)
+    )
+
+    after = decode_cursor(cursor)
+    if after and len(after) == 2 and cursor_datetime(after[0]) and cursor_int(after[1]) is not None:
+        activity, last_id = cursor_datetime(after[0]), after[1]
+        query = query.filter(db.or_(
+            mine.last_activity_at < activity,
+            db.and_(mine.last_activity_at == activity, mine.conversation_id < last_id),
+        ))
+
+    rows = (
+        query.order_by(mine.last_activity_at.desc(), mine.conversation_id.desc())
+        .limit(per_page + 1)
+        .all()
+    )
+
+    next_cursor = None
+    if len(rows) > per_page:
+        rows = rows[:per_page]
+        last = rows[-1][0]
+        next_cursor = encode_cursor([last.last_activity_at, last.conversation_id])
+
+    conversations = [{
+        'conversation_id': conversation.key,
+        'latest_message': message,
+        'other_user': other_user,
+        'unread_count': participant.unread_count,
+    } for participant, conversation, message, other_user in rows]
+
+    return conversations, next_cursor
+
+
+# --------------------------------------------------
+# DESTINATARIOS
+# --------------------------------------------------
+RECIPIENT_LIMIT = 10
+RECIPIENT_MIN_CHARS = 2
+
+
+def recipient_suggestions(q, exclude_user_id, limit=RECIPIENT_LIMIT):
+    """Usuarios activos cuyo email, nombre o apellido empieza por `q`.
+
+    Cada rama recorre un índice sobre lower(columna) y se limita por
+    separado, así el coste no crece con el número de usuarios.
+    """
+    prefix = (q or "").strip().lower()
+    if len(prefix) < RECIPIENT_MIN_CHARS:
+        return []
+
+    branches = [
+        db.session.query(User.id.label("user_id"))
+        .filter(prefix_range(db.func.lower(User.email), prefix)),
+    ]
+    for profile in (Player, Scout):
+        for column in (profile.nombre, profile.apellido):
+            branches.append(
+                db.session.query(profile.user_id.label("user_id"))
+                .filter(prefix_range(db.func.lower(column), prefix))
+            )
+
+    candidates = db.union(*(
+        db.select(branch.limit(limit).subquery().c.user_id) for branch in branches
+    )).subquery()
+
+    rows = (
+        db.session.query(
+            User,
+            db.func.coalesce(Player.nombre, Scout.nombre),
+            db.func.coalesce(Player.apellido, Scout.apellido),
+        )
+        .join(candidates, candidates.c.user_id == User.id)
+        .outerjoin(Player, Player.user_id == User.id)
+        .outerjoin(Scout, Scout.user_id == User.id)
+        .filter(User.id != exclude_user_id, User.is_active == db.true())
+        .order_by(User.email)
+        .limit(limit)
+        .all()
+    )
+
+    return [{
+        "id": user.id,
+        "email": user.email,
+        "role": user.role,
+        "nombre": " ".join(part for part in (nombre, apellido) if part),
+    } for user, nombre, apellido in rows]
@@ -1,12 +1,20 @@
+from flask import current_app
 from flask_sqlalchemy import SQLAlchemy
 from flask_bcrypt import Bcrypt
 from flask_login import UserMixin
+from sqlalchemy import event
 from datetime import datetime
+import unicodedata
 
 db = SQLAlchemy()
 bcrypt = Bcrypt()
 
 class User(db.Model, UserMixin):
+    __table_args__ = (
+        db.Index('ix_user_email_lower', db.func.lower(db.text('email'))),
+        db.Index('ix_user_role_active', 'role', 'is_active'),
+    )
+
     id = db.Column(db.Integer, primary_key=True)
     email = db.Column(db.String(120), unique=True, nullable=False)
     password_hash = db.Column(db.String(128), nullable=False)
@@ -26,13 +34,43 @@ class User(db.Model, UserMixin):
     def check_password(self, password):
         return bcrypt.check_password_hash(self.password_hash, password)
 
+    def password_needs_rehash(self):
+        """True si el hash se generó con un coste distinto de BCRYPT_LOG_ROUNDS."""
+        # Formato bcrypt: $2b$<coste>$<sal+hash>
+        parts = self.password_hash.split('$')
+        rounds = current_app.config.get('BCRYPT_LOG_ROUNDS', 12)
+        return len(parts) != 4 or parts[2] != f'{rounds:02d}'
+
+def normalize_text(value):
+    """Minúsculas y sin acentos, para comparar 'Córdoba' con 'cordoba'."""
+    if not value:
+        return None
+    value = unicodedata.normalize('NFKD', value.strip().lower())
+    return ''.join(c for c in value if not unicodedata.combining(c))
+
+def calculate_age(birth_date, today=None):
+    if birth_date:
+        today = today or datetime.today()
+        return today.year - birth_date.year - (
+            (today.month, today.day) <
+            (birth_date.month, birth_date.day)
+        )
+    return None
+
 class Player(db.Model):
+    __table_args__ = (
+        # La edad se filtra como rango de fechas de nacimiento (search.birth_date_range)
+        db.Index('ix_player_deporte_nivel_nacimiento', 'deporte', 'nivel', 'fecha_nacimiento'),
+        db.Index('ix_player_nombre_lower', db.func.lower(db.text('nombre'))),
+        db.Index('ix_player_apellido_lower', db.func.lower(db.text('apellido'))),
+    )
+
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
     nombre = db.Column(db.String(100), nullable=False)
     apellido = db.Column(db.String(100), nullable=False)
-    fecha_nacimiento = db.Column(db.Date)
-    edad = db.Column(db.Integer)
+    fecha_nacimiento = db.Column(db.Date, index=True)
+    edad = db.Column(db.Integer)  # solo para mostrar; `flask actualizar-edades` la recalcula
     pais = db.Column(db.String(50))
     ciudad = db.Column(db.String(100))
     deporte = db.Column(db.String(50), nullable=False)
@@ -45,10 +83,25 @@ class Player(db.Model):
     telefono = db.Column(db.String(20))
     sitio_web = db.Column(db.String(200))
 
+    # Columnas normalizadas para búsquedas por prefijo indexadas
+    pais_norm = db.Column(db.String(50), index=True)
+    ciudad_norm = db.Column(db.String(100), index=True)
+
     # Relationships
     videos = db.relationship('Video', backref='player', lazy='dynamic')
 
+@event.listens_for(Player, 'before_insert')
+@event.listens_for(Player, 'before_update')
+def _normalize_player_location(mapper, connection, target):
+    target.pais_norm = normalize_text(target.pais)
+    target.ciudad_norm = normalize_text(target.ciudad)
+
 class Scout(db.Model):
+    __table_args__ = (
+        db.Index('ix_scout_nombre_lower', db.func.lower(db.text('nombre'))),
+        db.Index('ix_scout_apellido_lower', db.func.lower(db.text('apellido'))),
+    )
+
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
     nombre = db.Column(db.String(100), nullable=False)
@@ -65,6 +118,15 @@ class Scout(db.Model):
     # Relationships
     events = db.relationship('Event', backref='scout', lazy='dynamic')
 
+class Blob(db.Model):
+    # Contenido de un video subido, direccionado por su sha256 y compartido entre videos
+    id = db.Column(db.Integer, primary_key=True)
+    sha256 = db.Column(db.String(64), unique=True, nullable=False)
+    size = db.Column(db.BigInteger, nullable=False)
+    ref_count = db.Column(db.Integer, nullable=False, default=0)
+    hls = db.Column(db.Boolean, nullable=False, default=False)  # paquete HLS en hls/<sha256>/
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
 class Video(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     player_id = db.Column(db.Integer, db.ForeignKey('player.id'), nullable=False)
@@ -73,9 +135,86 @@ class Video(db.Model):
     tipo = db.Column(db.String(20), nullable=False)  # 'local', 'youtube'
     url = db.Column(db.String(500))  # para YouTube o path local
     filename = db.Column(db.String(200))  # para archivos locales
+    blob_id = db.Column(db.Integer, db.ForeignKey('blob.id'), index=True)  # contenido de los videos locales
     uploaded_at = db.Column(db.DateTime, default=datetime.utcnow)
+    # Procesado en segundo plano de los videos locales (processing.py)
+    status = db.Column(db.String(20))  # 'pendiente', 'procesando', 'listo', 'error'
+    processing_error = db.Column(db.Text)
+    duration = db.Column(db.Float)  # segundos
+    width = db.Column(db.Integer)
+    height = db.Column(db.Integer)
+    blob = db.relationship('Blob', lazy='joined')
+    assets = db.relationship('VideoAsset', backref='video', lazy='selectin', cascade='all, delete-orphan')
+
+    def asset(self, kind):
+        return next((a for a in self.assets if a.kind == kind), None)
+
+class VideoAsset(db.Model):
+    # Archivo derivado de un video (miniatura, versión de baja calidad), guardado como blob
+    id = db.Column(db.Integer, primary_key=True)
+    video_id = db.Column(db.Integer, db.ForeignKey('video.id'), nullable=False, index=True)
+    kind = db.Column(db.String(20), nullable=False)  # 'poster', 'low'
+    filename = db.Column(db.String(200), nullable=False)
+    blob_id = db.Column(db.Integer, db.ForeignKey('blob.id'), nullable=False, index=True)
+    width = db.Column(db.Integer)
+    height = db.Column(db.Integer)
+    bitrate = db.Column(db.Integer)  # bits por segundo
+
+class Upload(db.Model):
+    # Subida por partes de un video local (init / PUT por offset / finalize)
+    id = db.Column(db.String(32), primary_key=True)  # uuid4 hex
+    player_id = db.Column(db.Integer, db.ForeignKey('player.id'), nullable=False, index=True)
+    filename = db.Column(db.String(200), nullable=False)  # nombre original saneado
+    stored_name = db.Column(db.String(200), nullable=False)  # archivo parcial mientras se sube
+    titulo = db.Column(db.String(200), nullable=False)
+    descripcion = db.Column(db.Text)
+    size = db.Column(db.BigInteger, nullable=False)
+    received = db.Column(db.BigInteger, nullable=False, default=0)
+    sha256 = db.Column(db.String(64))  # esperado (opcional) y, al finalizar, el calculado
+    storage_upload_id = db.Column(db.String(255))  # multipart abierto en S3 (subida directa)
+    chunk_size = db.Column(db.Integer)  # tamaño fijo de las partes en subida directa
+    status = db.Column(db.String(20), nullable=False, default='pendiente')  # 'pendiente', 'completado'
+    video_id = db.Column(db.Integer, db.ForeignKey('video.id'))
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow, index=True)
+
+class Job(db.Model):
+    # Trabajo en segundo plano (jobs.py); la tabla es la cola
+    __table_args__ = (
+        db.Index('ix_job_status_run_at', 'status', 'run_at'),
+    )
+    id = db.Column(db.Integer, primary_key=True)
+    kind = db.Column(db.String(50), nullable=False)
+    payload = db.Column(db.Text, nullable=False, default='{}')  # JSON
+    status = db.Column(db.String(20), nullable=False, default='pendiente')  # 'pendiente', 'en_curso', 'completado', 'error'
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    max_attempts = db.Column(db.Integer, nullable=False, default=1)  # reintentos con espera exponencial
+    run_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    locked_at = db.Column(db.DateTime)
+    locked_by = db.Column(db.String(100))
+    last_error = db.Column(db.Text)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    finished_at = db.Column(db.DateTime)
+
+class RosterImport(db.Model):
+    # Importación masiva de jugadores desde el panel (roster.py)
+    id = db.Column(db.Integer, primary_key=True)
+    filename = db.Column(db.String(200), nullable=False)  # nombre original saneado
+    storage_key = db.Column(db.String(255), nullable=False)  # archivo subido hasta que se procesa
+    status = db.Column(db.String(20), nullable=False, default='pendiente')  # 'pendiente', 'en_curso', 'completado', 'error'
+    total = db.Column(db.Integer, nullable=False, default=0)  # filas leídas
+    imported = db.Column(db.Integer, nullable=False, default=0)
+    error_count = db.Column(db.Integer, nullable=False, default=0)
+    errors = db.Column(db.Text)  # JSON: [{"linea", "email", "errores"}], limitado
+    created_by = db.Column(db.Integer, db.ForeignKey('user.id'))
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    finished_at = db.Column(db.DateTime)
 
 class Event(db.Model):
+    __table_args__ = (
+        db.Index('ix_event_fecha_deporte', 'fecha', 'deporte'),
+    )
+
     id = db.Column(db.Integer, primary_key=True)
     scout_id = db.Column(db.Integer, db.ForeignKey('scout.id'), nullable=False)
     titulo = db.Column(db.String(200), nullable=False)
@@ -84,14 +223,66 @@ class Event(db.Model):
     ubicacion = db.Column(db.String(200))
     deporte = db.Column(db.String(50))
     capacidad_maxima = db.Column(db.Integer)
+    # Contadores de inscripciones (events.py): se actualizan con UPDATE condicionales
+    plazas_ocupadas = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    en_espera = db.Column(db.Integer, nullable=False, default=0, server_default='0')
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
 
+class EventRegistration(db.Model):
+    __table_args__ = (
+        db.UniqueConstraint('event_id', 'player_id', name='uq_registration_event_player'),
+        db.Index('ix_registration_event_status', 'event_id', 'status', 'id'),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    event_id = db.Column(db.Integer, db.ForeignKey('event.id'), nullable=False)
+    player_id = db.Column(db.Integer, db.ForeignKey('player.id'), nullable=False, index=True)
+    status = db.Column(db.String(20), nullable=False)  # 'confirmada', 'espera', 'cancelada'
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+    # Relationships
+    event = db.relationship('Event', backref=db.backref('registrations', lazy='dynamic'))
+    player = db.relationship('Player', backref=db.backref('registrations', lazy='dynamic'))
+
 class Message(db.Model):
+    __table_args__ = (
+        db.Index('ix_message_conversation_sent_at', 'conversation_id', 'sent_at'),
+        db.Index('ix_message_receiver_is_read', 'receiver_id', 'is_read'),
+    )
+
     id = db.Column(db.Integer, primary_key=True)
-    sender_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    sender_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False, index=True)
     receiver_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
     subject = db.Column(db.String(200), nullable=False)
     content = db.Column(db.Text, nullable=False)
     is_read = db.Column(db.Boolean, default=False)
     sent_at = db.Column(db.DateTime, default=datetime.utcnow)
-    conversation_id = db.Column(db.String(100), nullable=False)  # Unique ID for conversation thread
\ No newline at end of file
+    conversation_id = db.Column(db.String(100), nullable=False)  # Unique ID for conversation thread
+
+class Conversation(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    key = db.Column(db.String(100), unique=True, nullable=False)  # Message.conversation_id
+    subject = db.Column(db.String(200), nullable=False)
+    last_message_id = db.Column(db.Integer, db.ForeignKey('message.id'))
+    last_activity_at = db.Column(db.DateTime, default=datetime.utcnow)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+    # Relationships
+    last_message = db.relationship('Message', foreign_keys=[last_message_id])
+    participants = db.relationship('ConversationParticipant', backref='conversation', lazy='dynamic')
+
+class ConversationParticipant(db.Model):
+    __table_args__ = (
+        db.Index('ix_participant_user_activity', 'user_id', 'last_activity_at', 'conversation_id'),
+        db.Index('ix_participant_user_unread', 'user_id', 'unread_count'),
+    )
+
+    conversation_id = db.Column(db.Integer, db.ForeignKey('conversation.id'), primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), primary_key=True)
+    unread_count = db.Column(db.Integer, nullable=False, default=0)
+    last_read_message_id = db.Column(db.Integer, db.ForeignKey('message.id'))
+    last_activity_at = db.Column(db.DateTime, default=datetime.utcnow)  # copia de Conversation para ordenar la bandeja
+
+    # Relationships
+    user = db.relationship('User')
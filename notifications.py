@@ -0,0 +1,119 @@
+import smtplib
+from email.message import EmailMessage
+
+from flask import current_app
+
+from jobs import task
+from models import db, User, Player, Message, Event, EventRegistration
+
+# --------------------------------------------------
+# NOTIFICACIONES POR EMAIL
+# --------------------------------------------------
+# Los avisos se encolan en la misma transacción que el mensaje o evento y
+# los envían los trabajadores (`flask trabajos`), así un servidor SMTP lento
+# o caído no retrasa ninguna petición: el envío se reintenta con espera
+# exponencial. Sin MAIL_SERVER los emails solo se registran en el log.
+BCC_BATCH_SIZE = 50
+
+
+def send_email(recipients, subject, body, bcc=False):
+    config = current_app.config
+    if not config.get("MAIL_SERVER"):
+        current_app.logger.info("Email no enviado (sin MAIL_SERVER): %s -> %s", subject, recipients)
+        return
+
+    email = EmailMessage()
+    email["Subject"] = subject
+    email["From"] = config["MAIL_DEFAULT_SENDER"]
+    if bcc:
+        # Envíos masivos: nadie ve las direcciones de los demás
+        email["To"] = config["MAIL_DEFAULT_SENDER"]
+        email["Bcc"] = ", ".join(recipients)
+    else:
+        email["To"] = ", ".join(recipients)
+    email.set_content(body)
+
+    with smtplib.SMTP(config["MAIL_SERVER"], config["MAIL_PORT"], timeout=30) as smtp:
+        if config.get("MAIL_USE_TLS"):
+            smtp.starttls()
+        if config.get("MAIL_USERNAME"):
+            smtp.login(config["MAIL_USERNAME"], config["MAIL_PASSWORD"])
+        smtp.send_message(email)
+
+
+@task(name="enviar_email", max_attempts=5)
+def deliver_email(recipients, subject, body, bcc=False):
+    send_email(recipients, subject, body, bcc=bcc)
+
+
+@task(name="avisar_mensaje", max_attempts=5)
+def notify_new_message(message_id):
+    msg = db.session.get(Message, message_id)
+    # Si ya lo leyó (p. ej. estaba conectado) no hace falta el email
+    if msg is None or msg.is_read or not msg.receiver.is_active:
+        return
+
+    send_email(
+        [msg.receiver.email],
+        f"Nuevo mensaje en ScoutMe: {msg.subject}",
+        f"{msg.sender.email} te ha enviado un mensaje:\n\n"
+        f"{msg.content}\n\n"
+        "Entra en ScoutMe para responder.",
+    )
+
+
+@task(name="avisar_evento", max_attempts=5)
+def notify_new_event(event_id):
+    """Avisa del evento a los jugadores activos de su deporte.
+
+    Los destinatarios se reparten en lotes y cada lote es un trabajo propio,
+    así un fallo solo reintenta su lote y nadie recibe el aviso dos veces.
+    """
+    event = db.session.get(Event, event_id)
+    if event is None or not event.deporte:
+        return
+
+    subject = f"Nuevo evento de {event.deporte}: {event.titulo}"
+    body = (
+        f"{event.titulo}\n"
+        f"Fecha: {event.fecha.strftime('%d/%m/%Y %H:%M')}\n"
+        f"Lugar: {event.ubicacion or 'Por confirmar'}\n\n"
+        f"{event.descripcion or ''}\n\n"
+        "Entra en ScoutMe para ver los detalles."
+    )
+
+    emails = (
+        db.session.query(User.email)
+        .join(Player, Player.user_id == User.id)
+        .filter(Player.deporte == event.deporte, User.is_active == db.true())
+        .order_by(User.id)
+    )
+    batch = []
+    for (email,) in emails.yield_per(500):
+        batch.append(email)
+        if len(batch) == BCC_BATCH_SIZE:
+            deliver_email.delay(recipients=batch, subject=subject, body=body, bcc=True)
+            batch = []
+    if batch:
+        deliver_email.delay(recipients=batch, subject=subject, body=body, bcc=True)
+
+
+@task(name="avisar_plaza", max_attempts=5)
+def notify_waitlist_promotion(registration_id):
+    """Avisa al jugador que sale de la lista de espera con plaza confirmada."""
+    registration = db.session.get(EventRegistration, registration_id)
+    if registration is None or registration.status != "confirmada":
+        return
+    user = registration.player.user
+    if not user.is_active:
+        return
+
+    event = registration.event
+    send_email(
+        [user.email],
+        f"Tienes plaza en {event.titulo}",
+        f"Se ha liberado una plaza y tu inscripción en {event.titulo} está confirmada.\n"
+        f"Fecha: {event.fecha.strftime('%d/%m/%Y %H:%M')}\n"
+        f"Lugar: {event.ubicacion or 'Por confirmar'}\n\n"
+        "Si ya no puedes asistir, cancela la inscripción en ScoutMe para liberarla.",
+    )
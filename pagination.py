@@ -0,0 +1,61 @@
+import base64
+import json
+from datetime import date, datetime
+
+# --------------------------------------------------
+# PAGINACIÓN POR CURSOR (KEYSET)
+# --------------------------------------------------
+# El cursor es la clave de ordenación de la última fila servida, codificada
+# en base64 para que sea opaca en las URLs. Cada listado decide qué columnas
+# forman la clave; aquí solo se codifica y decodifica.
+
+
+def _json_default(value):
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    raise TypeError(f"No se puede codificar {type(value).__name__} en un cursor")
+
+
+def encode_cursor(values):
+    raw = json.dumps(values, separators=(",", ":"), default=_json_default).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+
+def decode_cursor(token):
+    """Devuelve la clave de ordenación codificada o None si el cursor no es válido."""
+    if not token:
+        return None
+    try:
+        padded = token + "=" * (-len(token) % 4)
+        values = json.loads(base64.urlsafe_b64decode(padded.encode("ascii")))
+    except (ValueError, TypeError):
+        return None
+    return values if isinstance(values, list) else None
+
+
+def cursor_datetime(value):
+    try:
+        return datetime.fromisoformat(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def cursor_int(value):
+    """El entero del cursor o None si es de otro tipo (un cursor manipulado)."""
+    if isinstance(value, int) and not isinstance(value, bool):
+        return value
+    return None
+
+
+def cursor_number(value):
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        return value
+    return None
+
+
+def clamp_per_page(value, default, maximum):
+    try:
+        per_page = int(value)
+    except (TypeError, ValueError):
+        return default
+    return max(1, min(per_page, maximum))
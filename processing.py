@@ -0,0 +1,210 @@
+import json
+import os
+import subprocess
+
+from flask import current_app
+
+from jobs import JobLost, enqueue, handler, heartbeat
+from models import db, Blob, Video, VideoAsset
+from storage import (
+    get_storage, blob_key, blob_filename, store_file, release_blob, temp_path
+)
+
+# --------------------------------------------------
+# PROCESADO DE VIDEOS
+# --------------------------------------------------
+# Tras subir un video local se encola un trabajo que, fuera de la petición:
+#  1. lo analiza con ffprobe (duración, resolución, códecs),
+#  2. lo reempaqueta como MP4 con el índice (moov) al principio para que el
+#     navegador empiece a reproducir sin descargarlo entero; si los códecs no
+#     son compatibles con MP4/navegador, lo recodifica a H.264/AAC,
+#  3. extrae una miniatura para el póster del reproductor,
+#  4. genera una versión de baja calidad para conexiones lentas.
+# Los resultados se guardan como blobs; si algo falla el video sigue
+# sirviéndose tal como se subió.
+PROCESS_JOB = "procesar_video"
+POSTER_WIDTH = 640
+LOW_HEIGHT = 480
+LOW_VIDEO_BITRATE = 800000
+LOW_AUDIO_BITRATE = 96000
+COPY_AUDIO_CODECS = (None, "aac", "mp3")
+
+
+class ProcessingError(RuntimeError):
+    pass
+
+
+def run_tool(args, timeout):
+    try:
+        return subprocess.run(args, capture_output=True, check=True, timeout=timeout)
+    except FileNotFoundError:
+        raise ProcessingError(
+            f"No se encontró '{args[0]}': instala ffmpeg o configura FFMPEG_BIN/FFPROBE_BIN"
+        )
+    except subprocess.CalledProcessError as e:
+        raise ProcessingError(e.stderr.decode("utf-8", "replace")[-2000:])
+    except subprocess.TimeoutExpired:
+        raise ProcessingError(f"'{args[0]}' superó el límite de {timeout} s")
+
+
+def probe(path, ffprobe="ffprobe", timeout=60):
+    output = run_tool(
+        [ffprobe, "-v", "error", "-print_format", "json",
+         "-show_format", "-show_streams", path],
+        timeout,
+    ).stdout
+    info = json.loads(output)
+    streams = info.get("streams", [])
+    video = next((s for s in streams if s.get("codec_type") == "video"), None)
+    audio = next((s for s in streams if s.get("codec_type") == "audio"), None)
+    if video is None:
+        raise ProcessingError("El archivo no contiene ninguna pista de video")
+
+    duration = info.get("format", {}).get("duration") or video.get("duration")
+    return {
+        "duration": float(duration) if duration else None,
+        "width": video.get("width"),
+        "height": video.get("height"),
+        "video_codec": video.get("codec_name"),
+        "audio_codec": audio.get("codec_name") if audio else None,
+    }
+
+
+def faststart_command(ffmpeg, source, target, info):
+    if info["video_codec"] == "h264" and info["audio_codec"] in COPY_AUDIO_CODECS:
+        # Solo se mueve el índice: sin recodificar, tarda lo que tarda copiar
+        codecs = ["-c", "copy"]
+    else:
+        codecs = [
+            "-c:v", "libx264", "-preset", "veryfast", "-crf", "23", "-pix_fmt", "yuv420p",
+            "-c:a", "aac", "-b:a", "128k",
+        ]
+    return [
+        ffmpeg, "-y", "-v", "error", "-i", source,
+        "-map", "0:v:0", "-map", "0:a:0?", *codecs,
+        "-movflags", "+faststart", "-f", "mp4", target,
+    ]
+
+
+def poster_command(ffmpeg, source, target, info):
+    # Un fotograma al 10 % del video (máximo 5 s) suele evitar fundidos en negro
+    at = min((info["duration"] or 0) * 0.1, 5.0)
+    return [
+        ffmpeg, "-y", "-v", "error", "-ss", f"{at:.2f}", "-i", source,
+        "-frames:v", "1", "-vf", f"scale={POSTER_WIDTH}:-2",
+        "-q:v", "3", "-f", "image2", "-c:v", "mjpeg", target,
+    ]
+
+
+def low_command(ffmpeg, source, target):
+    return [
+        ffmpeg, "-y", "-v", "error", "-i", source,
+        "-map", "0:v:0", "-map", "0:a:0?",
+        "-vf", f"scale=-2:'min({LOW_HEIGHT},ih)'",
+        "-c:v", "libx264", "-preset", "veryfast", "-pix_fmt", "yuv420p",
+        "-b:v", str(LOW_VIDEO_BITRATE), "-maxrate", str(LOW_VIDEO_BITRATE * 107 // 100),
+        "-bufsize", str(LOW_VIDEO_BITRATE * 2),
+        "-c:a", "aac", "-b:a", str(LOW_AUDIO_BITRATE),
+        "-movflags", "+faststart", "-f", "mp4", target,
+    ]
+
+
+def scaled(width, height, target_width=None, target_height=None):
+    """Dimensiones pares tras escalar conservando la proporción."""
+    if not width or not height:
+        return None, None
+    if target_width:
+        return target_width, round(height * target_width / width / 2) * 2
+    target_height = min(target_height, height)
+    return round(width * target_height / height / 2) * 2, target_height
+
+
+def schedule_processing(video):
+    """Marca el video como pendiente y encola su procesado (el llamador hace commit)."""
+    video.status = "pendiente"
+    video.processing_error = None
+    return enqueue(PROCESS_JOB, {"video_id": video.id})
+
+
+def replace_assets(video, assets):
+    for asset in list(video.assets):
+        release_blob(asset.blob_id)
+        video.assets.remove(asset)
+    video.assets.extend(assets)
+
+
+@handler(PROCESS_JOB)
+def process_video(video_id):
+    video = db.session.get(Video, video_id)
+    if video is None or video.tipo != "local" or video.blob_id is None:
+        return
+
+    config = current_app.config
+    storage = get_storage(current_app)
+    scratch = os.path.join(current_app.root_path, config["UPLOAD_FOLDER"])
+    ffmpeg, timeout = config["FFMPEG_BIN"], config["PROCESSING_TIMEOUT"]
+    source_blob = db.session.get(Blob, video.blob_id)
+
+    video.status = "procesando"
+    db.session.commit()
+
+    main, poster, low = temp_path(scratch), temp_path(scratch), temp_path(scratch)
+    try:
+        with storage.local_file(blob_key(source_blob.sha256), scratch) as source:
+            info = probe(source, config["FFPROBE_BIN"], timeout)
+            # Cada paso puede durar hasta PROCESSING_TIMEOUT: se renueva el bloqueo entre pasos
+            heartbeat()
+            run_tool(faststart_command(ffmpeg, source, main, info), timeout)
+        heartbeat()
+        run_tool(poster_command(ffmpeg, main, poster, info), timeout)
+        heartbeat()
+        run_tool(low_command(ffmpeg, main, low), timeout)
+        heartbeat()
+
+        # store_file() mueve o sube cada temporal y suma una referencia a su blob
+        main_blob = store_file(main, storage)
+        poster_blob = store_file(poster, storage)
+        low_blob = store_file(low, storage)
+    except JobLost:
+        # Otro proceso está procesando el video: su resultado es el que cuenta
+        db.session.rollback()
+        raise
+    except Exception as e:
+        db.session.rollback()
+        video.status = "error"
+        video.processing_error = str(e)[-2000:]
+        db.session.commit()
+        raise
+    finally:
+        for path in (main, poster, low):
+            if os.path.exists(path):
+                os.remove(path)
+
+    release_blob(video.blob_id)
+    video.blob_id = main_blob.id
+    video.filename = blob_filename(main_blob.sha256, "mp4")
+
+    poster_width, poster_height = scaled(info["width"], info["height"], target_width=POSTER_WIDTH)
+    low_width, low_height = scaled(info["width"], info["height"], target_height=LOW_HEIGHT)
+    replace_assets(video, [
+        VideoAsset(
+            kind="poster", filename=blob_filename(poster_blob.sha256, "jpg"),
+            blob_id=poster_blob.id, width=poster_width, height=poster_height,
+        ),
+        VideoAsset(
+            kind="low", filename=blob_filename(low_blob.sha256, "mp4"),
+            blob_id=low_blob.id, width=low_width, height=low_height,
+            bitrate=LOW_VIDEO_BITRATE + LOW_AUDIO_BITRATE,
+        ),
+    ])
+
+    video.duration = info["duration"]
+    video.width = info["width"]
+    video.height = info["height"]
+    video.status = "listo"
+    video.processing_error = None
+
+    # Importación diferida: hls.py usa las utilidades de ffmpeg de este módulo
+    from hls import schedule_packaging
+    schedule_packaging(main_blob)
+    db.session.commit()
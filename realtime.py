@@ -0,0 +1,168 @@
+import json
+import queue
+import threading
+from abc import ABC, abstractmethod
+
+# --------------------------------------------------
+# TIEMPO REAL (SERVER-SENT EVENTS)
+# --------------------------------------------------
+# Los eventos se publican en un canal por usuario ("user:<id>") y el
+# endpoint /mensajes/stream los reenvía al navegador. El broker en proceso
+# sirve para desarrollo o un único worker; con varios workers se usa Redis
+# (o cualquier servidor compatible) a través de REALTIME_BROKER_URL.
+
+
+def user_channel(user_id):
+    return f"user:{user_id}"
+
+
+class Subscription(ABC):
+    def __init__(self, broker, channel):
+        self.broker = broker
+        self.channel = channel
+
+    @abstractmethod
+    def get(self, timeout):
+        """Siguiente evento (dict) o None si no llega ninguno en `timeout` segundos."""
+
+    @abstractmethod
+    def close(self):
+        """Deja de recibir eventos del canal."""
+
+
+class InProcessSubscription(Subscription):
+    def __init__(self, broker, channel, maxsize):
+        super().__init__(broker, channel)
+        self.queue = queue.Queue(maxsize=maxsize)
+
+    def get(self, timeout):
+        try:
+            return self.queue.get(timeout=timeout)
+        except queue.Empty:
+            return None
+
+    def close(self):
+        self.broker.unsubscribe(self)
+
+
+class InProcessBroker:
+    """Pub/sub en memoria: una cola por suscriptor, protegida con un lock."""
+
+    def __init__(self, maxsize=100):
+        self.maxsize = maxsize
+        self.lock = threading.Lock()
+        self.channels = {}
+
+    def subscribe(self, channel):
+        subscription = InProcessSubscription(self, channel, self.maxsize)
+        with self.lock:
+            self.channels.setdefault(channel, set()).add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self.lock:
+            subscribers = self.channels.get(subscription.channel)
+            if subscribers:
+                subscribers.discard(subscription)
+                if not subscribers:
+                    del self.channels[subscription.channel]
+
+    def publish(self, channel, event):
+        with self.lock:
+            subscribers = list(self.channels.get(channel, ()))
+        for subscription in subscribers:
+            try:
+                subscription.queue.put_nowait(event)
+            except queue.Full:
+                # Cliente lento: se descarta el evento, recuperará el estado al recargar
+                pass
+
+
+class RedisSubscription(Subscription):
+    def __init__(self, broker, channel):
+        super().__init__(broker, channel)
+        self.pubsub = broker.client.pubsub(ignore_subscribe_messages=True)
+        self.pubsub.subscribe(channel)
+
+    def get(self, timeout):
+        message = self.pubsub.get_message(timeout=timeout)
+        if message is None:
+            return None
+        return json.loads(message["data"])
+
+    def close(self):
+        self.pubsub.close()
+
+
+class RedisBroker:
+    """Pub/sub sobre Redis (o un servidor compatible) para varios workers."""
+
+    def __init__(self, url):
+        try:
+            import redis
+        except ImportError:
+            raise RuntimeError(
+                "REALTIME_BROKER_URL apunta a Redis pero el paquete 'redis' "
+                "no está instalado (pip install redis)"
+            )
+        self.client = redis.Redis.from_url(url)
+
+    def subscribe(self, channel):
+        return RedisSubscription(self, channel)
+
+    def publish(self, channel, event):
+        self.client.publish(channel, json.dumps(event))
+
+
+def create_broker(url):
+    if not url or url == "memory://":
+        return InProcessBroker()
+    if url.startswith(("redis://", "rediss://", "unix://")):
+        return RedisBroker(url)
+    raise ValueError(f"Broker de tiempo real no soportado: {url}")
+
+
+def get_broker(app):
+    broker = app.extensions.get("realtime_broker")
+    if broker is None:
+        broker = create_broker(app.config.get("REALTIME_BROKER_URL"))
+        app.extensions["realtime_broker"] = broker
+    return broker
+
+
+# --------------------------------------------------
+# EVENTOS
+# --------------------------------------------------
+def message_event(msg):
+    return {
+        "type": "message",
+        "conversation_id": msg.conversation_id,
+        "message_id": msg.id,
+        "sender_id": msg.sender_id,
+        "subject": msg.subject,
+        "content": msg.content,
+        "sent_at": msg.sent_at.isoformat(),
+    }
+
+
+def unread_event(total):
+    return {"type": "unread", "total": total}
+
+
+def format_sse(event):
+    return f"event: {event['type']}\ndata: {json.dumps(event)}\n\n"
+
+
+def event_stream(subscription, heartbeat):
+    """Generador SSE; envía un comentario cada `heartbeat` segundos para
+    mantener viva la conexión a través de proxies."""
+    try:
+        yield "retry: 5000\n\n"
+        while True:
+            event = subscription.get(timeout=heartbeat)
+            if event is None:
+                yield ": ping\n\n"
+            else:
+                yield format_sse(event)
+    finally:
+        subscription.close()
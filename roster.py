@@ -0,0 +1,304 @@
+import csv
+import io
+import json
+import os
+import shutil
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from types import SimpleNamespace
+
+import bcrypt
+from flask import current_app
+from sqlalchemy import insert
+from sqlalchemy.exc import IntegrityError
+from werkzeug.datastructures import MultiDict
+
+from forms import RegisterPlayerForm
+from jobs import enqueue, handler, heartbeat
+from models import db, User, Player, RosterImport, calculate_age, normalize_text
+from search import fulltext_document, index_new_players, invalidate_search_cache
+from storage import get_storage, temp_path
+
+# --------------------------------------------------
+# IMPORTACIÓN MASIVA DE JUGADORES
+# --------------------------------------------------
+# Clubes y academias envían plantillas de cientos de jugadores en CSV (con
+# cabecera) o JSONL (un objeto por línea). El archivo se lee en streaming,
+# cada fila se valida con las mismas reglas que RegisterPlayerForm y las
+# válidas se insertan por lotes: un executemany para los usuarios y otro para
+# los perfiles, con una transacción por lote. Los hashes bcrypt, que son casi
+# todo el coste, se calculan en paralelo en un pool de procesos (o hilos).
+#
+# Los executemany no pasan por los eventos del ORM, así que aquí se rellenan
+# a mano pais_norm/ciudad_norm, la edad y el índice de texto completo.
+IMPORT_JOB = "importar_jugadores"
+FORMATS = ("csv", "jsonl")
+BATCH_SIZE = 1000
+MAX_STORED_ERRORS = 1000
+MAX_PASSWORD_BYTES = 72  # bcrypt ignora (o rechaza) lo que pasa de aquí
+
+USER_FIELDS = ("email", "password")
+PLAYER_FIELDS = (
+    "nombre", "apellido", "fecha_nacimiento", "pais", "ciudad", "deporte",
+    "posicion", "nivel", "descripcion", "altura", "peso", "phone_code",
+    "telefono", "sitio_web",
+)
+
+
+def roster_format(filename):
+    """'csv' o 'jsonl' según la extensión, o None si no es un formato admitido."""
+    extension = filename.rsplit(".", 1)[-1].lower() if "." in filename else ""
+    if extension == "ndjson":
+        return "jsonl"
+    return extension if extension in FORMATS else None
+
+
+def read_rows(stream, fmt):
+    """Recorre un archivo binario y devuelve (línea, valores, error) por fila."""
+    text = io.TextIOWrapper(stream, encoding="utf-8-sig", newline="")
+    if fmt == "csv":
+        reader = csv.DictReader(text)
+        for row in reader:
+            row.pop(None, None)  # columnas de más sin cabecera
+            yield reader.line_num, row, None
+        return
+
+    for number, line in enumerate(text, 1):
+        if not line.strip():
+            continue
+        try:
+            row = json.loads(line)
+        except ValueError:
+            yield number, None, "JSON no válido"
+            continue
+        if not isinstance(row, dict):
+            yield number, None, "Cada línea debe ser un objeto JSON"
+            continue
+        yield number, row, None
+
+
+def column_lengths():
+    columns = {name: User.__table__.c[name] for name in ("email",)}
+    columns.update({name: Player.__table__.c[name] for name in PLAYER_FIELDS})
+    return {
+        name: column.type.length for name, column in columns.items()
+        if getattr(column.type, "length", None)
+    }
+
+
+def validate_row(values, lengths):
+    """Valida una fila como el registro de jugadores. Devuelve (datos, errores)."""
+    formdata = MultiDict({
+        name: "" if values.get(name) is None else str(values[name]).strip()
+        for name in USER_FIELDS + PLAYER_FIELDS
+    })
+    formdata["confirm_password"] = formdata["password"]
+    form = RegisterPlayerForm(formdata=formdata, meta={"csrf": False})
+    # Las posiciones de cada deporte solo las conoce el navegador (main.js)
+    form.posicion.validate_choice = False
+
+    errors = {} if form.validate() else dict(form.errors)
+    data = {name: form[name].data for name in USER_FIELDS + PLAYER_FIELDS}
+
+    # Los límites de las columnas que el formulario no comprueba harían
+    # fallar el lote entero en PostgreSQL
+    for name, length in lengths.items():
+        if isinstance(data[name], str) and len(data[name]) > length:
+            errors.setdefault(name, []).append(f"Máximo {length} caracteres")
+    if data["password"] and len(data["password"].encode("utf-8")) > MAX_PASSWORD_BYTES:
+        errors.setdefault("password", []).append(
+            f"La contraseña no puede superar {MAX_PASSWORD_BYTES} bytes"
+        )
+    return data, errors
+
+
+def hash_password(password, rounds):
+    # Mismo formato que Flask-Bcrypt ($2b$), así User.check_password() lo acepta
+    return bcrypt.hashpw(password.encode("utf-8"), bcrypt.gensalt(rounds=rounds)).decode("utf-8")
+
+
+def existing_emails(emails):
+    if not emails:
+        return set()
+    rows = db.session.query(db.func.lower(User.email)).filter(
+        db.func.lower(User.email).in_(emails)
+    )
+    return {email for (email,) in rows}
+
+
+def player_row(user_id, data):
+    row = {name: data[name] for name in PLAYER_FIELDS}
+    row.update(
+        user_id=user_id,
+        edad=calculate_age(data["fecha_nacimiento"]),
+        pais_norm=normalize_text(data["pais"]),
+        ciudad_norm=normalize_text(data["ciudad"]),
+    )
+    return row
+
+
+def insert_batch(batch, executor, rounds):
+    """Inserta los pares User+Player de `batch` en una transacción.
+
+    Devuelve las filas descartadas porque su email ya estaba registrado.
+    """
+    users, players = User.__table__, Player.__table__
+    for attempt in range(2):
+        existing = existing_emails([data["email"].lower() for _, data in batch])
+        duplicated = [(line, data) for line, data in batch if data["email"].lower() in existing]
+        fresh = [(line, data) for line, data in batch if data["email"].lower() not in existing]
+        if not fresh:
+            return duplicated
+
+        hashes = executor.map(
+            hash_password, [data["password"] for _, data in fresh],
+            [rounds] * len(fresh), chunksize=16,
+        )
+        now = datetime.utcnow()
+        user_rows = [
+            {"email": data["email"], "password_hash": password_hash,
+             "role": "jugador", "is_active": True, "created_at": now}
+            for (_, data), password_hash in zip(fresh, hashes)
+        ]
+        try:
+            user_ids = db.session.execute(
+                insert(users).returning(users.c.id, sort_by_parameter_order=True),
+                user_rows,
+            ).scalars().all()
+            player_rows = [player_row(user_id, data) for user_id, (_, data) in zip(user_ids, fresh)]
+            player_ids = db.session.execute(
+                insert(players).returning(players.c.id, sort_by_parameter_order=True),
+                player_rows,
+            ).scalars().all()
+            index_new_players(db.session.connection(), [
+                dict(fulltext_document(SimpleNamespace(**row)), id=player_id)
+                for player_id, row in zip(player_ids, player_rows)
+            ])
+            db.session.commit()
+            invalidate_search_cache()
+            return duplicated
+        except IntegrityError:
+            # Alguien se registró con uno de estos emails mientras tanto:
+            # se repite el lote descartando los que ya existen
+            db.session.rollback()
+            if attempt:
+                raise
+
+
+def import_roster(stream, fmt, executor, batch_size=BATCH_SIZE, progress=None):
+    """Importa un archivo de jugadores por lotes de `batch_size`.
+
+    Devuelve {"total", "imported", "errors"} con un error por fila rechazada;
+    `progress(report)` se llama tras confirmar cada lote.
+    """
+    rounds = current_app.config["BCRYPT_LOG_ROUNDS"]
+    lengths = column_lengths()
+    report = {"total": 0, "imported": 0, "errors": []}
+    seen = {}  # email -> línea, para detectar repetidos dentro del archivo
+    batch = []
+
+    def reject(line, email, errors):
+        report["errors"].append({"linea": line, "email": email, "errores": errors})
+
+    def flush():
+        duplicated = insert_batch(batch, executor, rounds)
+        for line, data in duplicated:
+            reject(line, data["email"], {"email": ["Ya existe un usuario con este email"]})
+        report["imported"] += len(batch) - len(duplicated)
+        batch.clear()
+        if progress:
+            progress(report)
+
+    for line, values, error in read_rows(stream, fmt):
+        report["total"] += 1
+        if error:
+            reject(line, None, {"fila": [error]})
+            continue
+        data, errors = validate_row(values, lengths)
+        email = (data["email"] or "").lower()
+        if not errors and email in seen:
+            errors = {"email": [f"Email repetido en el archivo (línea {seen[email]})"]}
+        if errors:
+            reject(line, data["email"], errors)
+            continue
+        seen[email] = line
+        batch.append((line, data))
+        if len(batch) >= batch_size:
+            flush()
+    if batch:
+        flush()
+    elif progress:
+        progress(report)
+    return report
+
+
+# --------------------------------------------------
+# IMPORTACIÓN DESDE EL PANEL
+# --------------------------------------------------
+
+
+def start_import(stream, filename, fmt, user_id, storage, scratch_folder):
+    """Guarda el archivo subido y encola su importación (el llamador hace commit)."""
+    path = temp_path(scratch_folder)
+    with open(path, "wb") as f:
+        shutil.copyfileobj(stream, f)
+    key = f"imports/{os.path.basename(path)}.{fmt}"
+    storage.save_file(path, key)
+
+    roster_import = RosterImport(filename=filename, storage_key=key, created_by=user_id)
+    db.session.add(roster_import)
+    db.session.flush()
+    enqueue(IMPORT_JOB, {"import_id": roster_import.id})
+    return roster_import
+
+
+def import_status(roster_import):
+    return {
+        "id": roster_import.id,
+        "archivo": roster_import.filename,
+        "estado": roster_import.status,
+        "filas": roster_import.total,
+        "importados": roster_import.imported,
+        "errores": roster_import.error_count,
+        "detalle_errores": json.loads(roster_import.errors or "[]"),
+    }
+
+
+@handler(IMPORT_JOB)
+def run_import(import_id):
+    roster_import = db.session.get(RosterImport, import_id)
+    if roster_import is None or roster_import.status != "pendiente":
+        return
+
+    storage = get_storage(current_app)
+    scratch = os.path.join(current_app.root_path, current_app.config["UPLOAD_FOLDER"])
+    roster_import.status = "en_curso"
+    db.session.commit()
+
+    def progress(report):
+        roster_import.total = report["total"]
+        roster_import.imported = report["imported"]
+        roster_import.error_count = len(report["errors"])
+        db.session.commit()
+        heartbeat()
+
+    try:
+        # Los trabajadores son procesos daemon y no pueden crear otros; bcrypt
+        # libera el GIL, así que los hilos también reparten el hash entre núcleos
+        with ThreadPoolExecutor(os.cpu_count()) as executor, \
+                storage.local_file(roster_import.storage_key, scratch) as path, \
+                open(path, "rb") as f:
+            report = import_roster(f, roster_format(roster_import.storage_key), executor, progress=progress)
+    except Exception as e:
+        db.session.rollback()
+        roster_import.status = "error"
+        roster_import.errors = json.dumps([{"linea": None, "email": None, "errores": {"archivo": [str(e)]}}])
+        roster_import.finished_at = datetime.utcnow()
+        db.session.commit()
+        raise
+
+    roster_import.status = "completado"
+    roster_import.errors = json.dumps(report["errors"][:MAX_STORED_ERRORS], ensure_ascii=False)
+    roster_import.finished_at = datetime.utcnow()
+    db.session.commit()
+    storage.delete(roster_import.storage_key)
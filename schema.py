@@ -0,0 +1,110 @@
+from sqlalchemy import bindparam, inspect, text
+from sqlalchemy.schema import CreateColumn
+
+from messaging import rebuild_conversations
+from models import db, Player, normalize_text
+from search import rebuild_fulltext_index, refresh_ages
+
+# --------------------------------------------------
+# ACTUALIZACIÓN DEL ESQUEMA
+# --------------------------------------------------
+# No hay migraciones: db.create_all() crea las tablas nuevas pero no toca las
+# existentes. upgrade_database() compara los modelos con la base de datos,
+# añade las columnas e índices que faltan y rellena los datos derivados
+# (ubicación normalizada, índice de texto, edades, hilos de mensajes). Se
+# puede ejecutar las veces que haga falta: lo que ya existe no se toca.
+FULLTEXT_TABLES = {"sqlite": "player_fts", "postgresql": "player_search"}
+
+# Índices de versiones anteriores que ya no usa ninguna consulta
+OBSOLETE_INDEXES = {"player": ("ix_player_deporte_nivel_edad",)}
+
+
+def add_column(connection, table, column):
+    # Solo la columna: las claves foráneas de tablas existentes no se añaden
+    if not column.nullable and column.server_default is None:
+        raise RuntimeError(f"{table.name}.{column.name} es NOT NULL sin valor por defecto")
+    preparer = connection.dialect.identifier_preparer
+    ddl = CreateColumn(column).compile(dialect=connection.dialect)
+    connection.execute(text(f"ALTER TABLE {preparer.format_table(table)} ADD COLUMN {ddl}"))
+
+
+def index_names(connection, inspector, table_name):
+    if connection.dialect.name == "sqlite":
+        # El inspector de SQLite se salta los índices sobre expresiones (lower(email)...)
+        return set(connection.execute(
+            text("SELECT name FROM sqlite_master WHERE type = 'index' AND tbl_name = :table"),
+            {"table": table_name},
+        ).scalars())
+    return {i["name"] for i in inspector.get_indexes(table_name)}
+
+
+def backfill_locations(batch_size=1000):
+    """Rellena pais_norm/ciudad_norm de los jugadores existentes."""
+    players = Player.__table__
+    update = (
+        players.update()
+        .where(players.c.id == bindparam("player_id"))
+        .values(pais_norm=bindparam("b_pais"), ciudad_norm=bindparam("b_ciudad"))
+    )
+    last_id = 0
+    while True:
+        rows = db.session.execute(
+            db.select(players.c.id, players.c.pais, players.c.ciudad)
+            .where(players.c.id > last_id)
+            .order_by(players.c.id)
+            .limit(batch_size)
+        ).all()
+        if not rows:
+            break
+        db.session.execute(update, [
+            {"player_id": player_id, "b_pais": normalize_text(pais), "b_ciudad": normalize_text(ciudad)}
+            for player_id, pais, ciudad in rows
+        ])
+        db.session.commit()
+        last_id = rows[-1].id
+
+
+def upgrade_database():
+    """Lleva una base de datos antigua al esquema actual; devuelve los cambios hechos."""
+    engine = db.engine
+    inspector = inspect(engine)
+    tables = set(inspector.get_table_names())
+    fulltext_table = FULLTEXT_TABLES.get(engine.dialect.name)
+    changes = []
+
+    # Tablas nuevas (con sus índices) y el índice de texto completo
+    db.create_all()
+    changes += [f"tabla {t.name}" for t in db.metadata.sorted_tables if t.name not in tables]
+
+    added = set()
+    with engine.begin() as connection:
+        for table in db.metadata.sorted_tables:
+            if table.name not in tables:
+                continue
+            columns = {c["name"] for c in inspector.get_columns(table.name)}
+            for column in table.columns:
+                if column.name not in columns:
+                    add_column(connection, table, column)
+                    added.add((table.name, column.name))
+                    changes.append(f"columna {table.name}.{column.name}")
+
+            indexes = index_names(connection, inspector, table.name)
+            for index in table.indexes:
+                if index.name not in indexes:
+                    index.create(connection)
+                    changes.append(f"índice {index.name}")
+            for name in OBSOLETE_INDEXES.get(table.name, ()):
+                if name in indexes:
+                    connection.execute(text(f"DROP INDEX {name}"))
+                    changes.append(f"índice {name} eliminado")
+
+    if ("player", "pais_norm") in added or ("player", "ciudad_norm") in added:
+        backfill_locations()
+        changes.append("ubicación normalizada de los jugadores")
+    if fulltext_table and fulltext_table not in tables:
+        changes.append(f"índice de texto completo ({rebuild_fulltext_index()} jugadores)")
+    if "conversation" not in tables:
+        changes.append(f"{rebuild_conversations()} conversaciones reconstruidas")
+    if changes:
+        changes.append(f"{refresh_ages()} edades actualizadas")
+    return changes
@@ -0,0 +1,708 @@
+import hashlib
+import json
+import re
+import threading
+from datetime import date, datetime, time, timedelta, timezone
+
+from flask import current_app
+from sqlalchemy import event, text
+from sqlalchemy.orm import Session, object_session
+
+from cache import TTLCache, RedisCache
+from jobs import enqueue, handler
+from models import db, Job, Player, Video, calculate_age, normalize_text
+from pagination import encode_cursor, decode_cursor, cursor_int, cursor_number, clamp_per_page
+
+# --------------------------------------------------
+# BUSCADOR DE JUGADORES
+# --------------------------------------------------
+# Los filtros se traducen a predicados que pueden usar índices
+# (igualdad sobre deporte/nivel, rango sobre fecha de nacimiento y rango de prefijo sobre
+# las columnas normalizadas) y los resultados se paginan por cursor sobre
+# Player.id, de modo que el coste de cada página no depende de su posición.
+DEFAULT_PER_PAGE = 20
+MAX_PER_PAGE = 100
+
+SEARCH_FIELDS = ("q", "deporte", "posicion", "edad_min", "edad_max", "pais", "ciudad", "nivel")
+INT_FIELDS = ("edad_min", "edad_max")
+
+
+def parse_filters(args):
+    """Extrae los filtros no vacíos de request.args / request.form."""
+    filters = {}
+    for field in SEARCH_FIELDS:
+        value = (args.get(field) or "").strip()
+        if not value:
+            continue
+        if field in INT_FIELDS:
+            try:
+                value = int(value)
+            except ValueError:
+                continue
+        filters[field] = value
+    return filters
+
+
+def parse_per_page(value):
+    return clamp_per_page(value, DEFAULT_PER_PAGE, MAX_PER_PAGE)
+
+
+def prefix_range(expression, prefix):
+    """Búsqueda por prefijo como rango [prefijo, siguiente) para usar el índice."""
+    upper = prefix[:-1] + chr(ord(prefix[-1]) + 1)
+    return db.and_(expression >= prefix, expression < upper)
+
+
+def prefix_filter(column, prefix):
+    return prefix_range(column, normalize_text(prefix))
+
+
+def filtered_query(filters):
+    query = Player.query
+
+    if filters.get("deporte"):
+        query = query.filter(Player.deporte == filters["deporte"])
+
+    if filters.get("nivel"):
+        query = query.filter(Player.nivel == filters["nivel"])
+
+    born_after, born_on_or_before = birth_date_range(
+        filters.get("edad_min"), filters.get("edad_max")
+    )
+    if born_on_or_before is not None:
+        query = query.filter(Player.fecha_nacimiento <= born_on_or_before)
+    if born_after is not None:
+        query = query.filter(Player.fecha_nacimiento > born_after)
+
+    if filters.get("posicion"):
+        query = query.filter(Player.posicion == filters["posicion"])
+
+    if filters.get("pais") and normalize_text(filters["pais"]):
+        query = query.filter(prefix_filter(Player.pais_norm, filters["pais"]))
+
+    if filters.get("ciudad") and normalize_text(filters["ciudad"]):
+        query = query.filter(prefix_filter(Player.ciudad_norm, filters["ciudad"]))
+
+    return query
+
+
+# --------------------------------------------------
+# EDAD
+# --------------------------------------------------
+# Player.edad se calcula al guardar el perfil y envejece con cada
+# cumpleaños, así que los filtros por edad se traducen a un rango sobre
+# fecha_nacimiento (siempre correcto y con índice). La columna edad solo se
+# usa para mostrarla y la recalcula cada noche el trabajo AGE_REFRESH_JOB.
+AGE_REFRESH_JOB = "actualizar_edades"
+# Un fallo pasajero (base de datos bloqueada, timeout) no debe dejar las edades sin actualizar
+AGE_REFRESH_ATTEMPTS = 3
+MAX_AGE = 120
+
+
+def years_before(today, years):
+    """La fecha de hace `years` años; un 29 de febrero pasa al 28 si no es bisiesto."""
+    try:
+        return today.replace(year=today.year - years)
+    except ValueError:
+        return today.replace(year=today.year - years, day=28)
+
+
+def birth_date_range(edad_min=None, edad_max=None, today=None):
+    """Traduce edades a (nacido_después_de, nacido_como_muy_tarde); None = sin límite.
+
+    Igual que calculate_age(): se tiene `n` años desde el día del cumpleaños.
+    """
+    today = today or date.today()
+    born_on_or_before = born_after = None
+    if edad_min is not None:
+        born_on_or_before = years_before(today, min(max(edad_min, 0), MAX_AGE))
+    if edad_max is not None:
+        born_after = years_before(today, min(max(edad_max, 0), MAX_AGE) + 1)
+    return born_after, born_on_or_before
+
+
+def refresh_ages(today=None):
+    """Recalcula Player.edad con un UPDATE por edad sobre el índice de fecha_nacimiento.
+
+    Solo toca las filas cuya edad guardada no coincide, así que tras la
+    primera ejecución cada noche actualiza poco más que los cumpleaños del día.
+    """
+    today = today or date.today()
+    players = Player.__table__
+    oldest = db.session.query(db.func.min(Player.fecha_nacimiento)).scalar()
+    if oldest is None:
+        return 0
+
+    updated = 0
+    max_age = min(MAX_AGE, today.year - oldest.year + 1)
+    for age in range(0, max_age + 1):
+        born_after, born_on_or_before = birth_date_range(age, age, today)
+        result = db.session.execute(
+            players.update()
+            .where(
+                players.c.fecha_nacimiento > born_after,
+                players.c.fecha_nacimiento <= born_on_or_before,
+                db.or_(players.c.edad.is_(None), players.c.edad != age),
+            )
+            .values(edad=age)
+        )
+        updated += result.rowcount
+    # Fechas fuera de esos rangos (futuras o de hace más de MAX_AGE años, casi
+    # siempre erratas): son pocas y se calculan una a una como calculate_age()
+    outliers = db.session.query(players.c.id, players.c.fecha_nacimiento, players.c.edad).filter(
+        db.or_(
+            players.c.fecha_nacimiento > today,
+            players.c.fecha_nacimiento <= years_before(today, max_age + 1),
+        )
+    )
+    for player_id, birth_date, stored in outliers.all():
+        age = calculate_age(birth_date, today)
+        if stored != age:
+            db.session.execute(players.update().where(players.c.id == player_id).values(edad=age))
+            updated += 1
+    # Sin fecha de nacimiento no hay edad que mostrar
+    result = db.session.execute(
+        players.update()
+        .where(players.c.fecha_nacimiento.is_(None), players.c.edad.isnot(None))
+        .values(edad=None)
+    )
+    updated += result.rowcount
+    db.session.commit()
+    return updated
+
+
+def next_age_refresh(now=None):
+    """Próxima medianoche local (más 5 minutos), expresada en UTC como Job.run_at."""
+    now = (now or datetime.now()).astimezone()
+    # astimezone() sobre la hora local ingenua aplica el desfase de esa fecha (horario de verano)
+    local_run = datetime.combine(now.date() + timedelta(days=1), time(0, 5)).astimezone()
+    return local_run.astimezone(timezone.utc).replace(tzinfo=None)
+
+
+def schedule_age_refresh():
+    """Deja encolada la próxima actualización si no lo está ya (el llamador hace commit)."""
+    pending = Job.query.filter(
+        Job.kind == AGE_REFRESH_JOB, Job.status.in_(("pendiente", "en_curso"))
+    ).first()
+    if pending is None:
+        enqueue(AGE_REFRESH_JOB, run_at=next_age_refresh(), max_attempts=AGE_REFRESH_ATTEMPTS)
+
+
+@handler(AGE_REFRESH_JOB)
+def run_age_refresh():
+    try:
+        refresh_ages()
+    finally:
+        # La noche siguiente se programa aunque esta falle (los reintentos de
+        # esta van aparte); si un reintento anterior ya la dejó en cola, no se repite
+        db.session.rollback()
+        pending = Job.query.filter(Job.kind == AGE_REFRESH_JOB, Job.status == "pendiente").first()
+        if pending is None:
+            enqueue(AGE_REFRESH_JOB, run_at=next_age_refresh(), max_attempts=AGE_REFRESH_ATTEMPTS)
+        db.session.commit()
+
+
+# --------------------------------------------------
+# TEXTO LIBRE
+# --------------------------------------------------
+# Índice de texto completo sobre los perfiles: tabla virtual FTS5 en SQLite
+# y tabla con tsvector + índice GIN en PostgreSQL. Ambos se alimentan con
+# texto normalizado (sin acentos), así "futbol" encuentra "fútbol" y
+# "cordoba" encuentra "Córdoba". Se mantienen sincronizados desde los
+# eventos de Player; rebuild_fulltext_index() rellena tablas existentes.
+FTS_COLUMNS = ("nombre", "apellido", "posicion", "deporte", "ciudad", "pais", "descripcion")
+FTS_WEIGHTS = (10.0, 10.0, 5.0, 3.0, 3.0, 2.0, 1.0)
+MAX_QUERY_TERMS = 8
+
+SQLITE_FTS_DDL = (
+    "CREATE VIRTUAL TABLE IF NOT EXISTS player_fts USING fts5("
+    + ", ".join(FTS_COLUMNS)
+    + ", tokenize='unicode61 remove_diacritics 2')"
+)
+
+POSTGRES_FTS_DDL = (
+    "CREATE TABLE IF NOT EXISTS player_search ("
+    "player_id INTEGER PRIMARY KEY REFERENCES player (id) ON DELETE CASCADE, "
+    "document TSVECTOR NOT NULL)",
+    "CREATE INDEX IF NOT EXISTS ix_player_search_document "
+    "ON player_search USING GIN (document)",
+)
+
+POSTGRES_DOCUMENT = (
+    "setweight(to_tsvector('simple', :nombre || ' ' || :apellido), 'A') || "
+    "setweight(to_tsvector('simple', :posicion || ' ' || :deporte), 'B') || "
+    "setweight(to_tsvector('simple', :ciudad || ' ' || :pais), 'C') || "
+    "setweight(to_tsvector('simple', :descripcion), 'D')"
+)
+
+
+@event.listens_for(db.metadata, "after_create")
+def _create_fulltext_index(target, connection, **kw):
+    if connection.dialect.name == "sqlite":
+        connection.execute(text(SQLITE_FTS_DDL))
+    elif connection.dialect.name == "postgresql":
+        for statement in POSTGRES_FTS_DDL:
+            connection.execute(text(statement))
+
+
+@event.listens_for(db.metadata, "before_drop")
+def _drop_fulltext_index(target, connection, **kw):
+    if connection.dialect.name == "sqlite":
+        connection.execute(text("DROP TABLE IF EXISTS player_fts"))
+    elif connection.dialect.name == "postgresql":
+        connection.execute(text("DROP TABLE IF EXISTS player_search"))
+
+
+def fulltext_document(player):
+    return {
+        column: normalize_text(getattr(player, column)) or ""
+        for column in FTS_COLUMNS
+    }
+
+
+SQLITE_FTS_INSERT = (
+    "INSERT INTO player_fts (rowid, " + ", ".join(FTS_COLUMNS) + ") "
+    "VALUES (:id, " + ", ".join(":" + c for c in FTS_COLUMNS) + ")"
+)
+POSTGRES_FTS_UPSERT = (
+    "INSERT INTO player_search (player_id, document) "
+    "VALUES (:id, " + POSTGRES_DOCUMENT + ") "
+    "ON CONFLICT (player_id) DO UPDATE SET document = EXCLUDED.document"
+)
+
+
+def index_player(connection, player_id, document):
+    if connection.dialect.name == "sqlite":
+        connection.execute(
+            text("DELETE FROM player_fts WHERE rowid = :id"), {"id": player_id}
+        )
+        connection.execute(text(SQLITE_FTS_INSERT), dict(document, id=player_id))
+    elif connection.dialect.name == "postgresql":
+        connection.execute(text(POSTGRES_FTS_UPSERT), dict(document, id=player_id))
+
+
+def index_new_players(connection, documents):
+    """Indexa en un solo executemany jugadores insertados sin el ORM.
+
+    `documents` son fulltext_document() con la clave "id" añadida; como las
+    filas son nuevas no hay entrada previa que borrar.
+    """
+    if not documents:
+        return
+    if connection.dialect.name == "sqlite":
+        connection.execute(text(SQLITE_FTS_INSERT), documents)
+    elif connection.dialect.name == "postgresql":
+        connection.execute(text(POSTGRES_FTS_UPSERT), documents)
+
+
+def unindex_player(connection, player_id):
+    if connection.dialect.name == "sqlite":
+        connection.execute(
+            text("DELETE FROM player_fts WHERE rowid = :id"), {"id": player_id}
+        )
+    elif connection.dialect.name == "postgresql":
+        connection.execute(
+            text("DELETE FROM player_search WHERE player_id = :id"), {"id": player_id}
+        )
+
+
+@event.listens_for(Player, "after_insert")
+@event.listens_for(Player, "after_update")
+def _sync_player_fulltext(mapper, connection, target):
+    index_player(connection, target.id, fulltext_document(target))
+
+
+@event.listens_for(Player, "after_delete")
+def _remove_player_fulltext(mapper, connection, target):
+    unindex_player(connection, target.id)
+
+
+def rebuild_fulltext_index(batch_size=1000):
+    """Reindexa todos los jugadores (p. ej. tras crear el índice sobre una base existente)."""
+    connection = db.session.connection()
+    last_id = 0
+    total = 0
+    while True:
+        batch = (
+            Player.query.filter(Player.id > last_id)
+            .order_by(Player.id)
+            .limit(batch_size)
+            .all()
+        )
+        if not batch:
+            break
+        for player in batch:
+            index_player(connection, player.id, fulltext_document(player))
+        last_id = batch[-1].id
+        total += len(batch)
+        db.session.commit()
+        connection = db.session.connection()
+    return total
+
+
+def query_terms(q):
+    return re.findall(r"\w+", normalize_text(q) or "")[:MAX_QUERY_TERMS]
+
+
+def fulltext_subquery(terms):
+    """Subconsulta (player_id, score) con las coincidencias de los términos; menor score = más relevante.
+
+    Cada término se busca como prefijo y todos deben aparecer. None si la
+    base de datos no tiene índice de texto completo.
+    """
+    dialect = db.session.get_bind().dialect.name
+    if dialect == "sqlite":
+        weights = ", ".join(str(w) for w in FTS_WEIGHTS)
+        stmt = text(
+            "SELECT rowid AS player_id, bm25(player_fts, " + weights + ") AS score "
+            "FROM player_fts WHERE player_fts MATCH :match"
+        ).bindparams(match=" ".join(f'"{t}"*' for t in terms))
+    elif dialect == "postgresql":
+        stmt = text(
+            "SELECT player_id, -ts_rank_cd(document, to_tsquery('simple', :match)) AS score "
+            "FROM player_search WHERE document @@ to_tsquery('simple', :match)"
+        ).bindparams(match=" & ".join(f"{t}:*" for t in terms))
+    else:
+        return None
+
+    return stmt.columns(player_id=db.Integer, score=db.Float).subquery("fts")
+
+
+# Sin índice (otras bases de datos) se busca cada término como subcadena;
+# país y ciudad en sus columnas normalizadas, como el índice.
+SUBSTRING_COLUMNS = (
+    Player.nombre, Player.apellido, Player.posicion, Player.deporte,
+    Player.ciudad_norm, Player.pais_norm, Player.descripcion,
+)
+_fallback_warned = False
+
+
+def substring_condition(terms):
+    """Sin índice de texto: cada término debe aparecer en alguna columna (sin relevancia)."""
+    global _fallback_warned
+    if not _fallback_warned:
+        _fallback_warned = True
+        current_app.logger.warning(
+            "Búsqueda de texto sin índice para %s: se filtra con ILIKE",
+            db.session.get_bind().dialect.name,
+        )
+    return db.and_(*(
+        db.or_(*(column.icontains(term, autoescape=True) for column in SUBSTRING_COLUMNS))
+        for term in terms
+    ))
+
+
+def text_search(query, q):
+    """Aplica el texto libre q a `query`; devuelve (consulta, subconsulta FTS o None)."""
+    terms = query_terms(q)
+    if not terms:
+        return query, None
+    fts = fulltext_subquery(terms)
+    if fts is None:
+        return query.filter(substring_condition(terms)), None
+    return query.join(fts, fts.c.player_id == Player.id), fts
+
+
+def ranked_query(filters):
+    """Consulta de (jugador, puntuación) con los filtros y el orden del buscador.
+
+    Sin texto libre (o sin índice de texto) el orden es por id descendente y
+    la puntuación es NULL; con `q` se ordena por relevancia y se desempata
+    por id. Devuelve también la subconsulta FTS (o None) para poder filtrar
+    por cursor.
+    """
+    query, fts = text_search(filtered_query(filters), filters.get("q"))
+    if fts is not None:
+        query = query.add_columns(fts.c.score).order_by(fts.c.score, Player.id.desc())
+    else:
+        query = query.add_columns(db.null()).order_by(Player.id.desc())
+    return query, fts
+
+
+def search_players(filters, cursor=None, per_page=DEFAULT_PER_PAGE):
+    """Devuelve (jugadores, siguiente_cursor); con `q` el cursor guarda puntuación e id."""
+    query, fts = ranked_query(filters)
+    after = decode_cursor(cursor)
+
+    # Un cursor con valores de otro tipo se trata como si no hubiera cursor
+    if fts is not None:
+        if after and len(after) == 2 and cursor_number(after[0]) is not None \
+                and cursor_int(after[1]) is not None:
+            score, last_id = after
+            query = query.filter(db.or_(
+                fts.c.score > score,
+                db.and_(fts.c.score == score, Player.id < last_id),
+            ))
+    elif after and len(after) == 1 and cursor_int(after[0]) is not None:
+        query = query.filter(Player.id < after[0])
+
+    # Se pide una fila extra para saber si hay página siguiente sin COUNT(*)
+    rows = query.limit(per_page + 1).all()
+
+    next_cursor = None
+    if len(rows) > per_page:
+        rows = rows[:per_page]
+        last_player, last_score = rows[-1]
+        key = [last_player.id] if fts is None else [last_score, last_player.id]
+        next_cursor = encode_cursor(key)
+
+    return [player for player, _ in rows], next_cursor
+
+
+# --------------------------------------------------
+# CACHÉ DE RESULTADOS
+# --------------------------------------------------
+# Unas pocas búsquedas de ojeadores se repiten miles de veces al día. Cada
+# página se cachea como ids de jugadores + siguiente cursor, con clave =
+# filtros normalizados + cursor + tamaño de página + generación; al acertar
+# solo se cargan esos jugadores por clave primaria. La generación sube con
+# cada cambio confirmado en Player, así una escritura deja obsoletas todas
+# las entradas sin recorrerlas. Nivel LRU+TTL por proceso y, opcionalmente,
+# uno compartido en Redis (SEARCH_CACHE_URL) que guarda también la
+# generación; sin él, los demás procesos ven los cambios al caducar sus
+# entradas (SEARCH_CACHE_TTL).
+SEARCH_CACHE_SIZE = 4096
+GENERATION_KEY = "search:generation"
+
+
+class SearchCache:
+    def __init__(self, maxsize=SEARCH_CACHE_SIZE, ttl=60, shared=None):
+        self.local = TTLCache(maxsize=maxsize, ttl=ttl)
+        self.shared = shared
+        self.lock = threading.Lock()
+        self.local_generation = 0
+        self.counters = {"aciertos_local": 0, "aciertos_compartida": 0, "fallos": 0, "invalidaciones": 0}
+
+    def count(self, name):
+        with self.lock:
+            self.counters[name] += 1
+
+    def generation(self):
+        if self.shared is not None:
+            return self.shared.get(GENERATION_KEY, 0)
+        return self.local_generation
+
+    def get(self, key):
+        page = self.local.get(key)
+        if page is not None:
+            self.count("aciertos_local")
+            return page
+        if self.shared is not None:
+            page = self.shared.get(key)
+            if page is not None:
+                self.local.set(key, page)
+                self.count("aciertos_compartida")
+                return page
+        self.count("fallos")
+        return None
+
+    def set(self, key, page):
+        self.local.set(key, page)
+        if self.shared is not None:
+            self.shared.set(key, page)
+
+    def bump(self):
+        with self.lock:
+            self.local_generation += 1
+            self.counters["invalidaciones"] += 1
+        # Las entradas de generaciones anteriores ya no se pueden pedir
+        self.local.clear()
+        if self.shared is not None:
+            self.shared.incr(GENERATION_KEY)
+
+    def stats(self):
+        with self.lock:
+            stats = dict(self.counters)
+        lookups = stats["aciertos_local"] + stats["aciertos_compartida"] + stats["fallos"]
+        hits = lookups - stats["fallos"]
+        stats.update(
+            consultas=lookups,
+            tasa_aciertos=round(hits / lookups, 4) if lookups else None,
+            entradas_local=len(self.local.data),
+            generacion=self.generation(),
+        )
+        return stats
+
+
+_search_cache = None
+
+
+def init_search_cache(app):
+    global _search_cache
+    _search_cache = None
+    if app.config["SEARCH_CACHE_TTL"] <= 0:
+        return None
+    shared = None
+    if app.config.get("SEARCH_CACHE_URL"):
+        shared = RedisCache(app.config["SEARCH_CACHE_URL"], ttl=app.config["SEARCH_CACHE_TTL"])
+    _search_cache = SearchCache(ttl=app.config["SEARCH_CACHE_TTL"], shared=shared)
+    return _search_cache
+
+
+def search_cache_key(filters, cursor, per_page, generation, today=None, kind="pagina"):
+    """Clave de la página (o de las facetas): dos búsquedas con los mismos resultados comparten clave."""
+    normalized = {}
+    for field, value in filters.items():
+        if field == "q":
+            value = " ".join(query_terms(value))
+        elif field in ("pais", "ciudad"):
+            value = normalize_text(value)
+        if value not in (None, ""):
+            normalized[field] = value
+    if "edad_min" in normalized or "edad_max" in normalized or kind == "facetas":
+        # Los rangos de fechas de nacimiento (filtros y tramos de edad) cambian cada día
+        normalized["hoy"] = (today or date.today()).isoformat()
+    raw = json.dumps([kind, normalized, cursor or "", per_page], sort_keys=True, ensure_ascii=False)
+    return f"search:{generation}:{hashlib.sha1(raw.encode('utf-8')).hexdigest()}"
+
+
+def players_by_id(ids):
+    """Los jugadores de `ids` en ese orden, en una sola consulta."""
+    if not ids:
+        return []
+    players = {p.id: p for p in Player.query.filter(Player.id.in_(ids))}
+    return [players[i] for i in ids if i in players]
+
+
+def cached_search(filters, cursor=None, per_page=DEFAULT_PER_PAGE):
+    """search_players() a través de la caché de resultados."""
+    if _search_cache is None:
+        return search_players(filters, cursor=cursor, per_page=per_page)
+
+    # La generación se lee antes de consultar: si un cambio llega mientras
+    # tanto, la página se guarda con la generación vieja y nadie la pedirá
+    key = search_cache_key(filters, cursor, per_page, _search_cache.generation())
+    page = _search_cache.get(key)
+    if page is not None:
+        return players_by_id(page["ids"]), page["siguiente"]
+
+    players, next_cursor = search_players(filters, cursor=cursor, per_page=per_page)
+    _search_cache.set(key, {"ids": [p.id for p in players], "siguiente": next_cursor})
+    return players, next_cursor
+
+
+def invalidate_search_cache():
+    """Para escrituras que no pasan por el ORM (inserciones masivas)."""
+    if _search_cache is not None:
+        _search_cache.bump()
+
+
+def search_cache_stats():
+    return _search_cache.stats() if _search_cache is not None else None
+
+
+# Igual que la caché de identidad: se anota durante el flush y se invalida
+# tras el commit, para no volver a cachear datos aún no confirmados
+@event.listens_for(Player, "after_insert")
+@event.listens_for(Player, "after_update")
+@event.listens_for(Player, "after_delete")
+def _mark_search_dirty(mapper, connection, target):
+    session = object_session(target)
+    if session is not None:
+        session.info["search_dirty"] = True
+
+
+@event.listens_for(Session, "after_commit")
+def _invalidate_search_after_commit(session):
+    if session.info.pop("search_dirty", False):
+        invalidate_search_cache()
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard_search_dirty(session):
+    session.info.pop("search_dirty", None)
+
+
+# --------------------------------------------------
+# FACETAS
+# --------------------------------------------------
+# Cuántos jugadores de la búsqueda actual hay por deporte, nivel, país y
+# tramo de edad, para afinar sin búsquedas de prueba. Un único GROUP BY por
+# las cuatro dimensiones recorre los resultados una sola vez y cada faceta se
+# suma en Python (los grupos son pocos: deportes x niveles x países x
+# tramos). Los tramos de edad son rangos de fecha_nacimiento, como el filtro.
+AGE_BUCKETS = ((None, 15), (16, 18), (19, 21), (22, 25), (26, 30), (31, None))
+MAX_COUNTRY_FACETS = 10
+
+
+def age_bucket_label(edad_min, edad_max):
+    if edad_min is None:
+        return f"hasta {edad_max}"
+    if edad_max is None:
+        return f"{edad_min} o más"
+    return f"{edad_min}-{edad_max}"
+
+
+def age_bucket_expression(today=None):
+    """CASE con el índice del tramo de AGE_BUCKETS de cada jugador (NULL sin fecha)."""
+    whens = []
+    for index, (edad_min, edad_max) in enumerate(AGE_BUCKETS):
+        born_after, born_on_or_before = birth_date_range(edad_min, edad_max, today)
+        conditions = []
+        if born_on_or_before is not None:
+            conditions.append(Player.fecha_nacimiento <= born_on_or_before)
+        if born_after is not None:
+            conditions.append(Player.fecha_nacimiento > born_after)
+        whens.append((db.and_(*conditions), index))
+    return db.case(*whens, else_=None)
+
+
+def search_facets(filters, today=None):
+    """Recuento por faceta de los jugadores que cumplen `filters`."""
+    query, _ = text_search(filtered_query(filters), filters.get("q"))
+
+    bucket = age_bucket_expression(today).label("tramo")
+    rows = (
+        query.with_entities(Player.deporte, Player.nivel, Player.pais, bucket, db.func.count())
+        .group_by(Player.deporte, Player.nivel, Player.pais, bucket)
+        .all()
+    )
+
+    totals = {"deporte": {}, "nivel": {}, "pais": {}, "edad": {}}
+    for deporte, nivel, pais, tramo, count in rows:
+        for facet, value in (("deporte", deporte), ("nivel", nivel), ("pais", pais), ("edad", tramo)):
+            if value is not None and value != "":
+                totals[facet][value] = totals[facet].get(value, 0) + count
+
+    def by_count(counts, limit=None):
+        items = sorted(counts.items(), key=lambda item: (-item[1], item[0]))
+        return [{"valor": value, "total": count} for value, count in items[:limit]]
+
+    return {
+        "total": sum(row[-1] for row in rows),
+        "deporte": by_count(totals["deporte"]),
+        "nivel": by_count(totals["nivel"]),
+        "pais": by_count(totals["pais"], MAX_COUNTRY_FACETS),
+        "edad": [
+            {"valor": age_bucket_label(edad_min, edad_max), "edad_min": edad_min,
+             "edad_max": edad_max, "total": totals["edad"][index]}
+            for index, (edad_min, edad_max) in enumerate(AGE_BUCKETS)
+            if index in totals["edad"]
+        ],
+    }
+
+
+def cached_facets(filters):
+    """search_facets() a través de la caché de resultados (no dependen del cursor)."""
+    if _search_cache is None:
+        return search_facets(filters)
+    key = search_cache_key(filters, None, None, _search_cache.generation(), kind="facetas")
+    facets = _search_cache.get(key)
+    if facets is None:
+        facets = search_facets(filters)
+        _search_cache.set(key, facets)
+    return facets
+
+
+def video_counts(players):
+    """Número de videos por jugador de la página, en una sola consulta agrupada."""
+    ids = [p.id for p in players]
+    if not ids:
+        return {}
+    rows = (
+        db.session.query(Video.player_id, db.func.count(Video.id))
+        .filter(Video.player_id.in_(ids))
+        .group_by(Video.player_id)
+        .all()
+    )
+    return dict(rows)
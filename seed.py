@@ -1,6 +1,12 @@
 from app import app, db
-from models import User, Player, Scout, Event, Video, Message
-from datetime import datetime, timedelta
+from models import User, Player, Scout, Event, Video, Message, calculate_age, normalize_text
+from forms import COUNTRIES, SPORT_POSITIONS
+from messaging import send_message, rebuild_conversations
+from search import fulltext_document, index_new_players, invalidate_search_cache
+from sqlalchemy import insert
+from types import SimpleNamespace
+from datetime import date, datetime, timedelta
+import argparse
 import random
 
 def seed_database():
@@ -298,25 +304,23 @@ def seed_database():
             # Generate conversation ID
             conversation_id = f"{min(sender.id, receiver.id)}_{max(sender.id, receiver.id)}_prueba_{i+1}"
 
-            message = Message(
-                sender_id=sender.id,
-                receiver_id=receiver.id,
-                subject=f"Mensaje de prueba {i+1}",
-                content=f"Este es un mensaje de prueba número {i+1} para demostrar la funcionalidad del sistema de mensajería.",
-                conversation_id=conversation_id
+            send_message(
+                sender.id,
+                receiver.id,
+                f"Mensaje de prueba {i+1}",
+                f"Este es un mensaje de prueba número {i+1} para demostrar la funcionalidad del sistema de mensajería.",
+                key=conversation_id
             )
-            db.session.add(message)
 
             # Add a reply to create conversation threads
             if random.choice([True, False]):
-                reply = Message(
-                    sender_id=receiver.id,
-                    receiver_id=sender.id,
-                    subject=f"Re: Mensaje de prueba {i+1}",
-                    content=f"Gracias por tu mensaje de prueba número {i+1}. Esta es una respuesta de ejemplo.",
-                    conversation_id=conversation_id
+                send_message(
+                    receiver.id,
+                    sender.id,
+                    f"Re: Mensaje de prueba {i+1}",
+                    f"Gracias por tu mensaje de prueba número {i+1}. Esta es una respuesta de ejemplo.",
+                    key=conversation_id
                 )
-                db.session.add(reply)
 
         db.session.commit()
 
@@ -326,5 +330,238 @@ def seed_database():
         print("Ojeadores: ojeador1@scoutme.com, ojeador2@scoutme.com, ojeador3@scoutme.com / ojeador123")
         print("Jugadores: jugador1@scoutme.com hasta jugador6@scoutme.com / jugador123")
 
+# --------------------------------------------------
+# DATOS SINTÉTICOS PARA PRUEBAS DE CARGA
+# --------------------------------------------------
+# Añade a los datos de prueba miles de jugadores, ojeadores, eventos y
+# mensajes con distribuciones parecidas a las reales (unos pocos países y
+# deportes concentran la mayoría de perfiles, casi todos amateur, ojeadores
+# muy activos y otros casi nada...). Se insertan con executemany, así que se
+# rellenan a mano las columnas que normalmente calculan los eventos del ORM.
+# Todos los usuarios sintéticos comparten la contraseña SYNTHETIC_PASSWORD.
+SYNTHETIC_PASSWORD = 'sintetico123'
+SYNTHETIC_BATCH_SIZE = 2000
+
+FIRST_NAMES = (
+    'Juan', 'Mateo', 'Santiago', 'Lucas', 'Diego', 'Martín', 'Tomás', 'Nicolás',
+    'Sofía', 'Valentina', 'Camila', 'Lucía', 'Martina', 'Julieta', 'Paula', 'Ana',
+    'Carlos', 'Javier', 'Pablo', 'Andrés', 'Gabriel', 'Daniel', 'Laura', 'Elena',
+)
+LAST_NAMES = (
+    'García', 'Fernández', 'González', 'Rodríguez', 'López', 'Martínez', 'Sánchez',
+    'Pérez', 'Gómez', 'Díaz', 'Romero', 'Álvarez', 'Torres', 'Ruiz', 'Silva',
+    'Castro', 'Morales', 'Ortiz', 'Núñez', 'Rojas', 'Medina', 'Herrera', 'Suárez',
+)
+CITIES = {
+    'AR': ('Buenos Aires', 'Córdoba', 'Rosario', 'Mendoza', 'La Plata', 'Mar del Plata'),
+    'BR': ('São Paulo', 'Río de Janeiro', 'Belo Horizonte', 'Porto Alegre'),
+    'CL': ('Santiago', 'Valparaíso', 'Concepción'),
+    'CO': ('Bogotá', 'Medellín', 'Cali', 'Barranquilla'),
+    'MX': ('Ciudad de México', 'Guadalajara', 'Monterrey', 'Puebla'),
+    'UY': ('Montevideo', 'Salto', 'Paysandú'),
+    'US': ('Miami', 'Los Ángeles', 'Nueva York', 'Houston'),
+    'ES': ('Madrid', 'Barcelona', 'Valencia', 'Sevilla', 'Málaga', 'Bilbao'),
+}
+SPORT_WEIGHTS = {
+    'fútbol': 45, 'baloncesto': 18, 'tenis': 10, 'voleibol': 9,
+    'natación': 7, 'atletismo': 7, 'otro': 4,
+}
+LEVEL_WEIGHTS = {'amateur': 70, 'semi-profesional': 22, 'profesional': 8}
+DESCRIPTION_PARTS = (
+    'Jugador rápido', 'con buena técnica', 'y visión de juego', 'Gran capacidad física',
+    'disciplinado y trabajador', 'busca club para la próxima temporada',
+    'experiencia en torneos nacionales', 'Capitán de su equipo', 'zurdo',
+    'excelente lectura del juego', 'formado en la cantera local',
+)
+
+
+def zipf_weights(n, exponent=1.1):
+    # Pocos valores muy frecuentes y una cola larga de poco frecuentes
+    return [1 / (rank + 1) ** exponent for rank in range(n)]
+
+
+def insert_rows(table, rows):
+    """executemany con RETURNING; devuelve los ids en el orden de `rows`."""
+    return db.session.execute(
+        insert(table).returning(table.c.id, sort_by_parameter_order=True), rows
+    ).scalars().all()
+
+
+def insert_users(rng, role, count, password_hash, prefix):
+    now = datetime.utcnow()
+    rows = [{
+        'email': f'{prefix}{n}@sintetico.scoutme.com',
+        'password_hash': password_hash,
+        'role': role,
+        # Un pequeño porcentaje de cuentas desactivadas, como en producción
+        'is_active': rng.random() > 0.03,
+        'created_at': now - timedelta(days=rng.randint(0, 3 * 365)),
+    } for n in range(count)]
+    return insert_rows(User.__table__, rows)
+
+
+def synthetic_player(rng, user_id, countries, country_weights):
+    pais = rng.choices(countries, country_weights)[0]
+    deporte = rng.choices(list(SPORT_WEIGHTS), list(SPORT_WEIGHTS.values()))[0]
+    # Edades entre 14 y 36 años, la mayoría alrededor de los 19
+    birth = date.today() - timedelta(days=int(rng.triangular(14, 36, 19) * 365.25))
+    ciudad = rng.choice(CITIES.get(pais, ('Capital',)))
+    return {
+        'user_id': user_id,
+        'nombre': rng.choice(FIRST_NAMES),
+        'apellido': rng.choice(LAST_NAMES),
+        'fecha_nacimiento': birth,
+        'edad': calculate_age(birth),
+        'pais': pais,
+        'ciudad': ciudad,
+        'pais_norm': normalize_text(pais),
+        'ciudad_norm': normalize_text(ciudad),
+        'deporte': deporte,
+        'posicion': rng.choice(SPORT_POSITIONS[deporte])[0],
+        'nivel': rng.choices(list(LEVEL_WEIGHTS), list(LEVEL_WEIGHTS.values()))[0],
+        'descripcion': ' '.join(rng.sample(DESCRIPTION_PARTS, rng.randint(2, 5))),
+        'altura': round(rng.gauss(178, 9), 1),
+        'peso': round(rng.gauss(72, 9), 1),
+    }
+
+
+def synthetic_events(rng, count, scout_ids, countries, country_weights):
+    now = datetime.now()
+    for n in range(count):
+        deporte = rng.choices(list(SPORT_WEIGHTS), list(SPORT_WEIGHTS.values()))[0]
+        pais = rng.choices(countries, country_weights)[0]
+        yield {
+            'scout_id': rng.choice(scout_ids),
+            'titulo': f'Prueba de {deporte} #{n + 1}',
+            'descripcion': 'Jornada de captación abierta a jugadores de todas las categorías.',
+            # Eventos del último año y del próximo
+            'fecha': now + timedelta(days=rng.uniform(-365, 365)),
+            'ubicacion': rng.choice(CITIES.get(pais, ('Capital',))),
+            'deporte': deporte,
+            'capacidad_maxima': rng.choice((20, 30, 50, 64, 100)),
+        }
+
+
+def synthetic_messages(rng, count, scout_user_ids, player_user_ids):
+    """Conversaciones ojeador-jugador; unos pocos ojeadores escriben la mayoría."""
+    scout_weights = zipf_weights(len(scout_user_ids), exponent=0.8)
+    now = datetime.utcnow()
+    sent = conversation = 0
+    while sent < count:
+        conversation += 1
+        scout_user = rng.choices(scout_user_ids, scout_weights)[0]
+        player_user = rng.choice(player_user_ids)
+        key = f'{min(scout_user, player_user)}_{max(scout_user, player_user)}_sintetico_{conversation}'
+        length = min(1 + int(rng.expovariate(0.25)), count - sent)
+        started = now - timedelta(days=rng.uniform(0, 180))
+        for n in range(length):
+            sender, receiver = (scout_user, player_user) if n % 2 == 0 else (player_user, scout_user)
+            sent_at = started + timedelta(minutes=30 * n + rng.uniform(0, 20))
+            yield {
+                'sender_id': sender,
+                'receiver_id': receiver,
+                'subject': f'Interés en tu perfil #{conversation}',
+                'content': 'Hola, me gustaría saber más sobre tu experiencia y disponibilidad.',
+                # Solo quedan sin leer algunos mensajes de la última semana
+                'is_read': sent_at < now - timedelta(days=7) or rng.random() < 0.5,
+                'sent_at': sent_at,
+                'conversation_id': key,
+            }
+        sent += length
+
+
+def batches(rows, size=SYNTHETIC_BATCH_SIZE):
+    batch = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) == size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def generate_load_data(players=10000, scouts=200, events=500, messages=20000, seed=42):
+    """Añade datos sintéticos a la base creada por seed_database()."""
+    rng = random.Random(seed)
+    with app.app_context():
+        # Un único hash para todos: calcularlo por usuario dominaría el tiempo
+        template = User()
+        template.set_password(SYNTHETIC_PASSWORD)
+        password_hash = template.password_hash
+
+        countries = [code for code, _ in COUNTRIES if code]
+        country_weights = zipf_weights(len(countries))
+        sports, sport_weights = list(SPORT_WEIGHTS), list(SPORT_WEIGHTS.values())
+
+        print(f'Generando {players} jugadores...')
+        player_user_ids = []
+        for start in range(0, players, SYNTHETIC_BATCH_SIZE):
+            count = min(SYNTHETIC_BATCH_SIZE, players - start)
+            user_ids = insert_users(rng, 'jugador', count, password_hash, f'jugador{start}_')
+            rows = [synthetic_player(rng, user_id, countries, country_weights) for user_id in user_ids]
+            player_ids = insert_rows(Player.__table__, rows)
+            index_new_players(db.session.connection(), [
+                dict(fulltext_document(SimpleNamespace(**row)), id=player_id)
+                for player_id, row in zip(player_ids, rows)
+            ])
+            # La mayoría sin videos o con uno; unos pocos con varios
+            videos = [{
+                'player_id': player_id,
+                'titulo': f'Highlights {n + 1}',
+                'tipo': 'youtube',
+                'url': f'https://www.youtube.com/watch?v=sintetico{player_id}x{n}',
+                'uploaded_at': datetime.utcnow(),
+            } for player_id in player_ids for n in range(min(int(rng.expovariate(1.2)), 5))]
+            if videos:
+                db.session.execute(insert(Video.__table__), videos)
+            db.session.commit()
+            player_user_ids += user_ids
+        # Los executemany no pasan por los eventos de Player
+        invalidate_search_cache()
+
+        print(f'Generando {scouts} ojeadores...')
+        scout_user_ids = insert_users(rng, 'ojeador', scouts, password_hash, 'ojeador_')
+        scout_ids = insert_rows(Scout.__table__, [{
+            'user_id': user_id,
+            'nombre': rng.choice(FIRST_NAMES),
+            'apellido': rng.choice(LAST_NAMES),
+            'empresa': f'Agencia {rng.choice(LAST_NAMES)}',
+            'pais': rng.choices(countries, country_weights)[0],
+            'especialidad': rng.choices(sports, sport_weights)[0],
+        } for user_id in scout_user_ids])
+        db.session.commit()
+
+        print(f'Generando {events} eventos...')
+        if scout_ids:
+            for batch in batches(synthetic_events(rng, events, scout_ids, countries, country_weights)):
+                db.session.execute(insert(Event.__table__), batch)
+                db.session.commit()
+
+        print(f'Generando {messages} mensajes...')
+        if scout_user_ids and player_user_ids:
+            for batch in batches(synthetic_messages(rng, messages, scout_user_ids, player_user_ids)):
+                db.session.execute(insert(Message.__table__), batch)
+                db.session.commit()
+        conversations = rebuild_conversations()
+
+        print(f'Datos sintéticos creados ({conversations} conversaciones en total). '
+              f'Contraseña de los usuarios sintéticos: {SYNTHETIC_PASSWORD}')
+
+
 if __name__ == '__main__':
-    seed_database()
\ No newline at end of file
+    parser = argparse.ArgumentParser(description='Carga los datos de prueba (borra la base de datos).')
+    parser.add_argument('--sintetico', action='store_true', help='Añadir datos sintéticos para pruebas de carga')
+    parser.add_argument('--jugadores', type=int, default=10000)
+    parser.add_argument('--ojeadores', type=int, default=200)
+    parser.add_argument('--eventos', type=int, default=500)
+    parser.add_argument('--mensajes', type=int, default=20000)
+    parser.add_argument('--semilla', type=int, default=42, help='Con la misma semilla se generan los mismos datos')
+    args = parser.parse_args()
+
+    seed_database()
+    if args.sintetico:
+        generate_load_data(
+            players=args.jugadores, scouts=args.ojeadores, events=args.eventos,
+            messages=args.mensajes, seed=args.semilla,
+        )
@@ -155,6 +155,230 @@ document.addEventListener('DOMContentLoaded', function() {
     });
 });
 
+// Recipient type-ahead for the message form
+document.addEventListener('DOMContentLoaded', function() {
+    var picker = document.getElementById('recipient-picker');
+    if (!picker) return;
+
+    var input = document.getElementById('recipient-search');
+    var results = document.getElementById('recipient-results');
+    var hidden = document.getElementById('receiver_id');
+    var timer = null;
+
+    function clearResults() {
+        results.innerHTML = '';
+    }
+
+    input.addEventListener('input', function() {
+        hidden.value = '';
+        clearTimeout(timer);
+        var q = input.value.trim();
+        if (q.length < 2) {
+            clearResults();
+            return;
+        }
+        timer = setTimeout(function() {
+            fetch(picker.dataset.url + '?q=' + encodeURIComponent(q))
+                .then(function(response) { return response.json(); })
+                .then(function(data) {
+                    clearResults();
+                    data.usuarios.forEach(function(user) {
+                        var option = document.createElement('button');
+                        option.type = 'button';
+                        option.className = 'list-group-item list-group-item-action';
+                        option.textContent = (user.nombre ? user.nombre + ' - ' : '') + user.email + ' (' + user.role + ')';
+                        option.addEventListener('click', function() {
+                            hidden.value = user.id;
+                            input.value = user.email + ' (' + user.role + ')';
+                            clearResults();
+                        });
+                        results.appendChild(option);
+                    });
+                });
+        }, 200);
+    });
+
+    document.addEventListener('click', function(e) {
+        if (!picker.contains(e.target)) clearResults();
+    });
+});
+
+// Adaptive streaming (HLS): native in Safari, hls.js elsewhere, MP4 as fallback
+document.addEventListener('DOMContentLoaded', function() {
+    document.querySelectorAll('video[data-hls-src]').forEach(function(video) {
+        var src = video.dataset.hlsSrc;
+        if (video.canPlayType('application/vnd.apple.mpegurl')) {
+            video.src = src;
+        } else if (window.Hls && Hls.isSupported()) {
+            var hls = new Hls({ capLevelToPlayerSize: true });
+            hls.on(Hls.Events.ERROR, function(event, data) {
+                // Fatal error: go back to the original MP4 <source>
+                if (data.fatal) {
+                    hls.destroy();
+                    video.removeAttribute('src');
+                    video.load();
+                }
+            });
+            hls.loadSource(src);
+            hls.attachMedia(video);
+        }
+    });
+});
+
+// Chunked, resumable video uploads
+document.addEventListener('DOMContentLoaded', function() {
+    var form = document.getElementById('video-upload-form');
+    if (!form || !window.fetch || !window.Blob || !Blob.prototype.slice) return;
+
+    var progress = document.getElementById('upload-progress');
+    var bar = progress ? progress.querySelector('.progress-bar') : null;
+    var errorBox = document.getElementById('upload-error');
+
+    function setProgress(offset, size) {
+        if (!bar) return;
+        progress.classList.remove('d-none');
+        bar.style.width = Math.floor(offset * 100 / size) + '%';
+    }
+
+    function chunkChecksum(blob) {
+        if (!window.crypto || !crypto.subtle) return Promise.resolve(null);
+        return blob.arrayBuffer()
+            .then(function(buffer) { return crypto.subtle.digest('SHA-256', buffer); })
+            .then(function(digest) {
+                return 'sha256 ' + btoa(String.fromCharCode.apply(null, new Uint8Array(digest)));
+            });
+    }
+
+    function json(response) {
+        return response.json().then(function(data) {
+            data.httpStatus = response.status;
+            return data;
+        });
+    }
+
+    // Reuse a pending upload of the same file (resume) or create a new one
+    function startUpload(file, storageKey) {
+        var pending = localStorage.getItem(storageKey);
+        var resume = pending
+            ? fetch(form.dataset.uploadUrl + '/' + pending).then(json)
+            : Promise.resolve(null);
+
+        return resume.then(function(status) {
+            if (status && status.httpStatus === 200 && status.status === 'pendiente') {
+                return status;
+            }
+            return fetch(form.dataset.uploadUrl, {
+                method: 'POST',
+                headers: { 'Content-Type': 'application/json' },
+                body: JSON.stringify({
+                    filename: file.name,
+                    size: file.size,
+                    titulo: form.querySelector('[name="titulo"]').value,
+                    descripcion: form.querySelector('[name="descripcion"]').value
+                })
+            }).then(json).then(function(status) {
+                if (status.httpStatus !== 201) throw new Error(status.error);
+                localStorage.setItem(storageKey, status.id);
+                return status;
+            });
+        });
+    }
+
+    // Direct upload: ask the server for a presigned URL and PUT the chunk to storage
+    function sendDirectChunk(file, status) {
+        return fetch(form.dataset.uploadUrl + '/' + status.id + '/partes', {
+            method: 'POST',
+            headers: { 'Content-Type': 'application/json' },
+            body: JSON.stringify({ offset: status.offset })
+        }).then(json).then(function(part) {
+            if (part.httpStatus !== 200) return part;
+            var chunk = file.slice(part.offset, part.offset + part.length);
+            return fetch(part.url, { method: part.method, body: chunk }).then(function(response) {
+                if (!response.ok) throw new Error('HTTP ' + response.status);
+                return { httpStatus: 200, offset: part.offset + part.length };
+            });
+        });
+    }
+
+    function sendChunks(file, status, chunkSize, retries) {
+        if (status.offset >= file.size) return Promise.resolve(status);
+
+        var chunk = file.slice(status.offset, status.offset + chunkSize);
+        var sent = status.direct ? sendDirectChunk(file, status) : chunkChecksum(chunk).then(function(checksum) {
+            var headers = { 'Upload-Offset': String(status.offset) };
+            if (checksum) headers['Upload-Checksum'] = checksum;
+            return fetch(form.dataset.uploadUrl + '/' + status.id, {
+                method: 'PUT', headers: headers, body: chunk
+            }).then(json);
+        });
+        return sent.then(function(result) {
+            if (result.httpStatus === 200 || result.httpStatus === 409) {
+                // 409: the server tells us where to continue from
+                status.offset = result.offset !== undefined ? result.offset : status.offset;
+                setProgress(status.offset, file.size);
+                return sendChunks(file, status, chunkSize, 5);
+            }
+            throw new Error(result.error);
+        }).catch(function(error) {
+            if (retries <= 0) throw error;
+            return new Promise(function(resolve) {
+                setTimeout(resolve, (6 - retries) * 1000);
+            }).then(function() {
+                return sendChunks(file, status, chunkSize, retries - 1);
+            });
+        });
+    }
+
+    form.addEventListener('submit', function(e) {
+        var tipo = form.querySelector('[name="tipo"]');
+        var input = form.querySelector('input[type="file"]');
+        if (!tipo || tipo.value !== 'local' || !input || !input.files.length) return;
+
+        e.preventDefault();
+        var file = input.files[0];
+        var storageKey = 'upload:' + file.name + ':' + file.size + ':' + file.lastModified;
+        var submitBtn = form.querySelector('[type="submit"]');
+        submitBtn.disabled = true;
+        errorBox.textContent = '';
+
+        startUpload(file, storageKey).then(function(status) {
+            setProgress(status.offset, file.size);
+            return sendChunks(file, status, status.chunk_size || 5242880, 5);
+        }).then(function(status) {
+            return fetch(form.dataset.uploadUrl + '/' + status.id + '/finalizar', { method: 'POST' }).then(json);
+        }).then(function(result) {
+            if (result.httpStatus !== 200) throw new Error(result.error);
+            localStorage.removeItem(storageKey);
+            window.location = form.dataset.doneUrl;
+        }).catch(function(error) {
+            errorBox.textContent = 'Error al subir el video: ' + (error.message || error) + '. Vuelve a intentarlo para continuar donde se quedó.';
+            submitBtn.disabled = false;
+        });
+    });
+});
+
+// Real-time updates (Server-Sent Events)
+document.addEventListener('DOMContentLoaded', function() {
+    var streamUrl = document.body.dataset.streamUrl;
+    if (!streamUrl || !window.EventSource) return;
+
+    var source = new EventSource(streamUrl);
+
+    source.addEventListener('unread', function(e) {
+        var data = JSON.parse(e.data);
+        var badge = document.getElementById('unread-badge');
+        if (badge) {
+            badge.textContent = data.total;
+            badge.classList.toggle('d-none', !data.total);
+        }
+    });
+
+    // Pages interested in new messages listen to 'scoutme:message'
+    source.addEventListener('message', function(e) {
+        document.dispatchEvent(new CustomEvent('scoutme:message', { detail: JSON.parse(e.data) }));
+    });
+});
+
 // Utility functions
 function calculateAge(dateInput) {
     var birthDate = new Date(dateInput.value);
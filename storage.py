@@ -0,0 +1,429 @@
+import base64
+import hashlib
+import mimetypes
+import os
+import re
+import shutil
+import uuid
+from contextlib import contextmanager
+
+from sqlalchemy.exc import IntegrityError
+
+from models import db, Blob
+
+# --------------------------------------------------
+# BACKENDS DE ALMACENAMIENTO
+# --------------------------------------------------
+# Los archivos se identifican por una clave ("blobs/ab/cd/<sha256>",
+# "partial/<subida>") y se guardan en disco local o en un bucket S3
+# (AWS, MinIO o cualquier servicio compatible) según STORAGE_BACKEND.
+# Con S3 los navegadores suben las partes y descargan los videos con URLs
+# prefirmadas, sin que los bytes pasen por los workers de Flask, y varios
+# servidores pueden compartir el mismo almacenamiento.
+COPY_BUFFER = 1024 * 1024
+
+
+class LocalStorage:
+    """Archivos bajo una carpeta local (o un volumen compartido entre nodos)."""
+
+    direct_upload = False
+    min_part_size = 1
+
+    def __init__(self, root):
+        self.root = root
+
+    def path(self, key):
+        return os.path.join(self.root, *key.split("/"))
+
+    def exists(self, key):
+        return os.path.isfile(self.path(key))
+
+    def save_file(self, source, key):
+        """Mueve un archivo local a `key` con un rename, sin copiar los datos."""
+        final = self.path(key)
+        os.makedirs(os.path.dirname(final), exist_ok=True)
+        os.replace(source, final)
+
+    def move(self, source_key, key):
+        self.save_file(self.path(source_key), key)
+
+    def open(self, key):
+        return open(self.path(key), "rb")
+
+    def delete(self, key):
+        path = self.path(key)
+        if os.path.exists(path):
+            os.remove(path)
+
+    def delete_prefix(self, prefix):
+        shutil.rmtree(self.path(prefix.rstrip("/")), ignore_errors=True)
+
+    def sha256(self, key):
+        digest = hashlib.sha256()
+        with self.open(key) as f:
+            for block in iter(lambda: f.read(COPY_BUFFER), b""):
+                digest.update(block)
+        return digest.hexdigest()
+
+    @contextmanager
+    def local_file(self, key, scratch_folder):
+        """Ruta local del archivo para herramientas externas (ffmpeg...)."""
+        yield self.path(key)
+
+    def url(self, key, filename=None):
+        # Sin URL externa: los archivos los sirve la propia aplicación
+        return None
+
+
+class S3Storage:
+    """Objetos en un bucket S3 o compatible (MinIO, Ceph, R2...)."""
+
+    direct_upload = True
+    # Límite de S3: todas las partes salvo la última miden al menos 5 MB
+    min_part_size = 5 * 1024 * 1024
+
+    def __init__(self, bucket, endpoint_url=None, region=None, access_key=None,
+                 secret_key=None, prefix="", url_expires=3600):
+        try:
+            import boto3
+            from botocore.config import Config as BotoConfig
+        except ImportError:
+            raise RuntimeError(
+                "STORAGE_BACKEND es 's3' pero el paquete 'boto3' "
+                "no está instalado (pip install boto3)"
+            )
+        if not bucket:
+            raise RuntimeError("STORAGE_BACKEND es 's3' pero falta S3_BUCKET")
+
+        # Los servicios compatibles suelen exigir direcciones de tipo ruta
+        addressing = {"addressing_style": "path"} if endpoint_url else {}
+        self.client = boto3.client(
+            "s3",
+            endpoint_url=endpoint_url,
+            region_name=region,
+            aws_access_key_id=access_key,
+            aws_secret_access_key=secret_key,
+            config=BotoConfig(signature_version="s3v4", s3=addressing),
+        )
+        self.bucket = bucket
+        self.prefix = prefix
+        self.url_expires = url_expires
+
+    def object_key(self, key):
+        return self.prefix + key
+
+    def exists(self, key):
+        from botocore.exceptions import ClientError
+
+        try:
+            self.client.head_object(Bucket=self.bucket, Key=self.object_key(key))
+        except ClientError as e:
+            if e.response["Error"]["Code"] in ("404", "NoSuchKey", "NotFound"):
+                return False
+            raise
+        return True
+
+    def save_file(self, source, key):
+        """Sube un archivo local (por partes si es grande) y lo borra del disco."""
+        from boto3.s3.transfer import TransferConfig
+
+        transfer = TransferConfig(
+            multipart_threshold=self.min_part_size * 2,
+            multipart_chunksize=self.min_part_size * 2,
+        )
+        self.client.upload_file(source, self.bucket, self.object_key(key), Config=transfer)
+        os.remove(source)
+
+    def move(self, source_key, key):
+        # S3 no tiene rename: copia en el servidor y borrado del original
+        self.client.copy(
+            {"Bucket": self.bucket, "Key": self.object_key(source_key)},
+            self.bucket, self.object_key(key),
+        )
+        self.delete(source_key)
+
+    def open(self, key):
+        response = self.client.get_object(Bucket=self.bucket, Key=self.object_key(key))
+        return response["Body"]
+
+    def delete(self, key):
+        self.client.delete_object(Bucket=self.bucket, Key=self.object_key(key))
+
+    def delete_prefix(self, prefix):
+        paginator = self.client.get_paginator("list_objects_v2")
+        for page in paginator.paginate(Bucket=self.bucket, Prefix=self.object_key(prefix)):
+            objects = [{"Key": item["Key"]} for item in page.get("Contents", [])]
+            if objects:
+                self.client.delete_objects(Bucket=self.bucket, Delete={"Objects": objects})
+
+    def sha256(self, key):
+        """sha256 del objeto calculado por el propio S3.
+
+        Si el objeto ya tiene un checksum SHA256 de objeto completo se lee con
+        head_object. Si no (p. ej. las subidas multiparte, cuyo checksum es
+        compuesto), se copia sobre sí mismo pidiéndolo, así no hay que
+        descargarlo para hashearlo. La copia conserva Content-Type y metadatos.
+        """
+        object_key = self.object_key(key)
+        head = self.client.head_object(Bucket=self.bucket, Key=object_key, ChecksumMode="ENABLED")
+        checksum = head.get("ChecksumSHA256")
+        if checksum and "-" not in checksum and head.get("ChecksumType") != "COMPOSITE":
+            return base64.b64decode(checksum).hex()
+
+        # Con REPLACE, lo que no se repite aquí se pierde (Content-Type pasaría a binary/octet-stream)
+        kept = {
+            name: head[name]
+            for name in ("ContentType", "CacheControl", "ContentDisposition",
+                         "ContentEncoding", "ContentLanguage")
+            if head.get(name)
+        }
+        response = self.client.copy_object(
+            Bucket=self.bucket,
+            Key=object_key,
+            CopySource={"Bucket": self.bucket, "Key": object_key},
+            MetadataDirective="REPLACE",
+            Metadata=head.get("Metadata", {}),
+            ChecksumAlgorithm="SHA256",
+            **kept,
+        )
+        checksum = response["CopyObjectResult"]["ChecksumSHA256"]
+        return base64.b64decode(checksum).hex()
+
+    @contextmanager
+    def local_file(self, key, scratch_folder):
+        """Descarga el objeto a un temporal local mientras dura el bloque."""
+        path = temp_path(scratch_folder)
+        try:
+            self.client.download_file(self.bucket, self.object_key(key), path)
+            yield path
+        finally:
+            if os.path.exists(path):
+                os.remove(path)
+
+    def url(self, key, filename=None):
+        """URL prefirmada de descarga; el contenido es inmutable y se cachea."""
+        params = {
+            "Bucket": self.bucket,
+            "Key": self.object_key(key),
+            "ResponseCacheControl": "public, max-age=31536000, immutable",
+        }
+        content_type = mimetypes.guess_type(filename)[0] if filename else None
+        if content_type:
+            params["ResponseContentType"] = content_type
+        return self.client.generate_presigned_url(
+            "get_object", Params=params, ExpiresIn=self.url_expires
+        )
+
+    # Subida multiparte directa desde el navegador
+    def create_multipart(self, key):
+        response = self.client.create_multipart_upload(
+            Bucket=self.bucket, Key=self.object_key(key)
+        )
+        return response["UploadId"]
+
+    def part_url(self, key, upload_id, part_number):
+        return self.client.generate_presigned_url(
+            "upload_part",
+            Params={
+                "Bucket": self.bucket,
+                "Key": self.object_key(key),
+                "UploadId": upload_id,
+                "PartNumber": part_number,
+            },
+            ExpiresIn=self.url_expires,
+        )
+
+    def list_parts(self, key, upload_id):
+        """Partes ya recibidas por S3: lista de (número, tamaño, etag) ordenada."""
+        parts = []
+        paginator = self.client.get_paginator("list_parts")
+        for page in paginator.paginate(
+            Bucket=self.bucket, Key=self.object_key(key), UploadId=upload_id
+        ):
+            for part in page.get("Parts", []):
+                parts.append((part["PartNumber"], part["Size"], part["ETag"]))
+        parts.sort()
+        return parts
+
+    def complete_multipart(self, key, upload_id, parts):
+        self.client.complete_multipart_upload(
+            Bucket=self.bucket,
+            Key=self.object_key(key),
+            UploadId=upload_id,
+            MultipartUpload={"Parts": [
+                {"PartNumber": number, "ETag": etag} for number, _, etag in parts
+            ]},
+        )
+
+    def abort_multipart(self, key, upload_id):
+        self.client.abort_multipart_upload(
+            Bucket=self.bucket, Key=self.object_key(key), UploadId=upload_id
+        )
+
+
+def create_storage(config, root):
+    backend = (config.get("STORAGE_BACKEND") or "local").lower()
+    if backend == "local":
+        return LocalStorage(root)
+    if backend == "s3":
+        return S3Storage(
+            config.get("S3_BUCKET"),
+            endpoint_url=config.get("S3_ENDPOINT_URL"),
+            region=config.get("S3_REGION"),
+            access_key=config.get("S3_ACCESS_KEY_ID"),
+            secret_key=config.get("S3_SECRET_ACCESS_KEY"),
+            prefix=config.get("S3_PREFIX") or "",
+            url_expires=config.get("S3_URL_EXPIRES", 3600),
+        )
+    raise ValueError(f"Backend de almacenamiento no soportado: {backend}")
+
+
+def get_storage(app):
+    storage = app.extensions.get("storage")
+    if storage is None:
+        root = os.path.join(app.root_path, app.config["UPLOAD_FOLDER"])
+        storage = create_storage(app.config, root)
+        app.extensions["storage"] = storage
+    return storage
+
+
+# --------------------------------------------------
+# ALMACENAMIENTO DIRECCIONADO POR CONTENIDO
+# --------------------------------------------------
+# Cada archivo se guarda una sola vez bajo su sha256, repartido en
+# prefijos (blobs/ab/cd/abcd...) para no acumular miles de entradas en
+# una carpeta. Los videos apuntan a un Blob con contador de referencias, así
+# dos subidas idénticas comparten almacenamiento y dos archivos distintos con
+# el mismo nombre nunca se pisan. Como el contenido de una URL de blob no
+# cambia, se puede servir con caché inmutable.
+BLOB_NAME_RE = re.compile(r"^([0-9a-f]{64})\.([a-z0-9]{1,8})$")
+
+
+def blob_key(sha256):
+    return f"blobs/{sha256[:2]}/{sha256[2:4]}/{sha256}"
+
+
+def hls_prefix(sha256):
+    """Carpeta del paquete HLS del blob (ver hls.py)."""
+    return f"hls/{sha256}/"
+
+
+def temp_path(folder):
+    directory = os.path.join(folder, "tmp")
+    os.makedirs(directory, exist_ok=True)
+    return os.path.join(directory, uuid.uuid4().hex)
+
+
+def blob_filename(sha256, extension):
+    """Nombre público del blob: el hash más la extensión, que fija el tipo MIME."""
+    return f"{sha256}.{extension.lower()}"
+
+
+def parse_blob_filename(filename):
+    """Devuelve el sha256 si `filename` es un nombre de blob, o None."""
+    match = BLOB_NAME_RE.match(filename)
+    return match.group(1) if match else None
+
+
+def store_stream(stream, storage, scratch_folder):
+    """Copia `stream` a un temporal local calculando el sha256 y lo guarda como blob."""
+    path = temp_path(scratch_folder)
+    digest = hashlib.sha256()
+    size = 0
+    with open(path, "wb") as f:
+        for block in iter(lambda: stream.read(COPY_BUFFER), b""):
+            f.write(block)
+            digest.update(block)
+            size += len(block)
+    return adopt_file(path, digest.hexdigest(), size, storage)
+
+
+def store_file(path, storage):
+    """Guarda como blob un archivo local generado por la aplicación (lo consume)."""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(COPY_BUFFER), b""):
+            digest.update(block)
+    return adopt_file(path, digest.hexdigest(), os.path.getsize(path), storage)
+
+
+def register_blob(sha256, size, save):
+    """Registra el contenido (llamando a `save()` si es nuevo) y suma una referencia."""
+    blobs = Blob.__table__
+    while True:
+        blob = Blob.query.filter_by(sha256=sha256).first()
+        if blob is None:
+            save()
+            try:
+                with db.session.begin_nested():
+                    blob = Blob(sha256=sha256, size=size, ref_count=1)
+                    db.session.add(blob)
+                return blob, True
+            except IntegrityError:
+                # Otra petición registró el mismo contenido a la vez: se referencia el suyo
+                continue
+
+        result = db.session.execute(
+            blobs.update()
+            .where(blobs.c.id == blob.id)
+            .values(ref_count=blobs.c.ref_count + 1)
+        )
+        if result.rowcount == 1:
+            return blob, False
+        # collect_garbage() borró el blob (y su archivo) entre la búsqueda y el
+        # UPDATE: se vuelve a empezar, y esta vez se guarda el contenido
+        db.session.expunge(blob)
+
+
+def adopt_file(path, sha256, size, storage):
+    """Convierte un archivo local ya hasheado en blob.
+
+    Si el contenido ya existe se borra el archivo; si no, se entrega al
+    backend (un rename en disco local, una subida en S3).
+    """
+    blob, created = register_blob(
+        sha256, size, lambda: storage.save_file(path, blob_key(sha256))
+    )
+    if not created and os.path.exists(path):
+        os.remove(path)
+    return blob
+
+
+def adopt_object(key, sha256, size, storage):
+    """Como adopt_file() pero para un archivo que ya está en el backend."""
+    blob, created = register_blob(
+        sha256, size, lambda: storage.move(key, blob_key(sha256))
+    )
+    if not created:
+        storage.delete(key)
+    return blob
+
+
+def release_blob(blob_id):
+    """Quita una referencia; los blobs sin referencias los borra collect_garbage()."""
+    blobs = Blob.__table__
+    db.session.execute(
+        blobs.update()
+        .where(blobs.c.id == blob_id, blobs.c.ref_count > 0)
+        .values(ref_count=blobs.c.ref_count - 1)
+    )
+
+
+def collect_garbage(storage):
+    """Elimina los blobs sin referencias y sus archivos."""
+    blobs = Blob.__table__
+    removed = 0
+    for blob_id, sha256 in db.session.query(Blob.id, Blob.sha256).filter(Blob.ref_count <= 0).all():
+        # Borrado condicional: si entretanto alguien lo referenció, se conserva
+        result = db.session.execute(
+            blobs.delete().where(blobs.c.id == blob_id, blobs.c.ref_count <= 0)
+        )
+        if result.rowcount:
+            # Los archivos se borran antes del commit: mientras tanto el borrado
+            # bloquea la fila, y quien registre el mismo contenido espera y
+            # vuelve a guardarlo en lugar de quedarse sin archivo
+            storage.delete(blob_key(sha256))
+            storage.delete_prefix(hls_prefix(sha256))
+            removed += 1
+        db.session.commit()
+    return removed
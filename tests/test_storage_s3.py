@@ -0,0 +1,60 @@
+import base64
+import hashlib
+
+import pytest
+
+pytest.importorskip("boto3")
+from botocore.stub import Stubber  # noqa: E402
+
+from storage import S3Storage  # noqa: E402
+
+DIGEST = hashlib.sha256(b"video").digest()
+CHECKSUM = base64.b64encode(DIGEST).decode("ascii")
+
+
+@pytest.fixture
+def storage():
+    storage = S3Storage("videos", region="us-east-1", access_key="test", secret_key="test", prefix="p/")
+    with Stubber(storage.client) as stubber:
+        storage.stubber = stubber
+        yield storage
+        stubber.assert_no_pending_responses()
+
+
+def test_sha256_reads_full_object_checksum_without_copying(storage):
+    storage.stubber.add_response(
+        "head_object",
+        {"ContentType": "video/mp4", "ChecksumSHA256": CHECKSUM, "ChecksumType": "FULL_OBJECT"},
+        {"Bucket": "videos", "Key": "p/blob", "ChecksumMode": "ENABLED"},
+    )
+    assert storage.sha256("blob") == DIGEST.hex()
+
+
+def test_sha256_copy_keeps_content_type_and_metadata(storage):
+    # Subida multiparte: el checksum es compuesto y hay que reescribir el objeto
+    storage.stubber.add_response(
+        "head_object",
+        {
+            "ContentType": "video/mp4",
+            "CacheControl": "no-cache",
+            "Metadata": {"origen": "subida"},
+            "ChecksumSHA256": CHECKSUM + "-3",
+            "ChecksumType": "COMPOSITE",
+        },
+        {"Bucket": "videos", "Key": "p/blob", "ChecksumMode": "ENABLED"},
+    )
+    storage.stubber.add_response(
+        "copy_object",
+        {"CopyObjectResult": {"ChecksumSHA256": CHECKSUM}},
+        {
+            "Bucket": "videos",
+            "Key": "p/blob",
+            "CopySource": {"Bucket": "videos", "Key": "p/blob"},
+            "MetadataDirective": "REPLACE",
+            "Metadata": {"origen": "subida"},
+            "ContentType": "video/mp4",
+            "CacheControl": "no-cache",
+            "ChecksumAlgorithm": "SHA256",
+        },
+    )
+    assert storage.sha256("blob") == DIGEST.hex()
@@ -0,0 +1,270 @@
+import base64
+import hashlib
+import os
+import re
+import shutil
+import uuid
+from datetime import datetime, timedelta
+
+from werkzeug.utils import secure_filename
+
+from models import db, Upload, Video
+from processing import schedule_processing
+from storage import adopt_object, blob_filename
+
+# --------------------------------------------------
+# SUBIDAS POR PARTES (REANUDABLES)
+# --------------------------------------------------
+# El cliente crea una subida con el tamaño total, envía el archivo en trozos
+# con PUT indicando el offset y la finaliza. Cada trozo se recibe en un
+# temporal propio (sin pasar por el disco temporal de Werkzeug), se copia a
+# su posición del archivo parcial solo tras reclamar el offset, y el offset
+# confirmado se guarda en la base de datos:
+# si la conexión se corta, el cliente consulta el offset y continúa desde ahí.
+# Al finalizar, el archivo se convierte en blob con un rename (storage.py).
+#
+# Con un backend de subida directa (S3) la subida es un multipart de S3: el
+# cliente pide una URL prefirmada por trozo y la envía al bucket, y el offset
+# confirmado se obtiene de las partes que S3 ya tiene.
+COPY_BUFFER = 1024 * 1024
+SHA256_RE = re.compile(r"^[0-9a-f]{64}$")
+
+
+class UploadError(Exception):
+    def __init__(self, message, status=400, **extra):
+        super().__init__(message)
+        self.message = message
+        self.status = status
+        self.extra = extra
+
+
+def upload_key(upload):
+    return f"partial/{upload.stored_name}"
+
+
+def create_upload(player_id, filename, size, titulo, descripcion=None,
+                  sha256=None, max_size=None):
+    name = secure_filename(filename or "")
+    if not name:
+        raise UploadError("Nombre de archivo no válido")
+    try:
+        size = int(size)
+    except (TypeError, ValueError):
+        raise UploadError("Tamaño no válido")
+    if size <= 0 or (max_size and size > max_size):
+        raise UploadError("Tamaño no permitido", status=413)
+    if not titulo:
+        raise UploadError("El título es obligatorio")
+    if sha256 and not SHA256_RE.match(sha256.lower()):
+        raise UploadError("sha256 no válido")
+
+    upload_id = uuid.uuid4().hex
+    upload = Upload(
+        id=upload_id,
+        player_id=player_id,
+        filename=name,
+        stored_name=f"{upload_id}_{name}",
+        titulo=titulo[:200],
+        descripcion=descripcion,
+        size=size,
+        received=0,
+        sha256=sha256.lower() if sha256 else None,
+    )
+    db.session.add(upload)
+    return upload
+
+
+def start_direct_upload(upload, storage, chunk_size):
+    """Abre el multipart en el backend; las partes deben medir lo mismo salvo la última."""
+    upload.chunk_size = max(chunk_size, storage.min_part_size)
+    upload.storage_upload_id = storage.create_multipart(upload_key(upload))
+
+
+def presign_chunk(upload, storage, offset):
+    """URL prefirmada para enviar al backend el trozo que empieza en `offset`."""
+    if upload.status != "pendiente":
+        raise UploadError("La subida ya está finalizada", status=409)
+    if not upload.storage_upload_id:
+        raise UploadError("La subida no admite envío directo", status=409)
+    if offset is None or offset < 0 or offset >= upload.size or offset % upload.chunk_size:
+        raise UploadError("Offset incorrecto", status=409, offset=upload.received)
+
+    length = min(upload.chunk_size, upload.size - offset)
+    part_number = offset // upload.chunk_size + 1
+    url = storage.part_url(upload_key(upload), upload.storage_upload_id, part_number)
+    # Los trozos no pasan por la aplicación: esto marca la subida como activa
+    upload.updated_at = datetime.utcnow()
+    return {"url": url, "method": "PUT", "offset": offset, "length": length}
+
+
+def direct_parts(upload, storage):
+    """Partes consecutivas y completas que ya tiene el backend desde la primera."""
+    parts = []
+    expected = 1
+    for number, size, etag in storage.list_parts(upload_key(upload), upload.storage_upload_id):
+        offset = (number - 1) * upload.chunk_size
+        if number != expected or size != min(upload.chunk_size, upload.size - offset):
+            break
+        parts.append((number, size, etag))
+        expected += 1
+    return parts
+
+
+def sync_direct_offset(upload, storage):
+    """Actualiza `received` con lo que el backend ya ha recibido."""
+    if upload.status == "pendiente" and upload.storage_upload_id:
+        upload.received = sum(size for _, size, _ in direct_parts(upload, storage))
+    return upload.received
+
+
+def parse_chunk_checksum(header):
+    """Cabecera 'Upload-Checksum: sha256 <base64>' (opcional) de un trozo."""
+    if not header:
+        return None
+    algorithm, _, value = header.partition(" ")
+    if algorithm.lower() != "sha256":
+        raise UploadError("Solo se admite sha256 como checksum", status=400)
+    try:
+        return base64.b64decode(value.strip(), validate=True)
+    except ValueError:
+        raise UploadError("Checksum mal formado")
+
+
+def write_chunk(upload, offset, stream, length, storage, checksum=None):
+    """Escribe `length` bytes de `stream` en la posición `offset` y avanza el offset.
+
+    El offset debe coincidir con lo ya recibido; si no, se responde 409 con
+    el offset correcto para que el cliente se resincronice.
+    """
+    if upload.status != "pendiente":
+        raise UploadError("La subida ya está finalizada", status=409)
+    if upload.storage_upload_id:
+        raise UploadError("Los trozos se envían a la URL prefirmada", status=409)
+    if offset != upload.received:
+        raise UploadError("Offset incorrecto", status=409, offset=upload.received)
+    if length is None or length <= 0:
+        raise UploadError("Falta Content-Length", status=411)
+    if offset + length > upload.size:
+        raise UploadError("El trozo excede el tamaño declarado", status=413)
+
+    path = storage.path(upload_key(upload))
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    # El trozo se recibe en un temporal propio de esta petición: un reintento
+    # simultáneo del mismo trozo, o uno incompleto, no toca el archivo parcial
+    part = f"{path}.{uuid.uuid4().hex}.part"
+    try:
+        digest = hashlib.sha256()
+        written = 0
+        with open(part, "wb") as f:
+            while written < length:
+                block = stream.read(min(COPY_BUFFER, length - written))
+                if not block:
+                    break
+                f.write(block)
+                digest.update(block)
+                written += len(block)
+
+        if written != length:
+            raise UploadError("Trozo incompleto", status=400, offset=offset)
+        if checksum is not None and digest.digest() != checksum:
+            raise UploadError("Checksum del trozo incorrecto", status=460, offset=offset)
+
+        # Se reclama el offset antes de escribir en el archivo parcial: el
+        # UPDATE condicional bloquea la fila (el archivo en SQLite) hasta el
+        # commit, así que solo una petición copia su trozo y nadie ve el
+        # nuevo offset antes de que los bytes estén en el archivo
+        uploads = Upload.__table__
+        result = db.session.execute(
+            uploads.update()
+            .where(uploads.c.id == upload.id, uploads.c.received == offset)
+            .values(received=offset + length, updated_at=datetime.utcnow())
+        )
+        if result.rowcount != 1:
+            db.session.rollback()
+            db.session.refresh(upload)
+            raise UploadError("Subida modificada por otra petición", status=409, offset=upload.received)
+
+        try:
+            mode = "r+b" if os.path.exists(path) else "wb"
+            with open(part, "rb") as source, open(path, mode) as f:
+                f.seek(offset)
+                shutil.copyfileobj(source, f, COPY_BUFFER)
+        except OSError:
+            db.session.rollback()
+            raise
+        db.session.commit()
+    finally:
+        if os.path.exists(part):
+            os.remove(part)
+    return offset + length
+
+
+def finalize_upload(upload, storage):
+    """Comprueba tamaño y checksum completos y crea el Video."""
+    if upload.status == "completado":
+        return db.session.get(Video, upload.video_id)
+
+    key = upload_key(upload)
+    if upload.storage_upload_id:
+        parts = direct_parts(upload, storage)
+        upload.received = sum(size for _, size, _ in parts)
+        if upload.received != upload.size:
+            raise UploadError("La subida no está completa", status=409, offset=upload.received)
+        storage.complete_multipart(key, upload.storage_upload_id, parts)
+        # El multipart ya no existe en el backend: se guarda aunque lo siguiente falle
+        upload.storage_upload_id = None
+        db.session.commit()
+    elif upload.received != upload.size:
+        raise UploadError("La subida no está completa", status=409, offset=upload.received)
+
+    if not storage.exists(key):
+        raise UploadError("Archivo de la subida no encontrado", status=410)
+
+    checksum = storage.sha256(key)
+    if upload.sha256 and checksum != upload.sha256:
+        raise UploadError("El checksum del archivo no coincide", status=460)
+
+    blob = adopt_object(key, checksum, upload.size, storage)
+    extension = upload.filename.rsplit(".", 1)[-1]
+    video = Video(
+        player_id=upload.player_id,
+        titulo=upload.titulo,
+        descripcion=upload.descripcion,
+        tipo="local",
+        filename=blob_filename(checksum, extension),
+        blob_id=blob.id,
+    )
+    db.session.add(video)
+    db.session.flush()
+    schedule_processing(video)
+
+    upload.sha256 = checksum
+    upload.status = "completado"
+    upload.video_id = video.id
+    return video
+
+
+def expire_stale_uploads(storage, max_age_hours=24):
+    """Borra subidas pendientes sin actividad y sus archivos parciales."""
+    limit = datetime.utcnow() - timedelta(hours=max_age_hours)
+    stale = Upload.query.filter(
+        Upload.status == "pendiente", Upload.updated_at < limit
+    ).all()
+    for upload in stale:
+        if upload.storage_upload_id:
+            storage.abort_multipart(upload_key(upload), upload.storage_upload_id)
+        storage.delete(upload_key(upload))
+        db.session.delete(upload)
+    db.session.commit()
+    return len(stale)
+
+
+def upload_status(upload):
+    return {
+        "id": upload.id,
+        "offset": upload.received,
+        "size": upload.size,
+        "status": upload.status,
+        "video_id": upload.video_id,
+        "direct": bool(upload.storage_upload_id),
+    }